@@ -0,0 +1,172 @@
+"""Asynchronous protocol of the providers.
+
+Instead of a `main` function returning an iterator, a provider module can define `main` as an
+async generator function with the same arguments, which yields items. All async providers run on
+one event loop in a background thread, next to the threads of the sync providers, and their items
+are passed to the pipeline in batches like those of any other provider, see `batches`.
+
+Network-bound providers use a `Limiter` to make their blocking calls concurrently, so that their
+latency overlaps instead of adding up. Its limits are read from the provider config:
+
+- "concurrency": maximum number of calls in progress at the same time (default: 4)
+- "timeout": number of seconds after which a call fails (default: 30)
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import logging
+import threading
+from typing import (
+    AsyncGenerator, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Optional, TypeVar,
+)
+
+from automatic_diary.config import DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the event loop of the async providers, starting its thread on the first call."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="asyncio", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def run(coro: Awaitable[T], context: Optional[contextvars.Context] = None) -> T:
+    """Run a coroutine on the event loop of the async providers and wait for its result.
+
+    The coroutine runs in `context`, by default a copy of the context of the caller, so that
+    context variables like the current provider metrics are passed to it.
+    """
+    loop = get_loop()
+    if context is None:
+        context = contextvars.copy_context()
+    future: concurrent.futures.Future = concurrent.futures.Future()
+
+    def done(task: asyncio.Task):
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())  # type: ignore
+        else:
+            future.set_result(task.result())
+
+    def start():
+        task = context.run(loop.create_task, coro)  # type: ignore
+        task.add_done_callback(done)
+
+    loop.call_soon_threadsafe(start)
+    return future.result()
+
+
+async def _next_batch(
+    agen: AsyncIterator[T], size: int
+) -> tuple[list[T], Optional[BaseException], bool]:
+    batch: list[T] = []
+    try:
+        while len(batch) < size:
+            batch.append(await agen.__anext__())
+    except StopAsyncIteration:
+        return batch, None, True
+    except Exception as e:
+        return batch, e, True
+    return batch, None, False
+
+
+def iter_batches(agen: AsyncIterator[T], size: int) -> Iterator[list[T]]:
+    """Iterate an async iterator in lists of at most `size` elements.
+
+    When the iterator raises an exception, the elements read before it are yielded first, like in
+    `batches.batched`.
+    """
+    try:
+        while True:
+            batch, error, done = run(_next_batch(agen, size))
+            if batch:
+                yield batch
+            if error is not None:
+                raise error
+            if done:
+                return
+    finally:
+        aclose = getattr(agen, "aclose", None)
+        if aclose is not None:
+            run(aclose())
+
+
+class Limiter:
+    """Limit the concurrency and duration of blocking calls of an async provider."""
+
+    def __init__(
+        self, concurrency: int = DEFAULT_CONCURRENCY, timeout: Optional[float] = DEFAULT_TIMEOUT
+    ):
+        self.concurrency = max(concurrency, 1)
+        self.timeout = timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Limiter":
+        return cls(
+            concurrency=config.get("concurrency", DEFAULT_CONCURRENCY),
+            timeout=config.get("timeout", DEFAULT_TIMEOUT),
+        )
+
+    async def call(self, func: Callable[..., R], *args, **kwargs) -> R:
+        """Call a blocking function in a thread, waiting for a free slot first.
+
+        Raise `TimeoutError` when the call doesn't finish in time. The thread can't be stopped,
+        so pass the timeout also to the function when it supports it. Its slot is freed only when
+        the thread finishes, so that no more than `concurrency` threads run even after timeouts.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        await self._semaphore.acquire()
+        task = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+        task.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{func.__name__} timed out after {self.timeout}s") from None
+
+    def _release(self, task: asyncio.Future):
+        if not task.cancelled():
+            # Retrieve the exception of a call that timed out, so that it isn't logged as unhandled.
+            task.exception()
+        assert self._semaphore is not None
+        self._semaphore.release()
+
+    async def map(
+        self, func: Callable[..., R], args_list: Iterable[tuple]
+    ) -> AsyncGenerator[R, None]:
+        """Call a blocking function with each of the arguments and yield the results in order.
+
+        At most `concurrency` calls are started ahead of the consumer; those are cancelled when the
+        consumer stops iterating.
+        """
+        pending: collections.deque[asyncio.Task] = collections.deque()
+        args_it = iter(args_list)
+        try:
+            while True:
+                while len(pending) < self.concurrency:
+                    args = next(args_it, None)
+                    if args is None:
+                        break
+                    pending.append(asyncio.ensure_future(self.call(func, *args)))
+                if not pending:
+                    return
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,146 @@
+"""Run the configs of many users in one process.
+
+The manifest is a JSON list of objects with the keys:
+
+- "config": configuration file path
+- "output": output file path
+- "name" (optional): name of the user in the summary, the output path by default
+- "providers" (optional): list of providers to use, all configured providers by default
+- "update" (optional): update the output file like the --update option
+
+Relative paths are relative to the manifest. The users are run in a shared thread pool, each in
+isolation: an error of one user or provider doesn't affect the others and is reported in the
+summary. The providers of one user run one at a time in its thread, so `jobs` is the total number
+of providers running at the same time. Lookups that don't depend on the user, like git repo
+discovery and .ics parsing, are done only once for all users, see `shared`.
+"""
+
+import argparse
+import dataclasses
+import json
+import logging
+import os.path
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from automatic_diary.cli import (
+    call_provider_batches, load_configs, load_watermarks, write_csv_batches,
+)
+from automatic_diary.metrics import RunMetrics
+from automatic_diary.shared import sharing
+from automatic_diary.update import watermarks_path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UserResult:
+    name: str
+    items: int = 0
+    provider_errors: int = 0
+    wall_time: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.provider_errors == 0
+
+
+def _resolve(base_dir: str, path: str) -> str:
+    return os.path.join(base_dir, os.path.expanduser(path))
+
+
+def run_user(entry: dict, base_dir: str, no_cache: bool) -> UserResult:
+    """Collect the items of one manifest entry and write its output."""
+    start = time.perf_counter()
+    result = UserResult(name=entry.get("name") or entry.get("output") or "?")
+    run_metrics = RunMetrics()
+    try:
+        output_path = _resolve(base_dir, entry["output"])
+        configs = list(load_configs(_resolve(base_dir, entry["config"]), entry.get("providers")))
+        update = bool(entry.get("update"))
+        watermarks = load_watermarks(output_path) if update else None
+        logger.info("Running %d provider configs of %s", len(configs), result.name)
+        batches = call_provider_batches(
+            configs, no_cache, watermarks=watermarks, run_metrics=run_metrics
+        )
+        write_csv_batches(batches, output_path, merge_existing=update)
+        if watermarks is not None:
+            watermarks.save(watermarks_path(output_path))
+    except Exception as e:
+        logger.error("Error while running %s", result.name)
+        logger.error(e)
+        result.error = f"{type(e).__name__}: {e}"
+    result.items = sum(metrics.items for metrics in run_metrics.providers)
+    result.provider_errors = sum(metrics.errors for metrics in run_metrics.providers)
+    result.wall_time = time.perf_counter() - start
+    return result
+
+
+def run_batch(
+    entries: Sequence[dict], base_dir: str = "", no_cache: bool = False, jobs: int = 4
+) -> list[UserResult]:
+    """Run manifest entries in a shared thread pool and return their results in order."""
+    with sharing(), ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="user") as executor:
+        futures = [executor.submit(run_user, entry, base_dir, no_cache) for entry in entries]
+        return [future.result() for future in futures]
+
+
+def format_summary(results: Sequence[UserResult]) -> str:
+    lines = [f"{'User':<30} {'Items':>8} {'Errors':>7} {'Time':>8}  Status"]
+    for result in results:
+        if result.error:
+            status = f"FAILED ({result.error})"
+        elif result.provider_errors:
+            status = "PROVIDER ERRORS"
+        else:
+            status = "OK"
+        lines.append(
+            f"{result.name:<30} {result.items:>8} {result.provider_errors:>7} "
+            f"{result.wall_time:>7.1f}s  {status}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="automatic-diary batch",
+        description="Collect the diaries of several users listed in a manifest in one process",
+    )
+    parser.add_argument(
+        "manifest_path",
+        help='Manifest JSON file path; the format is [{"config": "...", "output": "..."}, ...]',
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=4,
+        help=(
+            "Number of users to run concurrently; the providers of each user run one at a time "
+            "(default: 4)"
+        ),
+    )
+    parser.add_argument("-n", "--no-cache", action="store_true", help="Don't use cache")
+    parser.add_argument(
+        "--summary-file", metavar="PATH", help="Write the results of each user to this JSON file"
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Enable debugging output"
+    )
+    args = parser.parse_args(argv)
+    if args.verbose:
+        logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(message)s")
+    with open(args.manifest_path) as f:
+        entries = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(args.manifest_path))
+    results = run_batch(entries, base_dir, args.no_cache, args.jobs)
+    sys.stdout.write(format_summary(results))
+    if args.summary_file:
+        with open(args.summary_file, "w") as f:
+            json.dump([dataclasses.asdict(result) for result in results], f, indent=2)
+    if not all(result.ok for result in results):
+        sys.exit(1)
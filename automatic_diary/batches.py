@@ -0,0 +1,60 @@
+"""Batch protocol of the providers.
+
+Besides `main`, which returns an iterator of items, a provider module can define `main_batches`
+with the same arguments, which returns an iterator of lists of items. The pipeline then passes
+whole batches between the providers, the thread pool queue, the obfuscation and the writing of the
+output, which saves the overhead of a generator step per item at each stage. Providers without
+`main_batches` are adapted by collecting their items in batches, and so are providers whose `main`
+is an async generator function, see `aio`.
+"""
+
+from types import ModuleType
+from typing import Iterable, Iterator, TypeVar
+
+from automatic_diary.model import DateRange, Item
+
+T = TypeVar("T")
+
+BATCH_SIZE = 1000
+
+
+def batched(iterable: Iterable[T], size: int = BATCH_SIZE) -> Iterator[list[T]]:
+    """Yield lists of at most `size` elements of an iterable.
+
+    When the iterable raises an exception, the elements read before it are yielded first, so that
+    a failing provider keeps its items like when it's iterated item by item.
+    """
+    batch: list[T] = []
+    try:
+        for element in iterable:
+            batch.append(element)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    except Exception:
+        if batch:
+            yield batch
+        raise
+    if batch:
+        yield batch
+
+
+def unbatched(batches: Iterable[list[T]]) -> Iterator[T]:
+    for batch in batches:
+        yield from batch
+
+
+def provider_batches(
+    module: ModuleType, config: dict, no_cache: bool, date_range: DateRange
+) -> Iterator[list[Item]]:
+    """Call a provider module and return its items in batches."""
+    import inspect
+
+    main_batches = getattr(module, "main_batches", None)
+    if main_batches is not None:
+        return main_batches(config, no_cache, date_range=date_range)
+    if inspect.isasyncgenfunction(module.main):
+        from automatic_diary.aio import iter_batches
+
+        return iter_batches(module.main(config, no_cache, date_range=date_range), BATCH_SIZE)
+    return batched(module.main(config, no_cache, date_range=date_range))
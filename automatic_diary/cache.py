@@ -1,21 +1,363 @@
+"""Cache files of the providers that download or compute their input (git, csfd, caldav).
+
+Cache entries are compressed with zstd when the zstandard package is installed, otherwise with
+gzip; the compression is given by the suffix of the file. Uncompressed entries written by older
+versions are read too. A zstd entry found without the zstandard package is reported and computed
+again; writing an entry removes its files in other compressions.
+
+Reading an entry marks it as recently used by updating its modification time (at most once a
+day), so that `automatic-diary cache gc` evicts the least recently used entries first. The hits
+and misses of each cache directory are counted in its `cache_stats.json`.
+
+Entries are written to a temporary file which then replaces the entry, so a run killed while
+writing never leaves a truncated entry behind. The checksums of the compressed formats (CRC32 of
+gzip, the content checksum of zstd) are verified on read; an entry which fails them is deleted and
+counted as a miss, so it's computed again. Computing an entry holds a lock of its key, so when
+runs overlap, e.g. when a cron job starts before the previous one has finished, the entry is
+computed once and the other run reads it. `automatic-diary cache gc` removes the lock files of
+evicted entries only when no run holds them. The entries of a directory written together, like the
+CalDAV events, are complete only when the directory has a `cache_complete` file.
+
+When a cache pack is set with `set_cache_pack`, all entries and stats are stored in it instead of
+in files, see `cache_pack`. The entries keep their paths as keys. SQLite writes them in
+transactions, so they need no temporary files and locks.
+"""
+
+import contextlib
+import functools
+import json
 import logging
+import os
+import threading
+import time
+import zlib
 from collections.abc import Callable
 from pathlib import Path
+from types import ModuleType
+from typing import IO, TYPE_CHECKING, Iterable, Iterator, Optional
+
+from automatic_diary.metrics import count_bytes_read, count_cache_hit, count_cache_miss
+
+if TYPE_CHECKING:
+    from automatic_diary.cache_pack import CachePack
 
 logger = logging.getLogger(__name__)
 
+STATS_FILE = "cache_stats.json"
+COMPLETE_FILE = "cache_complete"
+LOCK_SUFFIX = ".lock"
+TMP_SUFFIX = ".tmp"
+
+# Minimum number of seconds between updates of the modification time of a used entry.
+TOUCH_INTERVAL = 24 * 3600
+
+COMPRESSED_SUFFIXES = (".zst", ".gz")
+
+_stats_lock = threading.Lock()
+
+_pack: Optional["CachePack"] = None
+
+
+class CorruptCacheEntry(ValueError):
+    """The data of a cache entry failed its checksum, e.g. because it was truncated."""
+
+
+def set_cache_pack(pack: Optional["CachePack"]):
+    """Store the cache entries in a cache pack instead of files, or in files again if None."""
+    global _pack
+    _pack = pack
+
+
+@functools.lru_cache(maxsize=None)
+def _compression() -> tuple[str, Callable[[bytes], bytes]]:
+    """Return the suffix and the compression function of new entries."""
+    try:
+        import zstandard
+    except ImportError:
+        import gzip
+
+        return ".gz", functools.partial(gzip.compress, mtime=0)
+    return ".zst", zstandard.ZstdCompressor(write_checksum=True).compress
+
+
+def _decompress(suffix: str, data: bytes) -> bytes:
+    if suffix == ".zst":
+        import zstandard
+
+        try:
+            return zstandard.decompress(data)
+        except zstandard.ZstdError as e:
+            raise CorruptCacheEntry(str(e)) from e
+    if suffix == ".gz":
+        import gzip
+
+        try:
+            return gzip.decompress(data)
+        except (EOFError, OSError, zlib.error) as e:
+            raise CorruptCacheEntry(str(e)) from e
+    return data
+
+
+def _decode(suffix: str, data: bytes) -> str:
+    count_bytes_read(len(data))
+    try:
+        return _decompress(suffix, data).decode()
+    except UnicodeDecodeError as e:
+        raise CorruptCacheEntry(str(e)) from e
+
+
+def is_cache_entry(path: Path) -> bool:
+    return path.name not in (STATS_FILE, COMPLETE_FILE) and not path.name.endswith(
+        (TMP_SUFFIX, LOCK_SUFFIX)
+    )
+
+
+def entry_key(path: Path) -> Path:
+    """Return the key of a cache entry file, i.e. its path without the compression suffix."""
+    return path.with_suffix("") if path.suffix in COMPRESSED_SUFFIXES else path
+
+
+def lock_path(path: Path) -> Path:
+    return path.with_name(path.name + LOCK_SUFFIX)
+
+
+def read_cache_entry(path: Path) -> str:
+    """Read a cache entry file, decompressing it according to its suffix.
+
+    Raises CorruptCacheEntry when the data fails its checksum.
+    """
+    data = path.read_bytes()
+    if time.time() - path.stat().st_mtime > TOUCH_INTERVAL:
+        os.utime(path)
+    suffix = path.suffix if path.suffix in COMPRESSED_SUFFIXES else ""
+    return _decode(suffix, data)
+
+
+def write_atomic(path: Path, data: bytes):
+    """Write a file so that readers see either its previous or its complete new content.
+
+    The data is written to a temporary file in the same directory, which then replaces the file.
+    """
+    import tempfile
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=TMP_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def _import_fcntl() -> Optional[ModuleType]:
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    return fcntl
+
+
+def _is_current(f: IO[bytes], path: Path) -> bool:
+    """Return whether the open file `f` is still the file at `path`, i.e. it wasn't removed."""
+    try:
+        return os.fstat(f.fileno()).st_ino == path.stat().st_ino
+    except FileNotFoundError:
+        return False
+
+
+@contextlib.contextmanager
+def cache_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock of the cache key `path`, shared by all threads and processes.
+
+    Does nothing with a cache pack and on systems without fcntl.
+    """
+    fcntl = _import_fcntl()
+    if _pack is not None or fcntl is None:
+        yield
+        return
+    path = lock_path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    while True:
+        f = path.open("ab")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        # The lock file may have been removed by `remove_lock` while this run was waiting for it.
+        if _is_current(f, path):
+            break
+        f.close()
+    try:
+        yield
+    finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+
+def remove_lock(path: Path) -> bool:
+    """Remove the lock file of the cache key `path` unless it's locked; return whether it was.
+
+    The file is removed while it's locked, so that no run can lock it meanwhile, see `cache_lock`.
+    """
+    fcntl = _import_fcntl()
+    path = lock_path(path)
+    if fcntl is None:
+        path.unlink(missing_ok=True)
+        return False
+    try:
+        f = path.open("rb")
+    except FileNotFoundError:
+        return False
+    with f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        if _is_current(f, path):
+            path.unlink()
+        return False
+
+
+def find_cache_file(path: Path) -> Optional[Path]:
+    """Return the file of the cache entry `path` in any compression, if it exists."""
+    for suffix in (*COMPRESSED_SUFFIXES, ""):
+        entry_path = path.with_name(path.name + suffix)
+        if entry_path.is_file():
+            return entry_path
+    return None
+
+
+def has_cache_file(path: Path) -> bool:
+    if _pack is not None:
+        return _pack.contains(path)
+    return find_cache_file(path) is not None
+
+
+def read_cache_file(path: Path) -> Optional[str]:
+    """Read the cache entry `path` in any compression, or return None if there is none.
+
+    Corrupt entries are deleted.
+    """
+    if _pack is not None:
+        packed = _pack.get(path, TOUCH_INTERVAL)
+        if packed is None:
+            return None
+        try:
+            return _decode(*packed)
+        except CorruptCacheEntry as e:
+            logger.warning("Deleting corrupt cache %s: %s", path, e)
+            _pack.delete([path])
+            return None
+        except ImportError as e:
+            logger.warning("Failed to read cache %s: %s", path, e)
+            return None
+    entry_path = find_cache_file(path)
+    if entry_path is None:
+        return None
+    try:
+        return read_cache_entry(entry_path)
+    except CorruptCacheEntry as e:
+        logger.warning("Deleting corrupt cache %s: %s", entry_path, e)
+        entry_path.unlink(missing_ok=True)
+        return None
+    except (ImportError, OSError) as e:
+        logger.warning("Failed to read cache %s: %s", entry_path, e)
+        return None
+
+
+def read_cache_dir(dir_path: Path) -> list[str]:
+    """Read all cache entries of a directory written by `write_cache_dir`.
+
+    Returns an empty list when the directory is incomplete or any of its entries is corrupt.
+    """
+    try:
+        if _pack is not None:
+            return [_decode(suffix, data) for suffix, data in _pack.get_dir(dir_path)]
+        if not (dir_path / COMPLETE_FILE).is_file():
+            return []
+        return [
+            read_cache_entry(Path(entry.path))
+            for entry in os.scandir(dir_path)
+            if entry.is_file() and is_cache_entry(Path(entry.path))
+        ]
+    except (CorruptCacheEntry, ImportError, OSError) as e:
+        logger.warning("Failed to read cache %s: %s", dir_path, e)
+        return []
+
+
+def write_cache_files(entries: Iterable[tuple[Path, str]]):
+    """Write cache entries (path, text) compressed."""
+    suffix, compress = _compression()
+    if _pack is not None:
+        _pack.put_many((path, suffix, compress(text.encode())) for path, text in entries)
+        return
+    for path, text in entries:
+        write_atomic(path.with_name(path.name + suffix), compress(text.encode()))
+        # An entry in another compression, e.g. zstd written when zstandard was installed, would
+        # otherwise be found first.
+        for other_suffix in (*COMPRESSED_SUFFIXES, ""):
+            if other_suffix != suffix:
+                path.with_name(path.name + other_suffix).unlink(missing_ok=True)
+
+
+def write_cache_file(path: Path, text: str):
+    write_cache_files([(path, text)])
+
+
+def write_cache_dir(dir_path: Path, entries: Iterable[tuple[Path, str]]):
+    """Write cache entries (path, text) of a directory and mark the directory as complete."""
+    if _pack is not None:
+        write_cache_files(entries)
+        return
+    complete_path = dir_path / COMPLETE_FILE
+    complete_path.unlink(missing_ok=True)
+    write_cache_files(entries)
+    dir_path.mkdir(parents=True, exist_ok=True)
+    complete_path.touch()
+
 
 def with_cache(
     func: Callable[..., str], cache_file: Path | None, no_cache: bool
 ) -> str:
     if not cache_file:
         return func()
-    if not no_cache and cache_file.is_file():
-        logger.info("Reading cache %s", cache_file)
-        res = cache_file.read_text()
-    else:
-        res = func()
-        logger.info("Writing cache %s", cache_file)
-        cache_file.parent.mkdir(parents=True, exist_ok=True)
-        cache_file.write_text(res)
+    res = None if no_cache else read_cache_file(cache_file)
+    if res is None:
+        with cache_lock(cache_file):
+            # Another run may have written the entry while this one was waiting for the lock.
+            res = None if no_cache else read_cache_file(cache_file)
+            if res is None:
+                count_cache_miss()
+                res = func()
+                logger.info("Writing cache %s", cache_file)
+                write_cache_file(cache_file, res)
+                return res
+    logger.info("Reading cache %s", cache_file)
+    count_cache_hit()
     return res
+
+
+def read_stats(cache_dir: Path) -> dict:
+    if _pack is not None:
+        return _pack.read_stats(cache_dir)
+    try:
+        with (cache_dir / STATS_FILE).open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_stats(cache_dir: Path, hits: int, misses: int):
+    """Add the hits and misses of a run to the stats of a cache directory."""
+    if not hits and not misses:
+        return
+    if _pack is not None:
+        _pack.record_stats(cache_dir, hits, misses)
+        return
+    if not cache_dir.is_dir():
+        return
+    with _stats_lock, cache_lock(cache_dir / STATS_FILE):
+        stats = read_stats(cache_dir)
+        stats["hits"] = stats.get("hits", 0) + hits
+        stats["misses"] = stats.get("misses", 0) + misses
+        stats["last_run"] = time.time()
+        write_atomic(cache_dir / STATS_FILE, json.dumps(stats).encode())
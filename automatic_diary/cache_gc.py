@@ -0,0 +1,351 @@
+"""Report the size and hit rate of the caches and evict old entries from them.
+
+The cache directories are those of the provider configs in a configuration file ("cache_dir")
+and optionally the item cache directory, see `item_cache`. Entries are evicted in this order:
+
+1. Superseded git logs: only the most recently used log of each repository is kept, because a
+   new one is written whenever the HEAD of the repository moves.
+2. Entries not used for longer than the maximum age.
+3. The least recently used entries of a provider, until its caches fit in its size budget.
+4. The least recently used entries of all providers, until all caches fit in the global budget.
+
+The CalDAV cache of a config is evicted only as a whole, because the provider uses it only when
+it holds all the events.
+
+gc also deletes the temporary files left behind by runs killed while writing an entry.
+
+When the caches are stored in a cache pack (--cache-pack), the entries are read from and evicted
+from the pack instead, see `cache_pack`.
+"""
+
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+from automatic_diary.cache import (
+    COMPLETE_FILE, TMP_SUFFIX, entry_key, is_cache_entry, read_stats, remove_lock,
+)
+from automatic_diary.cache_pack import CachePack
+from automatic_diary.cli import load_configs
+
+logger = logging.getLogger(__name__)
+
+ITEM_CACHE = "item-cache"
+
+# Providers whose cache directory is one entry.
+WHOLE_DIR_PROVIDERS = frozenset(("caldav",))
+
+# Temporary files older than this number of seconds are left behind by killed runs.
+STALE_TMP_AGE = 3600
+
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+_size_re = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", re.IGNORECASE)
+
+
+def parse_size(size: str) -> int:
+    """Parse a size like "500M" or "2GiB" into a number of bytes."""
+    m = _size_re.match(size)
+    if not m:
+        raise ValueError(f"Invalid size {size!r}")
+    return int(float(m.group(1)) * SIZE_UNITS[m.group(2).upper()])
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+
+@dataclass
+class CacheEntry:
+    provider: str
+    paths: list[Path]
+    size: int
+    last_used: float
+
+
+@dataclass
+class CacheDir:
+    provider: str
+    path: Path
+    entries: list[CacheEntry] = field(default_factory=list)
+    stale_tmp_paths: list[Path] = field(default_factory=list)
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def size(self) -> int:
+        return sum(entry.size for entry in self.entries)
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        total = self.hits + self.misses
+        return self.hits / total if total else None
+
+
+def scan_cache_dir(provider: str, path: Path, pack: Optional[CachePack] = None) -> CacheDir:
+    cache_dir = CacheDir(provider, path)
+    stats = pack.read_stats(path) if pack is not None else read_stats(path)
+    cache_dir.hits = stats.get("hits", 0)
+    cache_dir.misses = stats.get("misses", 0)
+    entries = []
+    if pack is not None:
+        for entry_path, size, last_used in pack.list_dir(path):
+            entries.append(CacheEntry(provider, [entry_path], size, last_used))
+    else:
+        stale_mtime = time.time() - STALE_TMP_AGE
+        for dir_path, _, file_names in os.walk(path):
+            for file_name in file_names:
+                file_path = Path(dir_path) / file_name
+                if file_name.endswith(TMP_SUFFIX):
+                    if file_path.stat().st_mtime < stale_mtime:
+                        cache_dir.stale_tmp_paths.append(file_path)
+                    continue
+                if not is_cache_entry(file_path):
+                    continue
+                st = file_path.stat()
+                entries.append(CacheEntry(provider, [file_path], st.st_size, st.st_mtime))
+    if provider in WHOLE_DIR_PROVIDERS and entries:
+        complete_path = path / COMPLETE_FILE
+        entries = [
+            CacheEntry(
+                provider,
+                [entry_path for entry in entries for entry_path in entry.paths]
+                + ([complete_path] if pack is None and complete_path.is_file() else []),
+                sum(entry.size for entry in entries),
+                max(entry.last_used for entry in entries),
+            )
+        ]
+    cache_dir.entries = entries
+    return cache_dir
+
+
+def find_cache_dirs(
+    configs: Iterable[tuple[str, dict]],
+    item_cache_dir: Optional[str] = None,
+    pack: Optional[CachePack] = None,
+) -> list[CacheDir]:
+    """Scan the cache directories of provider configs, each directory once.
+
+    When a `pack` is passed, the entries of the provider configs are read from it. The item cache
+    is always stored in files.
+    """
+    paths: dict[Path, str] = {}
+    for provider, config in configs:
+        if config.get("cache_dir"):
+            paths.setdefault(Path(config["cache_dir"]), provider)
+    cache_dirs = [
+        scan_cache_dir(provider, path, pack)
+        for path, provider in paths.items()
+        if pack is not None or path.is_dir()
+    ]
+    if item_cache_dir and Path(item_cache_dir).is_dir():
+        cache_dirs.append(scan_cache_dir(ITEM_CACHE, Path(item_cache_dir)))
+    return cache_dirs
+
+
+def superseded_git_entries(cache_dirs: Iterable[CacheDir]) -> list[CacheEntry]:
+    """Return all but the most recently used log of each git repository."""
+    by_repo: dict[Path, list[CacheEntry]] = {}
+    for cache_dir in cache_dirs:
+        if cache_dir.provider != "git":
+            continue
+        for entry in cache_dir.entries:
+            by_repo.setdefault(entry.paths[0].parent, []).append(entry)
+    superseded = []
+    for entries in by_repo.values():
+        entries.sort(key=lambda entry: entry.last_used)
+        superseded.extend(entries[:-1])
+    return superseded
+
+
+def _evict_to_budget(entries: list[CacheEntry], evicted: dict[int, CacheEntry], budget: int):
+    kept = sorted(
+        (entry for entry in entries if id(entry) not in evicted),
+        key=lambda entry: entry.last_used,
+    )
+    size = sum(entry.size for entry in kept)
+    for entry in kept:
+        if size <= budget:
+            break
+        evicted[id(entry)] = entry
+        size -= entry.size
+
+
+def plan_gc(
+    cache_dirs: Sequence[CacheDir],
+    max_age: Optional[float] = None,
+    max_size: Optional[int] = None,
+    provider_max_sizes: Optional[dict[str, int]] = None,
+    now: Optional[float] = None,
+) -> list[CacheEntry]:
+    """Return the entries to evict; `max_age` is in seconds, the sizes in bytes."""
+    if now is None:
+        now = time.time()
+    entries = [entry for cache_dir in cache_dirs for entry in cache_dir.entries]
+    evicted = {id(entry): entry for entry in superseded_git_entries(cache_dirs)}
+    if max_age is not None:
+        for entry in entries:
+            if entry.last_used < now - max_age:
+                evicted[id(entry)] = entry
+    for provider, budget in (provider_max_sizes or {}).items():
+        provider_entries = [entry for entry in entries if entry.provider == provider]
+        _evict_to_budget(provider_entries, evicted, budget)
+    if max_size is not None:
+        _evict_to_budget(entries, evicted, max_size)
+    return list(evicted.values())
+
+
+def remove_entries(
+    entries: Iterable[CacheEntry],
+    cache_dirs: Iterable[CacheDir],
+    pack: Optional[CachePack] = None,
+):
+    """Delete the files of entries and the directories left empty in the cache directories.
+
+    The lock files of the entries are deleted too, unless another run holds them. When a `pack` is
+    passed, the entries of the provider configs are deleted from it.
+    """
+    roots = {cache_dir.path for cache_dir in cache_dirs}
+    for entry in entries:
+        if pack is not None and entry.provider != ITEM_CACHE:
+            pack.delete(entry.paths)
+            continue
+        for path in entry.paths:
+            logger.info("Removing %s", path)
+            path.unlink(missing_ok=True)
+            if remove_lock(entry_key(path)):
+                logger.info("Keeping the lock of %s, which is in use", path)
+            parent = path.parent
+            while parent not in roots and parent != parent.parent and not any(parent.iterdir()):
+                parent.rmdir()
+                parent = parent.parent
+
+
+def remove_stale_tmp_files(cache_dirs: Iterable[CacheDir]):
+    for cache_dir in cache_dirs:
+        for path in cache_dir.stale_tmp_paths:
+            logger.info("Removing %s", path)
+            path.unlink(missing_ok=True)
+
+
+def format_stats(cache_dirs: Sequence[CacheDir]) -> str:
+    lines = [f"{'Provider':<12} {'Entries':>8} {'Size':>11} {'Hit rate':>9}  Directory"]
+    for cache_dir in cache_dirs:
+        hit_rate = cache_dir.hit_rate
+        formatted_hit_rate = f"{hit_rate:.0%}" if hit_rate is not None else "-"
+        lines.append(
+            f"{cache_dir.provider:<12} {len(cache_dir.entries):>8} "
+            f"{format_size(cache_dir.size):>11} {formatted_hit_rate:>9}  {cache_dir.path}"
+        )
+    total = sum(cache_dir.size for cache_dir in cache_dirs)
+    lines.append(f"{'Total':<12} {'':>8} {format_size(total):>11}")
+    return "\n".join(lines) + "\n"
+
+
+def format_gc(evicted: Sequence[CacheEntry], dry_run: bool) -> str:
+    by_provider: dict[str, list[CacheEntry]] = {}
+    for entry in evicted:
+        by_provider.setdefault(entry.provider, []).append(entry)
+    verb = "Would reclaim" if dry_run else "Reclaimed"
+    lines = [
+        f"{verb} {format_size(sum(entry.size for entry in entries))} "
+        f"({len(entries)} entries) of {provider}"
+        for provider, entries in sorted(by_provider.items())
+    ]
+    lines.append(f"{verb} {format_size(sum(entry.size for entry in evicted))} in total")
+    return "\n".join(lines) + "\n"
+
+
+def _parse_provider_size(value: str) -> tuple[str, int]:
+    provider, sep, size = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected PROVIDER=SIZE, got {value!r}")
+    try:
+        return provider, parse_size(size)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _parse_size_arg(value: str) -> int:
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="automatic-diary cache",
+        description="Report the size and hit rate of the caches or evict old entries from them",
+    )
+    parser.add_argument("action", choices=("stats", "gc"), help="What to do with the caches")
+    parser.add_argument("config_path", help="Configuration file path")
+    parser.add_argument(
+        "--item-cache-dir", metavar="DIR", help="Include also this item cache directory"
+    )
+    parser.add_argument(
+        "--cache-pack",
+        metavar="PATH",
+        help="Read the caches from this cache pack file, like automatic-diary --cache-pack",
+    )
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        metavar="DAYS",
+        help="gc: evict entries which haven't been used for this number of days",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=_parse_size_arg,
+        metavar="SIZE",
+        help="gc: evict least recently used entries until all caches fit in SIZE, e.g. 500M",
+    )
+    parser.add_argument(
+        "--provider-max-size",
+        type=_parse_provider_size,
+        action="append",
+        default=[],
+        metavar="PROVIDER=SIZE",
+        help=(
+            "gc: evict least recently used entries until the caches of a provider fit in SIZE; "
+            "pass the option several times to set the sizes of several providers"
+        ),
+    )
+    parser.add_argument(
+        "-n", "--dry-run", action="store_true", help="gc: only report what would be evicted"
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Enable debugging output"
+    )
+    args = parser.parse_args(argv)
+    if args.verbose:
+        logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(message)s")
+    pack = CachePack(args.cache_pack) if args.cache_pack else None
+    cache_dirs = find_cache_dirs(load_configs(args.config_path), args.item_cache_dir, pack)
+    if args.action == "stats":
+        sys.stdout.write(format_stats(cache_dirs))
+        if pack is not None:
+            pack.close()
+        return
+    evicted = plan_gc(
+        cache_dirs,
+        max_age=args.max_age * 24 * 3600 if args.max_age is not None else None,
+        max_size=args.max_size,
+        provider_max_sizes=dict(args.provider_max_size),
+    )
+    if not args.dry_run:
+        remove_entries(evicted, cache_dirs, pack)
+        remove_stale_tmp_files(cache_dirs)
+    if pack is not None:
+        pack.close()
+    sys.stdout.write(format_gc(evicted, args.dry_run))
@@ -0,0 +1,139 @@
+"""Packed cache: all cache entries of the providers in one SQLite file.
+
+Each entry is a row keyed by the path of the file it would be stored in otherwise, so the
+providers address their entries the same way with both backends, and the entries of a cache
+directory are read with a single range query over the keys. On network file systems, this saves
+the opening of thousands of small files on each cached run.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    compression TEXT NOT NULL,
+    data BLOB NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    cache_dir TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL,
+    misses INTEGER NOT NULL,
+    last_run REAL NOT NULL
+);
+"""
+
+
+def pack_key(path: Path) -> str:
+    return Path(os.path.abspath(path)).as_posix()
+
+
+def _prefix_range(dir_path: Path) -> tuple[str, str]:
+    """Return the range of the keys of the entries in a directory, including subdirectories."""
+    prefix = pack_key(dir_path).rstrip("/")
+    # "0" is the character after "/".
+    return f"{prefix}/", f"{prefix}0"
+
+
+class CachePack:
+    """SQLite file of cache entries, shared by the threads of the providers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get(self, path: Path, touch_interval: float) -> Optional[tuple[str, bytes]]:
+        """Return the compression and data of an entry and mark it as used."""
+        key = pack_key(path)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT compression, data, last_used FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            compression, data, last_used = row
+            if now - last_used > touch_interval:
+                self._connection.execute(
+                    "UPDATE entries SET last_used = ? WHERE key = ?", (now, key)
+                )
+                self._connection.commit()
+        return compression, data
+
+    def contains(self, path: Path) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM entries WHERE key = ?", (pack_key(path),)
+            ).fetchone()
+        return row is not None
+
+    def get_dir(self, dir_path: Path) -> list[tuple[str, bytes]]:
+        """Return the compression and data of all entries in a directory."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT compression, data FROM entries WHERE key >= ? AND key < ? ORDER BY key",
+                _prefix_range(dir_path),
+            ).fetchall()
+
+    def put_many(self, entries: Iterable[tuple[Path, str, bytes]]):
+        """Insert or replace entries (path, compression, data) in one transaction."""
+        now = time.time()
+        rows = [(pack_key(path), compression, data, now) for path, compression, data in entries]
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO entries (key, compression, data, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._connection.commit()
+
+    def list_dir(self, dir_path: Path) -> list[tuple[Path, int, float]]:
+        """Return the path, size and last use time of all entries in a directory."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key, length(data), last_used FROM entries WHERE key >= ? AND key < ?",
+                _prefix_range(dir_path),
+            ).fetchall()
+        return [(Path(key), size, last_used) for key, size, last_used in rows]
+
+    def delete(self, paths: Iterable[Path]):
+        with self._lock:
+            self._connection.executemany(
+                "DELETE FROM entries WHERE key = ?", ((pack_key(path),) for path in paths)
+            )
+            self._connection.commit()
+
+    def read_stats(self, cache_dir: Path) -> dict:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT hits, misses, last_run FROM stats WHERE cache_dir = ?",
+                (pack_key(cache_dir),),
+            ).fetchone()
+        if row is None:
+            return {}
+        return dict(zip(("hits", "misses", "last_run"), row))
+
+    def record_stats(self, cache_dir: Path, hits: int, misses: int):
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO stats (cache_dir, hits, misses, last_run) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (cache_dir) DO UPDATE SET hits = hits + excluded.hits, "
+                "misses = misses + excluded.misses, last_run = excluded.last_run",
+                (pack_key(cache_dir), hits, misses, time.time()),
+            )
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,38 +1,58 @@
 import argparse
-import csv
-import dataclasses
+import bisect
+import contextlib
 import datetime
+import functools
+import heapq
 import importlib
+import itertools
 import json
 import logging
+import operator
+import os
 import os.path
-import random
-import string
+import queue
 import sys
-import unicodedata
-from typing import Iterable, Iterator, Optional
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Generator, Iterable, Iterator, Optional, Sequence
 
 from automatic_diary import __title__
-from automatic_diary.model import Item
+from automatic_diary.batches import BATCH_SIZE, batched, provider_batches
+from automatic_diary.cache import record_stats, set_cache_pack
+from automatic_diary.config import config_id
+from automatic_diary.dedup import WindowedDeduplicator
+from automatic_diary.fuzzy import DEFAULT_THRESHOLD as DEFAULT_FUZZY_THRESHOLD, FuzzyDeduplicator
+from automatic_diary.metrics import FORMATS, ProviderMetrics, RunMetrics, measured
+from automatic_diary.model import (
+    DateRange, Item, get_tz, localize, set_default_tz, set_target_tz, timestamp_key,
+)
+from automatic_diary.sinks import STDOUT, Sink, open_sink
+from automatic_diary.sort import DEFAULT_BUFFER_SIZE, external_sort_batches
+from automatic_diary.update import Watermarks, read_csv_records, watermarks_path
+
+if TYPE_CHECKING:
+    from automatic_diary.item_cache import ItemCache
+    from automatic_diary.profiling import Profiler
 
 logger = logging.getLogger(__name__)
 
 dir_ = os.path.dirname(__file__)
 
+# Maximum number of batches of items that provider threads can produce ahead of the consumer.
+QUEUE_SIZE = 16
 
-def _obfuscate_char(char: str) -> str:
-    category = unicodedata.category(char)
-    if category == "Lu":
-        return random.choice(string.ascii_uppercase)
-    if category == "Ll":
-        return random.choice(string.ascii_lowercase)
-    if category == "Nd":
-        return random.choice(string.digits)
-    return char
+_DONE = object()
 
+# Subcommands, which are run instead of collecting items when passed as the first argument.
+COMMANDS = {
+    "batch": "automatic_diary.batch",
+    "cache": "automatic_diary.cache_gc",
+    "merge": "automatic_diary.merge",
+}
 
-def obfuscate(s: str) -> str:
-    return "".join(_obfuscate_char(char) for char in s)
+_record_key = operator.itemgetter(0)
 
 
 def load_configs(
@@ -47,42 +67,344 @@ def load_configs(
             yield provider, config
 
 
-def call_providers(
-    configs: Iterable[tuple[str, dict]], no_cache: bool
-) -> Iterator[Item]:
-    for provider, config in configs:
-        name = f"automatic_diary.providers.{provider}.main"
+def _call_provider(
+    provider: str,
+    config: dict,
+    no_cache: bool,
+    date_range: DateRange,
+    watermarks: Optional[Watermarks] = None,
+    run_metrics: Optional[RunMetrics] = None,
+    profiler: Optional["Profiler"] = None,
+    item_cache: Optional["ItemCache"] = None,
+) -> Iterator[list[Item]]:
+    name = f"automatic_diary.providers.{provider}.main"
+    config_id_ = config_id(provider, config)
+    metrics = (
+        run_metrics.add(provider, config_id_)
+        if run_metrics is not None
+        else ProviderMetrics(provider, config_id_)
+    )
+    try:
+        logger.info("Running provider %s", name)
+        module = importlib.import_module(name)
+    except ModuleNotFoundError:
+        logger.error("Provider %s not found", provider)
+        metrics.errors += 1
+        return
+    try:
+        if watermarks is not None:
+            date_range = date_range.intersection(watermarks.date_range(config_id_))
+        batches: Iterable[list[Item]] = measured(
+            metrics,
+            lambda: (
+                item_cache.provider_batches(provider, module, config, no_cache, date_range)
+                if item_cache is not None
+                else provider_batches(module, config, no_cache, date_range)
+            ),
+            batches=True,
+        )
+        if profiler is not None:
+            batches = profiler.profiled(f"{provider}-{config_id_}", batches)
+        if date_range.bounded:
+            batches = (
+                [item for item in batch if item.datetime_ in date_range] for batch in batches
+            )
+        if watermarks is not None:
+            batches = watermarks.track_batches(provider, config_id_, batches)
+        for batch in batches:
+            if batch:
+                yield batch
+    except Exception as e:
+        logger.error("Error while calling provider %s", provider)
+        logger.error(e)
+        metrics.errors += 1
+    finally:
+        if config.get("cache_dir"):
+            record_stats(Path(config["cache_dir"]), metrics.cache_hits, metrics.cache_misses)
+
+
+def _put(q: queue.Queue, obj: object, stop: threading.Event) -> bool:
+    while not stop.is_set():
         try:
-            logger.info("Running provider %s", name)
-            module = importlib.import_module(name)
-        except ModuleNotFoundError:
-            logger.error("Provider %s not found", provider)
+            q.put(obj, timeout=0.1)
+            return True
+        except queue.Full:
             continue
+    return False
+
+
+def _call_providers_in_pool(
+    configs: Iterable[tuple[str, dict]],
+    call_provider: Callable[[str, dict], Iterator[list[Item]]],
+    jobs: int,
+) -> Iterator[list[Item]]:
+    """Run providers in a thread pool and yield their batches of items as they arrive.
+
+    Threads are used rather than processes, because the providers spend most of their time
+    waiting for subprocesses, network and disk, and because their items don't need to be pickled
+    this way.
+    """
+    q: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    stop = threading.Event()
+
+    def drain(provider: str, config: dict):
         try:
-            yield from module.main(config, no_cache)  # type: ignore
-        except Exception as e:
-            logger.error("Error while calling provider %s", provider)
-            logger.error(e)
-
-
-def write_csv(items: Iterable[Item], path: str):
-    now = datetime.datetime.now().astimezone()
-    with open(path, "w") as f:
-        writer = csv.writer(f, lineterminator="\n")
-        encountered_item_tuples: set[tuple[str, str, str, str]] = set()
-        for item in sorted(items):
-            if item.datetime_ > now:
+            if stop.is_set():
+                return
+            for batch in call_provider(provider, config):
+                if not _put(q, batch, stop):
+                    return
+        finally:
+            _put(q, _DONE, stop)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="provider")
+    try:
+        futures = [executor.submit(drain, provider, config) for provider, config in configs]
+        remaining = len(futures)
+        while remaining:
+            obj = q.get()
+            if obj is _DONE:
+                remaining -= 1
+            else:
+                yield obj  # type: ignore
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def call_provider_batches(
+    configs: Iterable[tuple[str, dict]],
+    no_cache: bool,
+    jobs: int = 1,
+    watermarks: Optional[Watermarks] = None,
+    date_range: DateRange = DateRange(),
+    run_metrics: Optional[RunMetrics] = None,
+    profiler: Optional["Profiler"] = None,
+    item_cache: Optional["ItemCache"] = None,
+) -> Generator[list[Item], None, None]:
+    """Call the configured providers and yield their items in batches, see `batches`.
+
+    Only items within `date_range` are yielded. The range is passed to the providers, so that they
+    can skip reading data outside of it.
+
+    When `watermarks` are passed, only items that are not older than the watermark of their config
+    are yielded and the watermarks are updated.
+
+    When `run_metrics` are passed, metrics of each provider config are added to them.
+
+    When a `profiler` is passed, each provider config is profiled separately. Providers then run
+    one at a time, because memory allocations can't be told apart by thread.
+
+    When an `item_cache` is passed, the items of providers which read local files are cached in it,
+    see `item_cache`.
+    """
+    call_provider = functools.partial(
+        _call_provider,
+        no_cache=no_cache,
+        date_range=date_range,
+        watermarks=watermarks,
+        run_metrics=run_metrics,
+        profiler=profiler,
+        item_cache=item_cache,
+    )
+    if jobs > 1 and profiler is not None:
+        logger.warning("Running providers one at a time, because profiling is enabled")
+    elif jobs > 1:
+        yield from _call_providers_in_pool(configs, call_provider, jobs)
+        return
+    for provider, config in configs:
+        yield from call_provider(provider, config)
+
+
+def call_providers(configs: Iterable[tuple[str, dict]], *args, **kwargs) -> Iterator[Item]:
+    """Call the configured providers and yield their items, see `call_provider_batches`."""
+    batches = call_provider_batches(configs, *args, **kwargs)
+    try:
+        for batch in batches:
+            yield from batch
+    finally:
+        batches.close()
+
+
+def _batch_records(
+    batches: Iterable[list[Item]],
+) -> Iterator[list[tuple[int, int, str, str, str, str]]]:
+    seq = 0
+    for batch in batches:
+        yield [(item.row_key, seq + i, *item.astuple()) for i, item in enumerate(batch)]
+        seq += len(batch)
+
+
+def write_batches(
+    batches: Iterable[list[Item]],
+    sinks: Sequence[Sink],
+    sort_buffer_size: int = DEFAULT_BUFFER_SIZE,
+    merge_path: Optional[str] = None,
+    fuzzy: Optional[FuzzyDeduplicator] = None,
+) -> Counter[str]:
+    """Write batches of items sorted and without duplicates to several sinks in a single pass.
+
+    When `merge_path` is passed, merge the items with the rows of that file. When `fuzzy` is
+    passed, drop also near-duplicates, see `write_records`.
+
+    Return the number of dropped duplicates by provider.
+    """
+    records: Iterator[tuple] = external_sort_batches(_batch_records(batches), sort_buffer_size)
+    if merge_path:
+        logger.info("Merging with existing %s", merge_path)
+        records = heapq.merge(read_csv_records(merge_path), records)
+    return write_records(records, sinks, fuzzy)
+
+
+def write_records(
+    records: Iterator[tuple],
+    sinks: Sequence[Sink],
+    fuzzy: Optional[FuzzyDeduplicator] = None,
+) -> Counter[str]:
+    """Write sorted records (key, seq, *row) to several sinks in a single pass.
+
+    Records newer than now are cut off and duplicate records are dropped. When `fuzzy` is passed,
+    near-duplicate records of different providers are dropped too. Return the number of dropped
+    duplicates by provider.
+    """
+    now_key = timestamp_key(datetime.datetime.now().astimezone())
+    deduplicator = WindowedDeduplicator()
+    with contextlib.ExitStack() as stack:
+        writers = [stack.enter_context(sink) for sink in sinks]
+        while sorted_batch := list(itertools.islice(records, BATCH_SIZE)):
+            in_future = sorted_batch[-1][0] > now_key
+            if in_future:
+                del sorted_batch[bisect.bisect_right(sorted_batch, now_key, key=_record_key):]
+            unique_batch = deduplicator.unique(sorted_batch)
+            if fuzzy is not None:
+                unique_batch = fuzzy.unique(unique_batch)
+            for writer in writers:
+                writer.write_batch(unique_batch)
+            if in_future:
                 break
-            item_tuple = item.astuple()
-            if item_tuple not in encountered_item_tuples:
-                writer.writerow(item_tuple)
-                encountered_item_tuples.add(item_tuple)
+    duplicates_by_provider = deduplicator.duplicates_by_provider
+    for provider, count in duplicates_by_provider.items():
+        logger.info("Dropped %d duplicate items of provider %s", count, provider)
+    if fuzzy is not None:
+        for provider, count in fuzzy.duplicates_by_provider.items():
+            logger.info("Dropped %d near-duplicate items of provider %s", count, provider)
+        duplicates_by_provider = duplicates_by_provider + fuzzy.duplicates_by_provider
+    return duplicates_by_provider
+
+
+def write_csv(
+    items: Iterable[Item],
+    path: str,
+    sort_buffer_size: int = DEFAULT_BUFFER_SIZE,
+    merge_existing: bool = False,
+    columnar_path: Optional[str] = None,
+    sqlite_path: Optional[str] = None,
+    extra_paths: Sequence[str] = (),
+    fuzzy: Optional[FuzzyDeduplicator] = None,
+) -> Counter[str]:
+    """Write items sorted and without duplicates to a CSV file, see `write_csv_batches`."""
+    return write_csv_batches(
+        batched(items),
+        path,
+        sort_buffer_size,
+        merge_existing,
+        columnar_path,
+        sqlite_path,
+        extra_paths,
+        fuzzy,
+    )
+
+
+def write_csv_batches(
+    batches: Iterable[list[Item]],
+    path: str,
+    sort_buffer_size: int = DEFAULT_BUFFER_SIZE,
+    merge_existing: bool = False,
+    columnar_path: Optional[str] = None,
+    sqlite_path: Optional[str] = None,
+    extra_paths: Sequence[str] = (),
+    fuzzy: Optional[FuzzyDeduplicator] = None,
+) -> Counter[str]:
+    """Write batches of items sorted and without duplicates to a CSV file.
+
+    The format of the file and of `extra_paths` is chosen by their names, see `open_sink`. Files
+    are replaced atomically.
+
+    When `merge_existing` is true and the file already exists, merge the items into it instead of
+    overwriting it.
+
+    When `columnar_path` is passed, write the same rows also to a columnar file. When `sqlite_path`
+    is passed, insert them into a SQLite database.
+
+    When `fuzzy` is passed, drop also near-duplicate items of different providers.
+
+    Return the number of dropped duplicates by provider.
+    """
+    sinks = open_sinks(path, extra_paths, columnar_path, sqlite_path)
+    merge_path = path if merge_existing and os.path.isfile(path) else None
+    return write_batches(batches, sinks, sort_buffer_size, merge_path, fuzzy)
+
+
+def open_sinks(
+    path: str,
+    extra_paths: Sequence[str] = (),
+    columnar_path: Optional[str] = None,
+    sqlite_path: Optional[str] = None,
+) -> list[Sink]:
+    sinks: list[Sink] = [open_sink(path)]
+    sinks.extend(open_sink(extra_path) for extra_path in extra_paths)
+    if columnar_path:
+        from automatic_diary.columnar import ColumnarWriter
+
+        sinks.append(ColumnarWriter(columnar_path))
+    if sqlite_path:
+        from automatic_diary.database import SQLiteWriter
+
+        sinks.append(SQLiteWriter(sqlite_path))
+    return sinks
+
+
+def load_watermarks(output_path: str) -> Watermarks:
+    """Load the watermarks of an output file, or start new ones if there is no output yet."""
+    now_key = timestamp_key(datetime.datetime.now().astimezone())
+    watermarks_path_ = watermarks_path(output_path)
+    if os.path.isfile(watermarks_path_) and os.path.isfile(output_path):
+        return Watermarks.load(watermarks_path_, now_key)
+    return Watermarks(now_key)
+
+
+def create_fuzzy_deduplicator(
+    providers: Optional[Sequence[str]], threshold: float
+) -> Optional[FuzzyDeduplicator]:
+    """Create the near-duplicate detection of the option --fuzzy-dedup, if it was passed."""
+    if not providers:
+        return None
+    return FuzzyDeduplicator(None if "all" in providers else providers, threshold)
 
 
 def main():
-    parser = argparse.ArgumentParser(prog="automatic-diary", description=__title__)
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        module = importlib.import_module(COMMANDS[sys.argv[1]])
+        module.main(sys.argv[2:])
+        return
+    parser = argparse.ArgumentParser(
+        prog="automatic-diary",
+        description=__title__,
+        epilog=(
+            "Other commands: "
+            + ", ".join(f"automatic-diary {command} --help" for command in COMMANDS)
+        ),
+    )
     parser.add_argument("config_path", help="Configuration file path")
-    parser.add_argument("output_csv_path", help="Output CSV file path")
+    parser.add_argument(
+        "output_csv_path",
+        help=(
+            "Output CSV file path; use the suffix .jsonl to write JSON Lines, add the suffix .gz "
+            "to compress the file with gzip, or pass - to write CSV to stdout"
+        ),
+    )
     parser.add_argument(
         "-p",
         "--provider",
@@ -97,17 +419,220 @@ def main():
         "-v", "--verbose", action="store_true", help="Enable debugging output"
     )
     parser.add_argument("-n", "--no-cache", action="store_true", help="Don't use cache")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of providers to run concurrently (default: 1)",
+    )
     parser.add_argument(
         "-o",
         "--obfuscate",
         action="store_true",
         help="Obfuscate the text output (to publish examples and screenshots)",
     )
+    parser.add_argument(
+        "--obfuscate-seed",
+        help=(
+            "Secret seed of the obfuscation, to obfuscate the same words the same way in several "
+            "runs; by default, a random seed is used"
+        ),
+    )
+    parser.add_argument(
+        "--sort-buffer-size",
+        type=int,
+        default=DEFAULT_BUFFER_SIZE,
+        metavar="N",
+        help=(
+            "Maximum number of items kept in memory while sorting; "
+            f"more items are spilled to temporary files (default: {DEFAULT_BUFFER_SIZE})"
+        ),
+    )
+    parser.add_argument(
+        "-u",
+        "--update",
+        action="store_true",
+        help=(
+            "Only collect items newer than those collected by the previous run with this option "
+            "and merge them into the existing output file"
+        ),
+    )
+    parser.add_argument(
+        "--since",
+        type=datetime.datetime.fromisoformat,
+        help="Only collect items from this date or datetime on (ISO 8601 format)",
+    )
+    parser.add_argument(
+        "--until",
+        type=datetime.datetime.fromisoformat,
+        help="Only collect items before this date or datetime (ISO 8601 format)",
+    )
+    parser.add_argument(
+        "--timezone",
+        type=get_tz,
+        help=(
+            "Timezone of datetimes without one, in the output as well as in --since and --until, "
+            "and in which items are grouped into days (default: Europe/Prague, and the system "
+            "timezone for days)"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="Write metrics of each provider (time, items, cache hits, errors...) to this file",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        choices=FORMATS,
+        default="json",
+        help=(
+            "Format of the metrics file; use prometheus for the node_exporter textfile collector "
+            "(default: json)"
+        ),
+    )
+    parser.add_argument(
+        "--columnar-output",
+        metavar="PATH",
+        help=(
+            "Write the items also to this file in a compact columnar binary format, "
+            "which automatic-diary-visualize reads without parsing"
+        ),
+    )
+    parser.add_argument(
+        "--extra-output",
+        action="append",
+        default=[],
+        metavar="PATH",
+        help=(
+            "Write the items also to this file, in the format given by its name like the output "
+            "file; pass the option several times to write several files"
+        ),
+    )
+    parser.add_argument(
+        "--sqlite",
+        metavar="PATH",
+        help=(
+            "Insert the items also into this SQLite database, indexed by time, provider and day; "
+            "items already in the database are skipped"
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help=(
+            "Profile each provider config with cProfile and tracemalloc and write the profiles "
+            "and a summary of the top functions and peak memory to this directory"
+        ),
+    )
+    parser.add_argument(
+        "--item-cache-dir",
+        metavar="DIR",
+        help=(
+            "Cache the items of providers which read local files in this directory and load them "
+            "from it when the files haven't changed (same size and modification time)"
+        ),
+    )
+    parser.add_argument(
+        "--item-cache-hash",
+        action="store_true",
+        help="Compare also a hash of the content of the files before using the item cache",
+    )
+    parser.add_argument(
+        "--cache-pack",
+        metavar="PATH",
+        help=(
+            "Store the caches of the providers (their cache_dir) in this single SQLite file "
+            "instead of many small files"
+        ),
+    )
+    parser.add_argument(
+        "--fuzzy-dedup",
+        action="append",
+        metavar="PROVIDER",
+        help=(
+            "Drop items of this provider which are similar to an item of another of the passed "
+            "providers on the same day, keeping the earlier one; pass the option several times "
+            "to compare several providers, or pass 'all' to compare all providers"
+        ),
+    )
+    parser.add_argument(
+        "--fuzzy-threshold",
+        type=float,
+        default=DEFAULT_FUZZY_THRESHOLD,
+        metavar="SIMILARITY",
+        help=(
+            "Minimum similarity (0 to 1) of the texts of items considered near-duplicates by "
+            f"--fuzzy-dedup (default: {DEFAULT_FUZZY_THRESHOLD})"
+        ),
+    )
     args = parser.parse_args()
+    to_stdout = STDOUT in (args.output_csv_path, *args.extra_output)
+    if args.update and args.output_csv_path == STDOUT:
+        parser.error("Option --update can't be used when writing to stdout")
     if args.verbose:
-        logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(message)s")
+        logging.basicConfig(
+            stream=sys.stderr if to_stdout else sys.stdout,
+            level=logging.INFO,
+            format="%(message)s",
+        )
+    if args.timezone:
+        set_default_tz(args.timezone)
+        set_target_tz(args.timezone)
     configs = load_configs(args.config_path, args.provider)
-    items = call_providers(configs, args.no_cache)
+    watermarks = load_watermarks(args.output_csv_path) if args.update else None
+    date_range = DateRange(
+        localize(args.since) if args.since else None,
+        localize(args.until) if args.until else None,
+    )
+    run_metrics = RunMetrics() if args.metrics_file else None
+    profiler = None
+    if args.profile:
+        from automatic_diary.profiling import Profiler
+
+        profiler = Profiler(args.profile)
+    cache_pack = None
+    if args.cache_pack:
+        from automatic_diary.cache_pack import CachePack
+
+        cache_pack = CachePack(args.cache_pack)
+        set_cache_pack(cache_pack)
+    item_cache = None
+    if args.item_cache_dir:
+        from automatic_diary.item_cache import ItemCache
+
+        item_cache = ItemCache(args.item_cache_dir, args.item_cache_hash)
+    batches = call_provider_batches(
+        configs,
+        args.no_cache,
+        args.jobs,
+        watermarks,
+        date_range,
+        run_metrics,
+        profiler,
+        item_cache,
+    )
     if args.obfuscate:
-        items = (dataclasses.replace(item, text=obfuscate(item.text)) for item in items)
-    write_csv(items, args.output_csv_path)
+        from automatic_diary.obfuscate import obfuscate_batches
+
+        batches = obfuscate_batches(batches, args.obfuscate_seed)
+    fuzzy = create_fuzzy_deduplicator(args.fuzzy_dedup, args.fuzzy_threshold)
+    write_csv_batches(
+        batches,
+        args.output_csv_path,
+        args.sort_buffer_size,
+        merge_existing=args.update,
+        columnar_path=args.columnar_output,
+        sqlite_path=args.sqlite,
+        extra_paths=args.extra_output,
+        fuzzy=fuzzy,
+    )
+    if watermarks is not None:
+        watermarks.save(watermarks_path(args.output_csv_path))
+    if cache_pack is not None:
+        set_cache_pack(None)
+        cache_pack.close()
+    if profiler is not None:
+        profiler.close()
+    if run_metrics is not None:
+        run_metrics.finish()
+        run_metrics.write(args.metrics_file, args.metrics_format)
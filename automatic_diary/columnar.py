@@ -0,0 +1,279 @@
+"""Compact columnar binary format of the output items.
+
+The file starts with a header that contains the number of rows and the position and length of each
+section. All numbers are little-endian and all sections are aligned to 8 bytes, so that the numeric
+columns can be used directly from a memory-mapped file without parsing:
+
+- timestamps: int64 microseconds since the Unix epoch
+- utc_offsets: int32 UTC offsets in seconds; all-day rows have an offset which makes their local
+  time midnight of their date
+- providers: uint16 indexes into the provider dictionary
+- subproviders: uint32 indexes into the subprovider dictionary
+- all_day: bitmap, one bit per row
+- text_offsets: uint64 offsets of the start of each text in the text section and its total length
+- text: UTF-8 texts
+- dictionaries: JSON object with the lists "providers" and "subproviders"
+"""
+
+import array
+import datetime
+import functools
+import json
+import logging
+import mmap
+import struct
+import sys
+from typing import IO, Iterator, Literal
+
+from automatic_diary.model import from_timestamp_key_at_offset
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ADCOL\x00\x01\x00"
+SECTIONS = (
+    "timestamps",
+    "utc_offsets",
+    "providers",
+    "subproviders",
+    "all_day",
+    "text_offsets",
+    "text",
+    "dictionaries",
+)
+HEADER = struct.Struct(f"<8sQ{len(SECTIONS) * 2}Q")
+ALIGNMENT = 8
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 86400
+
+
+def is_columnar(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+# Typecodes of the numeric columns.
+Typecode = Literal["q", "i", "H", "I", "Q"]
+
+# (timestamp key, UTC offset, provider, subprovider, text, all-day) of a row.
+Record = tuple[int, int, str, str, str, bool]
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_offset_suffix(suffix: str) -> int:
+    """Return the number of seconds of a UTC offset like "+01:00"."""
+    sign = -1 if suffix[0] == "-" else 1
+    return sign * (int(suffix[1:3]) * 3600 + int(suffix[4:6]) * 60)
+
+
+def parse_utc_offset(key: int, formatted_datetime: str) -> tuple[bool, int]:
+    """Return whether a row is all-day and its UTC offset in seconds."""
+    if len(formatted_datetime) == 10:
+        date = datetime.date.fromisoformat(formatted_datetime)
+        midnight = (date.toordinal() - EPOCH_ORDINAL) * SECONDS_PER_DAY
+        return True, midnight - key // 1000000
+    # Rows are formatted by `Item.formatted_datetime`, which ends with an offset like "+01:00"
+    # unless the offset has seconds.
+    suffix = formatted_datetime[-6:]
+    if suffix[0] in "+-" and suffix[3] == ":":
+        return False, _parse_offset_suffix(suffix)
+    utc_offset = datetime.datetime.fromisoformat(formatted_datetime).utcoffset()
+    return False, int(utc_offset.total_seconds()) if utc_offset else 0
+
+
+def _to_little_endian(a: array.array) -> bytes:
+    if sys.byteorder != "little":
+        a = array.array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+class ColumnarWriter:
+    """Write rows to a columnar file.
+
+    The numeric columns are kept in compact arrays and the texts are spooled to a temporary file
+    until the writer is closed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._timestamps = array.array("q")
+        self._utc_offsets = array.array("i")
+        self._providers = array.array("H")
+        self._subproviders = array.array("I")
+        self._all_day = bytearray()
+        self._text_offsets = array.array("Q", [0])
+        import tempfile
+
+        self._text: IO[bytes] = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+        self._provider_codes: dict[str, int] = {}
+        self._subprovider_codes: dict[str, int] = {}
+
+    def write(self, key: int, row: tuple[str, str, str, str]):
+        formatted_datetime, provider, subprovider, text = row
+        all_day, utc_offset = parse_utc_offset(key, formatted_datetime)
+        n = len(self._timestamps)
+        self._timestamps.append(key)
+        self._utc_offsets.append(utc_offset)
+        self._providers.append(self._provider_codes.setdefault(provider, len(self._provider_codes)))
+        self._subproviders.append(
+            self._subprovider_codes.setdefault(subprovider, len(self._subprovider_codes))
+        )
+        if n % 8 == 0:
+            self._all_day.append(0)
+        if all_day:
+            self._all_day[-1] |= 1 << (n % 8)
+        text_bytes = text.encode()
+        self._text.write(text_bytes)
+        self._text_offsets.append(self._text_offsets[-1] + len(text_bytes))
+
+    def write_batch(self, records: list[tuple]):
+        for record in records:
+            self.write(record[0], record[2:])
+
+    def close(self):
+        logger.info("Writing columnar file %s", self.path)
+        dictionaries = json.dumps(
+            {
+                "providers": list(self._provider_codes),
+                "subproviders": list(self._subprovider_codes),
+            }
+        ).encode()
+        sections = {
+            "timestamps": _to_little_endian(self._timestamps),
+            "utc_offsets": _to_little_endian(self._utc_offsets),
+            "providers": _to_little_endian(self._providers),
+            "subproviders": _to_little_endian(self._subproviders),
+            "all_day": bytes(self._all_day),
+            "text_offsets": _to_little_endian(self._text_offsets),
+            "text": None,
+            "dictionaries": dictionaries,
+        }
+        text_length = self._text_offsets[-1]
+        positions = []
+        position = HEADER.size
+        for name in SECTIONS:
+            length = text_length if name == "text" else len(sections[name])  # type: ignore
+            position += -position % ALIGNMENT
+            positions += [position, length]
+            position += length
+        with open(self.path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(self._timestamps), *positions))
+            for i, name in enumerate(SECTIONS):
+                f.write(b"\0" * (positions[i * 2] - f.tell()))
+                if name == "text":
+                    self._text.seek(0)
+                    while chunk := self._text.read(1024 * 1024):
+                        f.write(chunk)
+                else:
+                    f.write(sections[name])  # type: ignore
+        self._text.close()
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._text.close()
+
+
+class ColumnarReader:
+    """Read a columnar file using memory mapping.
+
+    The numeric columns are exposed as memoryviews of the mapped file and are not copied.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, self.n_rows, *positions = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a columnar file")
+        self._sections = {
+            name: (positions[i * 2], positions[i * 2 + 1]) for i, name in enumerate(SECTIONS)
+        }
+        self.timestamps = self._column("timestamps", "q")
+        self.utc_offsets = self._column("utc_offsets", "i")
+        self.providers = self._column("providers", "H")
+        self.subproviders = self._column("subproviders", "I")
+        self.text_offsets = self._column("text_offsets", "Q")
+        self._all_day = self._section("all_day")
+        self._text = self._section("text")
+        dictionaries = json.loads(bytes(self._section("dictionaries")))
+        self.provider_names: list[str] = dictionaries["providers"]
+        self.subprovider_names: list[str] = dictionaries["subproviders"]
+
+    def _section(self, name: str) -> memoryview:
+        position, length = self._sections[name]
+        return self._view[position:position + length]
+
+    def _column(self, name: str, typecode: Typecode):
+        section = self._section(name)
+        if sys.byteorder != "little":
+            a = array.array(typecode, bytes(section))
+            a.byteswap()
+            return a
+        return section.cast(typecode)
+
+    def all_day(self, i: int) -> bool:
+        return bool(self._all_day[i >> 3] & (1 << (i & 7)))
+
+    def text(self, i: int) -> str:
+        return str(self._text[self.text_offsets[i]:self.text_offsets[i + 1]], "utf-8")
+
+    def datetime_(self, i: int) -> datetime.datetime:
+        return from_timestamp_key_at_offset(self.timestamps[i], self.utc_offsets[i])
+
+    def iter_records(self) -> Iterator[Record]:
+        """Yield (key, UTC offset, provider, subprovider, text, all_day) of each row.
+
+        The columns are read into local variables once, because this loop reads all rows.
+        """
+        timestamps = self.timestamps
+        utc_offsets = self.utc_offsets
+        providers = self.providers
+        subproviders = self.subproviders
+        provider_names = self.provider_names
+        subprovider_names = self.subprovider_names
+        all_day = self._all_day
+        text = self._text
+        text_offsets = self.text_offsets
+        for i in range(self.n_rows):
+            yield (
+                timestamps[i],
+                utc_offsets[i],
+                provider_names[providers[i]],
+                subprovider_names[subproviders[i]],
+                str(text[text_offsets[i]:text_offsets[i + 1]], "utf-8"),
+                bool(all_day[i >> 3] & (1 << (i & 7))),
+            )
+
+    def iter_rows(self) -> Iterator[tuple[datetime.datetime, str, str, str, bool]]:
+        """Yield (datetime, provider, subprovider, text, all_day) of each row."""
+        for key, utc_offset, provider, subprovider, text, all_day in self.iter_records():
+            yield (
+                from_timestamp_key_at_offset(key, utc_offset),
+                provider,
+                subprovider,
+                text,
+                all_day,
+            )
+
+    def close(self):
+        for name in ("timestamps", "utc_offsets", "providers", "subproviders", "text_offsets"):
+            column = getattr(self, name)
+            if isinstance(column, memoryview):
+                column.release()
+        self._all_day.release()
+        self._text.release()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "ColumnarReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
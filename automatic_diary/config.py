@@ -0,0 +1,14 @@
+import json
+
+# Default limits of the concurrent calls of a provider, read from its config as "concurrency" and
+# "timeout" (in seconds).
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 30.0
+
+
+def config_id(provider: str, config: dict) -> str:
+    """Return a short stable identifier of a provider configuration."""
+    import hashlib
+
+    config_json = json.dumps([provider, config], sort_keys=True)
+    return hashlib.sha256(config_json.encode()).hexdigest()[:16]
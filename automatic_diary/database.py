@@ -0,0 +1,193 @@
+"""SQLite database of the output items.
+
+Each row is stored with its timestamp, UTC offset and date in the target timezone, which are
+indexed together with provider and subprovider, so that the items of a day or of a provider can be
+looked up without reading the whole output. A unique digest of each row makes writing the same
+items again a no-op, so a database can be updated by writing new items into it.
+"""
+
+import datetime
+import hashlib
+import logging
+import sqlite3
+from typing import Iterator, Optional
+
+from automatic_diary.columnar import Record, parse_utc_offset
+from automatic_diary.model import from_timestamp_key_at_offset, key_date, timestamp_key
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SQLite format 3\x00"
+BATCH_SIZE = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    timestamp INTEGER NOT NULL,
+    utc_offset INTEGER NOT NULL,
+    all_day INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    formatted_datetime TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    subprovider TEXT NOT NULL,
+    text TEXT NOT NULL,
+    digest BLOB NOT NULL UNIQUE
+);
+CREATE INDEX IF NOT EXISTS items_timestamp ON items (timestamp);
+CREATE INDEX IF NOT EXISTS items_provider ON items (provider, subprovider);
+CREATE INDEX IF NOT EXISTS items_day ON items (day);
+"""
+
+INSERT = """
+INSERT INTO items (
+    timestamp, utc_offset, all_day, day, formatted_datetime, provider, subprovider, text, digest
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (digest) DO NOTHING
+"""
+
+
+def row_digest(row: tuple[str, ...]) -> bytes:
+    return hashlib.blake2b("\0".join(row).encode(), digest_size=16).digest()
+
+
+Row = tuple[datetime.datetime, str, str, str, bool]
+
+
+def is_sqlite(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class SQLiteWriter:
+    """Insert rows into a SQLite database, creating it if it doesn't exist.
+
+    Rows are inserted in batches in a single transaction, which is committed when the writer is
+    closed. Rows which are already in the database are skipped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.n_inserted = 0
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.executescript(SCHEMA)
+        self._batch: list[tuple] = []
+
+    def write(self, key: int, row: tuple[str, str, str, str]):
+        formatted_datetime, provider, subprovider, text = row
+        all_day, utc_offset = parse_utc_offset(key, formatted_datetime)
+        self._batch.append(
+            (
+                key,
+                utc_offset,
+                all_day,
+                formatted_datetime if all_day else key_date(key).isoformat(),
+                formatted_datetime,
+                provider,
+                subprovider,
+                text,
+                row_digest(row),
+            )
+        )
+        if len(self._batch) >= BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        cursor = self._connection.executemany(INSERT, self._batch)
+        self.n_inserted += cursor.rowcount
+        self._batch.clear()
+
+    def write_batch(self, records: list[tuple]):
+        for record in records:
+            self.write(record[0], record[2:])
+
+    def close(self):
+        self._flush()
+        self._connection.commit()
+        self._connection.close()
+        logger.info("Inserted %d new items into %s", self.n_inserted, self.path)
+
+    def __enter__(self) -> "SQLiteWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._connection.rollback()
+            self._connection.close()
+
+
+class SQLiteReader:
+    """Query items from a SQLite database written by `SQLiteWriter`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+    @property
+    def n_rows(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def iter_records(
+        self,
+        *,
+        day: Optional[datetime.date] = None,
+        provider: Optional[str] = None,
+        subprovider: Optional[str] = None,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> Iterator[Record]:
+        """Yield (key, UTC offset, provider, subprovider, text, all_day) of matching rows.
+
+        The rows are ordered by timestamp. `day` matches `Item.date` of the items, `since` and
+        `until` their aware datetime (since <= datetime < until).
+        """
+        conditions = []
+        params: list = []
+        if day is not None:
+            conditions.append("day = ?")
+            params.append(day.isoformat())
+        if provider is not None:
+            conditions.append("provider = ?")
+            params.append(provider)
+        if subprovider is not None:
+            conditions.append("subprovider = ?")
+            params.append(subprovider)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(timestamp_key(since))
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(timestamp_key(until))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = self._connection.execute(
+            "SELECT timestamp, utc_offset, provider, subprovider, text, all_day "
+            f"FROM items {where} ORDER BY timestamp, rowid",
+            params,
+        )
+        for key, utc_offset, provider_, subprovider_, text, all_day in cursor:
+            yield key, utc_offset, provider_, subprovider_, text, bool(all_day)
+
+    def iter_rows(self, **kwargs) -> Iterator[Row]:
+        """Yield (datetime, provider, subprovider, text, all_day) of matching rows.
+
+        Takes the same filters as `iter_records`.
+        """
+        for key, utc_offset, provider, subprovider, text, all_day in self.iter_records(**kwargs):
+            yield (
+                from_timestamp_key_at_offset(key, utc_offset),
+                provider,
+                subprovider,
+                text,
+                all_day,
+            )
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self) -> "SQLiteReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
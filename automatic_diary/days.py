@@ -0,0 +1,94 @@
+import bisect
+import datetime
+from typing import Optional
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 86400
+
+# How far from a timestamp to look for the boundaries of its UTC offset range. Timezones without
+# transitions get ranges of at most twice this length.
+MAX_RANGE_SECONDS = 366 * SECONDS_PER_DAY
+
+# Step of the probes of the UTC offset when looking for transitions.
+PROBE_SECONDS = 7 * SECONDS_PER_DAY
+
+# Range of timestamps [start, end) with a constant UTC offset.
+OffsetRange = tuple[int, int, int]
+
+
+class DayBucketer:
+    """Convert Unix timestamps to local dates in a timezone.
+
+    Instead of converting each timestamp with `astimezone()`, the bucketer finds the range of
+    timestamps around it that have the same UTC offset, i.e. the time between two transitions like
+    DST changes, and caches it. The date of any other timestamp in the range is then computed with
+    integer arithmetic. Since items are usually processed in time order, the last used range is
+    checked first.
+
+    Transitions are found by probing the offset week by week and then bisecting to the exact
+    second, so timezones are assumed not to have two transitions less than a week apart. Probing
+    stops at the ranges found before, so items processed in time order need one probe per week of
+    the range.
+    """
+
+    def __init__(self, tz: datetime.tzinfo):
+        self.tz = tz
+        self._starts: list[int] = []
+        self._ranges: list[OffsetRange] = []
+        self._last: Optional[OffsetRange] = None
+
+    def _offset_at(self, ts: int) -> int:
+        utc_offset = datetime.datetime.fromtimestamp(ts, self.tz).utcoffset()
+        return int(utc_offset.total_seconds()) if utc_offset else 0
+
+    def _find_boundary(self, inside: int, outside: int, offset: int) -> int:
+        """Return the timestamp closest to `outside` which still has `offset`."""
+        while abs(outside - inside) > 1:
+            middle = (inside + outside) // 2
+            if self._offset_at(middle) == offset:
+                inside = middle
+            else:
+                outside = middle
+        return inside
+
+    def _find_range(self, ts: int, min_start: int, max_end: int) -> OffsetRange:
+        """Find the range around `ts` within [min_start, max_end), the gap between known ranges."""
+        offset = self._offset_at(ts)
+        start = ts
+        while ts - start < MAX_RANGE_SECONDS and start > min_start:
+            probe = max(start - PROBE_SECONDS, min_start)
+            if self._offset_at(probe) != offset:
+                start = self._find_boundary(start, probe, offset)
+                break
+            start = probe
+        end = ts
+        while end - ts < MAX_RANGE_SECONDS and end < max_end - 1:
+            probe = min(end + PROBE_SECONDS, max_end - 1)
+            if self._offset_at(probe) != offset:
+                end = self._find_boundary(end, probe, offset)
+                break
+            end = probe
+        return start, end + 1, offset
+
+    def offset(self, ts: int) -> int:
+        """Return the UTC offset in seconds at a Unix timestamp."""
+        last = self._last
+        if last and last[0] <= ts < last[1]:
+            return last[2]
+        i = bisect.bisect_right(self._starts, ts) - 1
+        if i >= 0 and ts < self._ranges[i][1]:
+            range_ = self._ranges[i]
+        else:
+            min_start = self._ranges[i][1] if i >= 0 else -(1 << 62)
+            max_end = self._starts[i + 1] if i + 1 < len(self._starts) else 1 << 62
+            range_ = self._find_range(ts, min_start, max_end)
+            self._starts.insert(i + 1, range_[0])
+            self._ranges.insert(i + 1, range_)
+        self._last = range_
+        return range_[2]
+
+    def date(self, ts: int) -> datetime.date:
+        """Return the local date at a Unix timestamp."""
+        return datetime.date.fromordinal(
+            EPOCH_ORDINAL + (ts + self.offset(ts)) // SECONDS_PER_DAY
+        )
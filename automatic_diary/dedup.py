@@ -0,0 +1,34 @@
+from collections import Counter
+from typing import Optional
+
+
+class WindowedDeduplicator:
+    """Detect duplicate rows in a stream of rows sorted by timestamp.
+
+    Duplicate rows always share their timestamp, so only the digests of the rows with the current
+    timestamp are remembered. Memory use therefore doesn't grow with the length of the stream.
+    """
+
+    def __init__(self):
+        import hashlib
+
+        self._blake2b = hashlib.blake2b
+        self._key: Optional[int] = None
+        self._digests: set[bytes] = set()
+        self.duplicates_by_provider: Counter[str] = Counter()
+
+    def is_duplicate(self, key: int, row: tuple[str, str, str, str]) -> bool:
+        if key != self._key:
+            self._key = key
+            self._digests.clear()
+        digest = self._blake2b("\0".join(row).encode(), digest_size=16).digest()
+        if digest in self._digests:
+            self.duplicates_by_provider[row[1]] += 1
+            return True
+        self._digests.add(digest)
+        return False
+
+    def unique(self, records: list[tuple]) -> list[tuple]:
+        """Return the records (key, seq, *row) of a sorted batch whose rows are not duplicates."""
+        is_duplicate = self.is_duplicate
+        return [record for record in records if not is_duplicate(record[0], record[2:])]
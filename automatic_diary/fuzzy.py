@@ -0,0 +1,150 @@
+"""Detect near-duplicate items of different providers.
+
+The same event often comes from several providers, e.g. a CalDAV event and the same event in an
+exported .ics file, or a film rated on ČSFD and watched on Trakt. Their texts differ slightly and
+so do their times, so `dedup.WindowedDeduplicator` doesn't catch them.
+
+Items are compared only with the items of other providers on the same day, the `Item.date` by
+which they are shown (blocking). Each text is normalized and split into character trigrams
+(shingles); texts shorter than a trigram are never duplicates; an inverted index of the
+shingles of each day finds the items sharing any shingle with a new item, and the item is a
+duplicate when the Jaccard similarity of their shingles reaches a threshold. Since the stream of
+items is sorted by time, the index of a day is dropped soon after the day has passed, so the work
+and memory per item don't grow with the length of the stream.
+"""
+
+import datetime
+import itertools
+import re
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+from typing import Collection, Optional
+
+from automatic_diary.model import key_date
+
+DEFAULT_THRESHOLD = 0.7
+
+# Number of microseconds after the last item of a day after which the day is dropped from the
+# index. The items of a day can be more than 24 hours apart in UTC when they have different
+# UTC offsets.
+DAY_EXPIRY = 2 * 24 * 3600 * 1000000
+
+SHINGLE_SIZE = 3
+
+# Shingles shared by more items of a day than this are too common to find candidates with. Similar
+# items share rarer shingles too.
+MAX_POSTINGS = 100
+
+_non_word_re = re.compile(r"\W+")
+
+
+def normalize(text: str) -> str:
+    """Return the text lowercased, without diacritics and punctuation."""
+    text = text.casefold()
+    if not text.isascii():
+        decomposed = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _non_word_re.sub(" ", text).strip()
+
+
+def shingles(text: str) -> frozenset[str]:
+    """Return the shingles of a text, none when the normalized text is shorter than a shingle."""
+    normalized = normalize(text)
+    return frozenset(
+        {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    )
+
+
+class _DayIndex:
+    def __init__(self):
+        self.last_key = 0
+        self.providers: set[str] = set()
+        self.entries: list[tuple[str, frozenset[str]]] = []
+        self.postings: defaultdict[str, list[int]] = defaultdict(list)
+
+    def find_similar(self, provider: str, shingles_: frozenset[str], threshold: float) -> bool:
+        if not self.providers - {provider}:
+            return False
+        postings_lists = []
+        n_skipped = 0
+        for shingle in shingles_:
+            postings = self.postings.get(shingle)
+            if postings is None:
+                continue
+            if len(postings) > MAX_POSTINGS:
+                n_skipped += 1
+                continue
+            postings_lists.append(postings)
+        overlaps = Counter(itertools.chain.from_iterable(postings_lists))
+        # Jaccard similarity of at least the threshold requires an overlap of at least the
+        # threshold times the number of shingles, so most candidates are skipped without
+        # intersecting their shingles.
+        min_overlap = threshold * len(shingles_) - n_skipped
+        for i, overlap in overlaps.items():
+            if overlap < min_overlap:
+                continue
+            other_provider, other_shingles = self.entries[i]
+            if other_provider == provider:
+                continue
+            overlap = len(shingles_ & other_shingles)
+            if overlap / (len(shingles_) + len(other_shingles) - overlap) >= threshold:
+                return True
+        return False
+
+    def add(self, provider: str, shingles_: frozenset[str]):
+        i = len(self.entries)
+        self.providers.add(provider)
+        self.entries.append((provider, shingles_))
+        postings = self.postings
+        for shingle in shingles_:
+            postings[shingle].append(i)
+
+
+class FuzzyDeduplicator:
+    """Detect near-duplicate rows of different providers in a stream of rows sorted by timestamp.
+
+    Only rows of `providers` are compared, all rows when it's None. Of the similar rows, the first
+    one in the stream is kept.
+    """
+
+    def __init__(
+        self, providers: Optional[Collection[str]] = None, threshold: float = DEFAULT_THRESHOLD
+    ):
+        self.providers = frozenset(providers) if providers is not None else None
+        self.threshold = threshold
+        self._days: OrderedDict[datetime.date, _DayIndex] = OrderedDict()
+        self.duplicates_by_provider: Counter[str] = Counter()
+
+    def _expire(self, key: int):
+        while self._days:
+            day, index = next(iter(self._days.items()))
+            if index.last_key >= key - DAY_EXPIRY:
+                break
+            del self._days[day]
+
+    def is_duplicate(self, key: int, row: tuple[str, str, str, str]) -> bool:
+        formatted_datetime, provider, _, text = row
+        if self.providers is not None and provider not in self.providers:
+            return False
+        shingles_ = shingles(text)
+        if not shingles_:
+            return False
+        self._expire(key)
+        if len(formatted_datetime) == 10:
+            day = datetime.date.fromisoformat(formatted_datetime)
+        else:
+            day = key_date(key)
+        index = self._days.get(day)
+        if index is None:
+            index = self._days[day] = _DayIndex()
+        index.last_key = key
+        if index.find_similar(provider, shingles_, self.threshold):
+            self.duplicates_by_provider[provider] += 1
+            return True
+        index.add(provider, shingles_)
+        return False
+
+    def unique(self, records: list[tuple]) -> list[tuple]:
+        """Return the records (key, seq, *row) of a sorted batch whose rows are not duplicates."""
+        is_duplicate = self.is_duplicate
+        return [record for record in records if not is_duplicate(record[0], record[2:])]
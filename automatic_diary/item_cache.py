@@ -0,0 +1,171 @@
+"""Cache of the items of providers which read local files.
+
+A provider module can define `input_paths(config)`, which returns the paths of the files that its
+items are read from. The items of such a provider are cached together with a fingerprint of these
+files (their path, size, modification time and optionally a hash of their content) and the config.
+When nothing of that has changed, the items are loaded from the cache instead of parsing the files
+again, so an unchanged source costs only a `stat` call per file.
+
+The cache holds all items of the files, whatever the date range of the run, and the items outside
+of the range are dropped after loading. So the cache also hits in the incremental mode (--update),
+whose date range starts at a watermark which changes on every run.
+
+The items are stored as tuples of plain values (timestamp, UTC offset, text...), which are faster
+to load than the items themselves.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+from pathlib import Path
+from types import ModuleType
+from typing import Iterable, Iterator, Optional
+
+from automatic_diary import model
+from automatic_diary.batches import BATCH_SIZE, provider_batches
+from automatic_diary.cache import write_atomic
+from automatic_diary.config import config_id
+from automatic_diary.metrics import count_bytes_read, count_cache_hit, count_cache_miss
+from automatic_diary.model import DateRange, Item, localize, timestamp_key
+
+logger = logging.getLogger(__name__)
+
+VERSION = 2
+HASH_CHUNK_SIZE = 1 << 20
+
+CachedItem = tuple[int, int, bool, str, str, str, tuple[str, ...]]
+
+
+def fingerprint(paths: Iterable[Path], hash_contents: bool = False) -> list[tuple]:
+    """Return (path, size, mtime_ns, content hash or None) of each file."""
+    result = []
+    for path in paths:
+        st = os.stat(path)
+        digest = None
+        if hash_contents:
+            hash_ = hashlib.blake2b()
+            with open(path, "rb") as f:
+                while chunk := f.read(HASH_CHUNK_SIZE):
+                    hash_.update(chunk)
+            digest = hash_.hexdigest()
+        result.append((str(path), st.st_size, st.st_mtime_ns, digest))
+    return result
+
+
+def _key_range(date_range: DateRange) -> tuple[Optional[int], Optional[int]]:
+    """Return the timestamp keys of the start and the end of a date range."""
+    return (
+        timestamp_key(localize(date_range.since)) if date_range.since else None,
+        timestamp_key(localize(date_range.until)) if date_range.until else None,
+    )
+
+
+def _dump_item(item: Item) -> CachedItem:
+    utc_offset = item.datetime_.utcoffset()
+    return (
+        item.key,
+        int(utc_offset.total_seconds()) if utc_offset else 0,
+        item.all_day,
+        item.text,
+        item.provider,
+        item.subprovider,
+        tuple(item.tags),
+    )
+
+
+def _load_item(cached_item: CachedItem) -> Item:
+    key, utc_offset, all_day, text, provider, subprovider, tags = cached_item
+    return Item.from_key(key, utc_offset, text, provider, subprovider, all_day, tags)
+
+
+class ItemCache:
+    """Cache of the items of providers with `input_paths`, stored in a directory.
+
+    Each provider config has one cache file, which is replaced when its inputs change.
+    """
+
+    def __init__(self, dir_path: str, hash_contents: bool = False):
+        self.dir_path = Path(dir_path)
+        self.hash_contents = hash_contents
+
+    def cache_key(self, provider: str, config: dict, paths: Iterable[Path]) -> str:
+        key_json = json.dumps(
+            [
+                VERSION,
+                provider,
+                config,
+                repr(model.default_tz),
+                fingerprint(paths, self.hash_contents),
+            ],
+            sort_keys=True,
+        )
+        return hashlib.sha256(key_json.encode()).hexdigest()
+
+    def _read(self, path: Path, key: str) -> Optional[list[CachedItem]]:
+        try:
+            with path.open("rb") as f:
+                if pickle.load(f) != key:
+                    return None
+                cached_items = pickle.load(f)
+                count_bytes_read(f.tell())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Failed to read item cache %s: %s", path, e)
+            return None
+        return cached_items
+
+    def _write(self, path: Path, key: str, items: list[Item]):
+        logger.info("Writing item cache %s", path)
+        write_atomic(
+            path,
+            pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+            + pickle.dumps([_dump_item(item) for item in items], protocol=pickle.HIGHEST_PROTOCOL),
+        )
+
+    def provider_batches(
+        self,
+        provider: str,
+        module: ModuleType,
+        config: dict,
+        no_cache: bool,
+        date_range: DateRange,
+    ) -> Iterator[list[Item]]:
+        """Return the items of a provider in batches, from the cache if its inputs haven't changed.
+
+        Only items within `date_range` are returned. Providers without `input_paths` are called
+        directly. Otherwise the provider is called for all dates, so that the cache is complete.
+        When the provider fails, the cache is not written.
+        """
+        input_paths = getattr(module, "input_paths", None)
+        if input_paths is None:
+            yield from provider_batches(module, config, no_cache, date_range)
+            return
+        since_key, until_key = _key_range(date_range)
+        path = self.dir_path / f"{provider}-{config_id(provider, config)}.items"
+        key = self.cache_key(provider, config, input_paths(config))
+        cached_items = None if no_cache else self._read(path, key)
+        if cached_items is not None:
+            logger.info("Reading item cache %s", path)
+            count_cache_hit()
+            if since_key is not None or until_key is not None:
+                cached_items = [
+                    cached_item
+                    for cached_item in cached_items
+                    if (since_key is None or cached_item[0] >= since_key)
+                    and (until_key is None or cached_item[0] < until_key)
+                ]
+            for i in range(0, len(cached_items), BATCH_SIZE):
+                yield [_load_item(cached_item) for cached_item in cached_items[i:i + BATCH_SIZE]]
+            return
+        count_cache_miss()
+        items: list[Item] = []
+        for batch in provider_batches(module, config, no_cache, DateRange()):
+            items.extend(batch)
+            if date_range.bounded:
+                batch = [item for item in batch if item.datetime_ in date_range]
+            if batch:
+                yield batch
+        self._write(path, key, items)
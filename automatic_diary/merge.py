@@ -0,0 +1,98 @@
+"""Merge output files of several runs of automatic-diary into one timeline.
+
+Expensive providers can run on their own schedule or on another machine, each writing its own
+output file, a shard. Since the shards are sorted, they are merged as a stream, reading only one
+row of each shard at a time, with the same duplicate and future rules as a single run.
+"""
+
+import argparse
+import heapq
+import logging
+import sys
+from collections import Counter
+from typing import Optional, Sequence
+
+from automatic_diary.cli import (
+    DEFAULT_FUZZY_THRESHOLD, create_fuzzy_deduplicator, open_sinks, write_records,
+)
+from automatic_diary.fuzzy import FuzzyDeduplicator
+from automatic_diary.sinks import STDOUT, Sink
+from automatic_diary.update import read_csv_records
+
+logger = logging.getLogger(__name__)
+
+
+def merge_shards(
+    shard_paths: Sequence[str],
+    sinks: Sequence[Sink],
+    fuzzy: Optional[FuzzyDeduplicator] = None,
+) -> Counter[str]:
+    """Merge sorted shard files into sinks and return the number of dropped duplicates."""
+    logger.info("Merging %d shards", len(shard_paths))
+    records = heapq.merge(*(read_csv_records(path) for path in shard_paths))
+    return write_records(records, sinks, fuzzy)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="automatic-diary merge",
+        description=(
+            "Merge output files of automatic-diary, e.g. of runs with different providers, "
+            "into one sorted output file without duplicates"
+        ),
+    )
+    parser.add_argument(
+        "output_path",
+        help="Output file path; the format is chosen by its name like in automatic-diary",
+    )
+    parser.add_argument(
+        "shard_paths",
+        nargs="+",
+        metavar="shard_path",
+        help="Output file of automatic-diary (CSV or JSON Lines, optionally gzip-compressed)",
+    )
+    parser.add_argument(
+        "--extra-output",
+        action="append",
+        default=[],
+        metavar="PATH",
+        help="Write the items also to this file; pass the option several times to write several",
+    )
+    parser.add_argument(
+        "--columnar-output",
+        metavar="PATH",
+        help="Write the items also to this file in the compact columnar binary format",
+    )
+    parser.add_argument(
+        "--sqlite", metavar="PATH", help="Insert the items also into this SQLite database"
+    )
+    parser.add_argument(
+        "--fuzzy-dedup",
+        action="append",
+        metavar="PROVIDER",
+        help=(
+            "Drop items of this provider which are similar to an item of another of the passed "
+            "providers on the same day, like in automatic-diary"
+        ),
+    )
+    parser.add_argument(
+        "--fuzzy-threshold",
+        type=float,
+        default=DEFAULT_FUZZY_THRESHOLD,
+        metavar="SIMILARITY",
+        help=f"Minimum similarity of near-duplicates (default: {DEFAULT_FUZZY_THRESHOLD})",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Enable debugging output"
+    )
+    args = parser.parse_args(argv)
+    if args.verbose:
+        to_stdout = STDOUT in (args.output_path, *args.extra_output)
+        logging.basicConfig(
+            stream=sys.stderr if to_stdout else sys.stdout,
+            level=logging.INFO,
+            format="%(message)s",
+        )
+    sinks = open_sinks(args.output_path, args.extra_output, args.columnar_output, args.sqlite)
+    fuzzy = create_fuzzy_deduplicator(args.fuzzy_dedup, args.fuzzy_threshold)
+    merge_shards(args.shard_paths, sinks, fuzzy)
@@ -0,0 +1,175 @@
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+FORMATS = ("json", "prometheus")
+
+# Metric name, help text and attribute of ProviderMetrics.
+PROMETHEUS_METRICS = (
+    ("wall_seconds", "Wall time spent in the provider", "wall_time"),
+    ("cpu_seconds", "CPU time spent in the provider", "cpu_time"),
+    ("items", "Number of items yielded by the provider", "items"),
+    ("bytes_read", "Number of bytes read by the provider", "bytes_read"),
+    ("subprocesses", "Number of subprocesses spawned by the provider", "subprocesses"),
+    ("cache_hits", "Number of cache hits", "cache_hits"),
+    ("cache_misses", "Number of cache misses", "cache_misses"),
+    ("errors", "Number of errors", "errors"),
+)
+
+
+@dataclass
+class ProviderMetrics:
+    provider: str
+    config_id: str
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    items: int = 0
+    bytes_read: int = 0
+    subprocesses: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    errors: int = 0
+
+
+current_metrics: ContextVar[Optional[ProviderMetrics]] = ContextVar(
+    "current_metrics", default=None
+)
+
+# Guards the counters of the functions `count_*`, which may be called by several threads of one
+# provider at the same time, like the git log workers.
+_count_lock = threading.Lock()
+
+
+def count_bytes_read(n: int):
+    metrics = current_metrics.get()
+    if metrics:
+        with _count_lock:
+            metrics.bytes_read += n
+
+
+def count_subprocess():
+    metrics = current_metrics.get()
+    if metrics:
+        with _count_lock:
+            metrics.subprocesses += 1
+
+
+def count_cache_hit():
+    metrics = current_metrics.get()
+    if metrics:
+        with _count_lock:
+            metrics.cache_hits += 1
+
+
+def count_cache_miss():
+    metrics = current_metrics.get()
+    if metrics:
+        with _count_lock:
+            metrics.cache_misses += 1
+
+
+def measured(
+    metrics: ProviderMetrics, func: Callable[[], Iterable[T]], batches: bool = False
+) -> Iterator[T]:
+    """Call `func` and iterate the returned items while recording metrics.
+
+    Time is measured only while the items are being produced, not while the consumer processes
+    them. The functions `count_*` called meanwhile add to `metrics`. When `batches` is true, `func`
+    returns lists of items.
+    """
+    it: Optional[Iterator[T]] = None
+    while True:
+        token = current_metrics.set(metrics)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            if it is None:
+                it = iter(func())
+            item = next(it)
+        except StopIteration:
+            return
+        finally:
+            metrics.wall_time += time.perf_counter() - wall_start
+            metrics.cpu_time += time.thread_time() - cpu_start
+            current_metrics.reset(token)
+        metrics.items += len(item) if batches else 1  # type: ignore
+        yield item
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    formatted = ",".join(
+        '{}="{}"'.format(
+            key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for key, value in labels.items()
+    )
+    return f"{{{formatted}}}"
+
+
+class RunMetrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.providers: list[ProviderMetrics] = []
+        self._lock = threading.Lock()
+
+    def add(self, provider: str, config_id: str) -> ProviderMetrics:
+        metrics = ProviderMetrics(provider, config_id)
+        with self._lock:
+            self.providers.append(metrics)
+        return metrics
+
+    def finish(self):
+        self.finished_at = time.time()
+
+    def to_json(self) -> dict:
+        return {
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "providers": [dataclasses.asdict(metrics) for metrics in self.providers],
+        }
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# HELP automatic_diary_last_run_timestamp_seconds Time when the last run finished",
+            "# TYPE automatic_diary_last_run_timestamp_seconds gauge",
+            f"automatic_diary_last_run_timestamp_seconds {self.finished_at or time.time()}",
+            "# HELP automatic_diary_run_seconds Wall time of the last run",
+            "# TYPE automatic_diary_run_seconds gauge",
+            f"automatic_diary_run_seconds {(self.finished_at or time.time()) - self.started_at}",
+        ]
+        for name, help_, attr in PROMETHEUS_METRICS:
+            full_name = f"automatic_diary_provider_{name}"
+            lines.append(f"# HELP {full_name} {help_}")
+            lines.append(f"# TYPE {full_name} gauge")
+            for metrics in self.providers:
+                labels = _format_labels(
+                    {"provider": metrics.provider, "config": metrics.config_id}
+                )
+                lines.append(f"{full_name}{labels} {getattr(metrics, attr)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, format_: str = "json"):
+        """Write the metrics to a file.
+
+        The file is replaced atomically, as expected by the node_exporter textfile collector.
+        """
+        logger.info("Writing metrics %s", path)
+        if format_ == "prometheus":
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_json(), indent=2) + "\n"
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
@@ -1,45 +1,208 @@
 import datetime
+import functools
 import re
+import sys
 from dataclasses import dataclass, field
 from functools import total_ordering
+from typing import Optional, Sequence
 
 import dateutil.tz
 
+from automatic_diary.days import DayBucketer
+
+# Timezone of naive datetimes.
 default_tz = dateutil.tz.gettz("Europe/Prague")
 
+# Timezone in which the dates of items are determined.
+target_tz: datetime.tzinfo = dateutil.tz.tzlocal()
+
+day_bucketer = DayBucketer(target_tz)
+
+epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+microsecond = datetime.timedelta(microseconds=1)
+midnight = datetime.time()
+
+
+def get_tz(name: str) -> datetime.tzinfo:
+    tz = dateutil.tz.gettz(name)
+    if not tz:
+        raise ValueError(f"Unknown timezone {name}")
+    return tz
+
+
+def set_default_tz(tz: datetime.tzinfo):
+    global default_tz
+    default_tz = tz
+
+
+def set_target_tz(tz: datetime.tzinfo):
+    global target_tz, day_bucketer
+    target_tz = tz
+    day_bucketer = DayBucketer(tz)
+
+
+def localize(datetime_: datetime.datetime) -> datetime.datetime:
+    """Return an aware datetime; naive datetimes are considered to be in the default timezone."""
+    if not datetime_.tzinfo:
+        return datetime_.replace(tzinfo=default_tz)
+    return datetime_
+
+
+def timestamp_key(datetime_: datetime.datetime) -> int:
+    """Return the number of microseconds since the Unix epoch of an aware datetime."""
+    return (datetime_ - epoch) // microsecond
+
+
+def from_timestamp_key(key: int) -> datetime.datetime:
+    return epoch + key * microsecond
+
+
+@functools.lru_cache(maxsize=None)
+def fixed_tz(utc_offset: int) -> datetime.timezone:
+    return datetime.timezone(datetime.timedelta(seconds=utc_offset))
+
+
+@functools.lru_cache(maxsize=None)
+def _epoch_at_offset(utc_offset: int) -> datetime.datetime:
+    return epoch.astimezone(fixed_tz(utc_offset))
+
+
+def from_timestamp_key_at_offset(key: int, utc_offset: int) -> datetime.datetime:
+    """Return the datetime of a timestamp key with a UTC offset in seconds."""
+    # Adding to the epoch at the offset is faster than converting the datetime with astimezone().
+    return _epoch_at_offset(utc_offset) + key * microsecond
+
+
+def key_date(key: int) -> datetime.date:
+    """Return the date of a timestamp key in the target timezone."""
+    return day_bucketer.date(key // 1000000)
+
+
+def row_key(formatted_datetime: str) -> int:
+    """Return the sort key of an output row from its formatted datetime."""
+    return timestamp_key(localize(datetime.datetime.fromisoformat(formatted_datetime)))
+
+
+@dataclass(frozen=True)
+class DateRange:
+    """Range of datetimes `since <= datetime_ < until`. Both bounds are optional.
+
+    Naive datetimes are compared as if they were in the default timezone.
+    """
+
+    since: Optional[datetime.datetime] = None
+    until: Optional[datetime.datetime] = None
+
+    @property
+    def bounded(self) -> bool:
+        return self.since is not None or self.until is not None
+
+    def is_before(self, datetime_: datetime.datetime) -> bool:
+        return self.since is not None and localize(datetime_) < self.since
+
+    def is_after(self, datetime_: datetime.datetime) -> bool:
+        return self.until is not None and localize(datetime_) >= self.until
+
+    def __contains__(self, datetime_: datetime.datetime) -> bool:
+        return not self.is_before(datetime_) and not self.is_after(datetime_)
+
+    def intersection(self, other: "DateRange") -> "DateRange":
+        since = max(filter(None, (self.since, other.since)), default=None)
+        until = min(filter(None, (self.until, other.until)), default=None)
+        return DateRange(since, until)
+
+
+regex_whitespace = re.compile(r"\s+")
+
 
 @total_ordering
-@dataclass
+@dataclass(slots=True)
 class Item:
+    """An item of the timeline.
+
+    Items are compact: they have no `__dict__`, their provider and subprovider strings are interned
+    and their derived values are computed only once. Therefore items must not be modified after
+    they are created; use `dataclasses.replace()` instead.
+    """
+
     datetime_: datetime.datetime
     text: str
     provider: str
     subprovider: str
     all_day: bool = False
-    tags: list[str] = field(default_factory=list)
+    tags: Sequence[str] = ()
+    _key: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+    _date: Optional[datetime.date] = field(default=None, init=False, repr=False, compare=False)
+    _clean_text: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    _formatted_datetime: Optional[str] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        # Convert str subclasses, like strings from BeautifulSoup, which keep their whole
+        # document alive.
+        if type(self.text) is not str:
+            self.text = str(self.text)
+        self.provider = sys.intern(str(self.provider))
+        self.subprovider = sys.intern(str(self.subprovider))
 
     @classmethod
     def normalized(cls, datetime_: datetime.datetime, *args, **kwargs) -> "Item":
-        if not datetime_.tzinfo:
-            datetime_ = datetime_.replace(tzinfo=default_tz)
-        return cls(datetime_, *args, **kwargs)
+        return cls(localize(datetime_), *args, **kwargs)
+
+    @classmethod
+    def from_key(cls, key: int, utc_offset: int, *args, **kwargs) -> "Item":
+        """Create an item from its timestamp key and UTC offset in seconds, as stored in files."""
+        item = cls(from_timestamp_key_at_offset(key, utc_offset), *args, **kwargs)
+        item._key = key
+        return item
+
+    @property
+    def key(self) -> int:
+        """Sort key: the number of microseconds since the Unix epoch."""
+        if self._key is None:
+            self._key = timestamp_key(self.datetime_)
+        return self._key
+
+    @property
+    def row_key(self) -> int:
+        """Sort key of the output row of the item, the same as `row_key` of its formatted datetime.
+
+        The row of an all-day item has only a date, so its key is midnight in the default timezone,
+        not the key of its datetime.
+        """
+        if self.all_day:
+            date_datetime = datetime.datetime.combine(self.datetime_.date(), midnight)
+            return timestamp_key(localize(date_datetime))
+        return self.key
 
     @property
     def date(self) -> datetime.date:
-        return self.datetime_.astimezone().date()
+        """Date of the item in the target timezone; all-day items keep their own date."""
+        if self._date is None:
+            if self.all_day:
+                self._date = self.datetime_.date()
+            else:
+                self._date = key_date(self.key)
+        return self._date
 
     @property
     def clean_text(self) -> str:
-        return re.sub(r"\s+", " ", self.text).strip()
+        if self._clean_text is None:
+            self._clean_text = regex_whitespace.sub(" ", self.text).strip()
+        return self._clean_text
 
     @property
     def formatted_datetime(self) -> str:
-        if self.all_day:
-            return self.datetime_.date().isoformat()
-        return self.datetime_.isoformat()
+        if self._formatted_datetime is None:
+            if self.all_day:
+                self._formatted_datetime = self.datetime_.date().isoformat()
+            else:
+                self._formatted_datetime = self.datetime_.isoformat()
+        return self._formatted_datetime
 
     def __lt__(self, other: "Item") -> bool:
-        return self.datetime_ < other.datetime_
+        return self.key < other.key
 
     def astuple(self) -> tuple[str, str, str, str]:
         return (
@@ -0,0 +1,82 @@
+"""Obfuscate text while keeping its shape.
+
+Upper-case letters, lower-case letters and digits are replaced with random ASCII characters of the
+same category. The replacement of each word is derived from a hash of the word and a seed, so the
+same word is obfuscated the same way in the whole output. The seed must be secret, otherwise the
+words can be recovered by obfuscating a word list with it. Without a seed, a random seed is
+generated once per process.
+"""
+
+import dataclasses
+import functools
+import hashlib
+import os
+import re
+import string
+import unicodedata
+from typing import Iterable, Iterator, Optional
+
+from automatic_diary.model import Item
+
+# Separator of texts joined into one string, which is never part of a word.
+SEP = "\0"
+
+regex_word = re.compile(r"\w+")
+
+ALPHABETS = ("", string.ascii_uppercase, string.ascii_lowercase, string.digits)
+CATEGORY_CLASSES = {"Lu": 1, "Ll": 2, "Nd": 3}
+
+# Index into ALPHABETS by character. Precomputed for the Latin scripts, other characters are added
+# when they are first encountered.
+_char_classes: dict[str, int] = {
+    chr(i): CATEGORY_CLASSES.get(unicodedata.category(chr(i)), 0) for i in range(0x250)
+}
+
+
+def _char_class(char: str) -> int:
+    try:
+        return _char_classes[char]
+    except KeyError:
+        cls = _char_classes[char] = CATEGORY_CLASSES.get(unicodedata.category(char), 0)
+        return cls
+
+
+@functools.lru_cache(maxsize=65536)
+def _obfuscate_word(word: str, seed: str) -> str:
+    random_bytes = hashlib.shake_128(f"{seed}{SEP}{word}".encode()).digest(len(word))
+    chars = []
+    for char, random_byte in zip(word, random_bytes):
+        alphabet = ALPHABETS[_char_class(char)]
+        chars.append(alphabet[random_byte % len(alphabet)] if alphabet else char)
+    return "".join(chars)
+
+
+@functools.lru_cache(maxsize=None)
+def _random_seed() -> str:
+    return os.urandom(16).hex()
+
+
+def obfuscate(s: str, seed: Optional[str] = None) -> str:
+    if seed is None:
+        seed = _random_seed()
+    return regex_word.sub(lambda m: _obfuscate_word(m.group(), seed), s)
+
+
+def obfuscate_many(texts: list[str], seed: Optional[str] = None) -> list[str]:
+    """Obfuscate several texts in one pass of the regular expression."""
+    if any(SEP in text for text in texts):
+        return [obfuscate(text, seed) for text in texts]
+    return obfuscate(SEP.join(texts), seed).split(SEP)
+
+
+def obfuscate_batches(
+    batches: Iterable[list[Item]], seed: Optional[str] = None
+) -> Iterator[list[Item]]:
+    for batch in batches:
+        yield list(_obfuscate_batch(batch, seed))
+
+
+def _obfuscate_batch(items: list[Item], seed: Optional[str]) -> Iterator[Item]:
+    texts = obfuscate_many([item.text for item in items], seed)
+    for item, text in zip(items, texts):
+        yield dataclasses.replace(item, text=text)
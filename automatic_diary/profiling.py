@@ -0,0 +1,143 @@
+"""Profile providers and phases of the visualization with cProfile and tracemalloc.
+
+Each profiled section gets its own cProfile session, whose stats are written to "<section>.prof"
+(open it with `python -m pstats` or snakeviz), and the peak of memory allocated by Python during
+the section is recorded. A summary of all sections is written to "summary.txt".
+"""
+
+import contextlib
+import cProfile
+import io
+import logging
+import pstats
+import re
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+TOP_FUNCTIONS = 10
+TOP_ALLOCATIONS = 5
+
+
+@dataclass
+class Section:
+    name: str
+    profile: cProfile.Profile = field(default_factory=cProfile.Profile)
+    wall_time: float = 0.0
+    peak_memory: int = 0
+    start_snapshot: Optional[tracemalloc.Snapshot] = None
+    top_allocations: list[tracemalloc.StatisticDiff] = field(default_factory=list)
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024  # type: ignore
+    return f"{size:.1f} GiB"
+
+
+class Profiler:
+    """Profile named sections of code and write the results to a directory.
+
+    Only one section can run at a time, because tracemalloc measures the whole process.
+    """
+
+    def __init__(self, dir_path: str):
+        self.dir_path = Path(dir_path)
+        self.dir_path.mkdir(parents=True, exist_ok=True)
+        self.sections: dict[str, Section] = {}
+        tracemalloc.start()
+
+    def _get_section(self, name: str) -> Section:
+        if name not in self.sections:
+            self.sections[name] = Section(re.sub(r"[^\w.-]", "_", name))
+        return self.sections[name]
+
+    @contextlib.contextmanager
+    def _running(self, section: Section):
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        section.profile.enable()
+        try:
+            yield
+        finally:
+            section.profile.disable()
+            section.wall_time += time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            section.peak_memory = max(section.peak_memory, peak)
+
+    def _start(self, section: Section):
+        section.start_snapshot = tracemalloc.take_snapshot()
+
+    def _finish(self, section: Section):
+        if section.start_snapshot is None:
+            return
+        section.top_allocations = tracemalloc.take_snapshot().compare_to(
+            section.start_snapshot, "lineno"
+        )[:TOP_ALLOCATIONS]
+        section.start_snapshot = None
+        path = self.dir_path / f"{section.name}.prof"
+        section.profile.dump_stats(path)
+        logger.info("Wrote profile %s", path)
+
+    @contextlib.contextmanager
+    def section(self, name: str):
+        """Profile the code in the with block."""
+        section = self._get_section(name)
+        self._start(section)
+        try:
+            with self._running(section):
+                yield
+        finally:
+            self._finish(section)
+
+    def profiled(self, name: str, items: Iterable[T]) -> Iterator[T]:
+        """Iterate items, profiling only while they are being produced."""
+        section = self._get_section(name)
+        self._start(section)
+        try:
+            it = iter(items)
+            while True:
+                with self._running(section):
+                    try:
+                        item = next(it)
+                    except StopIteration:
+                        return
+                yield item
+        finally:
+            self._finish(section)
+
+    def format_summary(self) -> str:
+        out = io.StringIO()
+        out.write(f"{'Section':<40} {'Wall time':>10} {'Peak memory':>12}\n")
+        for section in self.sections.values():
+            out.write(
+                f"{section.name:<40} {section.wall_time:>9.3f}s "
+                f"{_format_size(section.peak_memory):>12}\n"
+            )
+        for section in self.sections.values():
+            out.write(f"\n=== {section.name}\n\nTop allocations:\n")
+            for stat in section.top_allocations:
+                out.write(f"  {_format_size(stat.size_diff):>10}  {stat.traceback}\n")
+            out.write("\nTop functions:\n")
+            try:
+                stats = pstats.Stats(section.profile, stream=out)
+            except TypeError:  # Nothing was profiled.
+                continue
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+        return out.getvalue()
+
+    def close(self):
+        """Write the summary and stop tracing memory allocations."""
+        path = self.dir_path / "summary.txt"
+        path.write_text(self.format_summary())
+        tracemalloc.stop()
+        logger.info("Wrote profile summary %s", path)
@@ -1,13 +1,16 @@
+import asyncio
 import io
 import itertools
 import logging
-import os
 from pathlib import Path
-from typing import Iterable, Iterator
+from typing import AsyncIterator, Iterable, Iterator
 
 import caldav
 
-from automatic_diary.model import Item
+from automatic_diary.aio import Limiter
+from automatic_diary.cache import read_cache_dir, write_cache_dir
+from automatic_diary.metrics import count_bytes_read, count_cache_hit, count_cache_miss
+from automatic_diary.model import DateRange, Item
 from automatic_diary.providers.icalendar.main import parse_calendar
 from automatic_diary.shell import search_secret
 
@@ -15,46 +18,59 @@ logger = logging.getLogger(__name__)
 provider = Path(__file__).parent.name
 
 
-def _read_events_data_from_cache(cache_dir: Path, no_cache: bool) -> Iterator[str]:
+def _read_events_data_from_cache(cache_dir: Path, no_cache: bool) -> list[str]:
     if no_cache:
-        return
-    if cache_dir.is_dir():
-        logger.info(f"Reading cache {cache_dir}")
-        for cache_file in os.scandir(cache_dir):
-            if cache_file.is_file():
-                yield Path(cache_file.path).read_text()
+        return []
+    logger.info(f"Reading cache {cache_dir}")
+    return read_cache_dir(cache_dir)
 
 
 def _write_events_to_cache(events: list[caldav.Event], cache_dir: Path):
     logger.info(f"Writing cache {cache_dir}")
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    for event in events:
-        _, event_id = event.url.rsplit("/", maxsplit=1)
-        cache_file = cache_dir / event_id
-        cache_file.write_text(event.data)
+    write_cache_dir(
+        cache_dir,
+        ((cache_dir / str(event.url).rsplit("/", maxsplit=1)[1], event.data) for event in events),
+    )
 
 
-def _download_events(
-    url: str, username: str, password: str, cache_dir: Path, no_cache: bool
+async def _download_events(
+    url: str, username: str, password: str, cache_dir: Path, no_cache: bool, limiter: Limiter
 ) -> list[str]:
-    events_data = list(_read_events_data_from_cache(cache_dir, no_cache))
+    events_data = _read_events_data_from_cache(cache_dir, no_cache)
     if events_data:
+        count_cache_hit()
         return events_data
+    count_cache_miss()
     logger.info("Connecting to %s", url)
-    client = caldav.DAVClient(url, username=username, password=password)
+    client = caldav.DAVClient(url, username=username, password=password, timeout=limiter.timeout)
     logger.info("Reading principal")
-    principal = client.principal()
+    principal = await limiter.call(client.principal)
+    calendars = await limiter.call(principal.calendars)
+    # The events of the calendars are listed concurrently.
     events = list(
-        itertools.chain.from_iterable(calendar.events() for calendar in principal.calendars())
+        itertools.chain.from_iterable(
+            [
+                calendar_events
+                async for calendar_events in limiter.map(
+                    caldav.Calendar.events, ((calendar,) for calendar in calendars)
+                )
+            ]
+        )
     )
     _write_events_to_cache(events, cache_dir)
-    return [event.data for event in events]
+    events_data = [event.data for event in events]
+    count_bytes_read(sum(len(event_data) for event_data in events_data))
+    return events_data
 
 
-def _parse_events(events_data: Iterable[str], subprovider: str) -> Iterator[Item]:
+def _parse_events(
+    events_data: Iterable[str], subprovider: str, date_range: DateRange = DateRange()
+) -> Iterator[Item]:
     for event_data in events_data:
         lines = io.StringIO(event_data)
         for event in parse_calendar(lines):
+            if event.begin not in date_range:
+                continue
             yield Item.normalized(
                 datetime_=event.begin,
                 text=event.name,
@@ -64,10 +80,13 @@ def _parse_events(events_data: Iterable[str], subprovider: str) -> Iterator[Item
             )
 
 
-def main(config: dict, no_cache: bool, *args, **kwargs) -> Iterator[Item]:
+async def main(
+    config: dict, no_cache: bool, *args, date_range: DateRange = DateRange(), **kwargs
+) -> AsyncIterator[Item]:
     url = config["url"]
     username = config["username"]
-    password = search_secret(
+    password = await asyncio.to_thread(
+        search_secret,
         config["password_key"],
         config["password_val"],
         config["password_label"],
@@ -75,5 +94,7 @@ def main(config: dict, no_cache: bool, *args, **kwargs) -> Iterator[Item]:
     if not password:
         raise Exception("Password secret not found")
     cache_dir = Path(config["cache_dir"])
-    events_data = _download_events(url, username, password, cache_dir, no_cache)
-    return _parse_events(events_data, subprovider=url)
+    limiter = Limiter.from_config(config)
+    events_data = await _download_events(url, username, password, cache_dir, no_cache, limiter)
+    for item in _parse_events(events_data, subprovider=url, date_range=date_range):
+        yield item
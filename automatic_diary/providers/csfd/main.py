@@ -3,12 +3,15 @@ import logging
 import re
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, Iterator
+from typing import AsyncGenerator, AsyncIterable, AsyncIterator, Iterator, Optional
 
 import requests
 from bs4 import BeautifulSoup
 
-from automatic_diary.model import Item
+from automatic_diary.aio import Limiter
+from automatic_diary.cache import with_cache
+from automatic_diary.metrics import count_bytes_read
+from automatic_diary.model import DateRange, Item
 
 logger = logging.getLogger(__name__)
 provider = Path(__file__).parent.name
@@ -29,26 +32,29 @@ class Film:
 
 
 def _download_ratings_page(
-    profile_url: str, cache_dir: Path, no_cache: bool, page_no: int = 1
+    profile_url: str,
+    cache_dir: Path,
+    no_cache: bool,
+    page_no: int = 1,
+    timeout: Optional[float] = None,
 ) -> str:
-    cache_file = cache_dir / f'{page_no:d}.html'
-    if not no_cache and cache_file.is_file():
-        logger.info(f'Reading cache {cache_file}')
-        return cache_file.read_text()
-    page_url = f'{profile_url}hodnoceni/strana-{page_no}/'
-    logger.info(f'Downloading {page_url}')
-    r = requests.get(page_url, headers=HEADERS)
-    html = r.text
-    logger.info(f'Writing cache {cache_file}')
-    cache_file.parent.mkdir(parents=True, exist_ok=True)
-    cache_file.write_text(html)
-    return html
-
-
-def _download_all_ratings_pages(
-    profile_url: str, cache_dir: Path, no_cache: bool
-) -> Iterator[BeautifulSoup]:
-    html = _download_ratings_page(profile_url, cache_dir, no_cache)
+    def download() -> str:
+        page_url = f'{profile_url}hodnoceni/strana-{page_no}/'
+        logger.info(f'Downloading {page_url}')
+        r = requests.get(page_url, headers=HEADERS, timeout=timeout)
+        r.raise_for_status()
+        count_bytes_read(len(r.content))
+        return r.text
+
+    return with_cache(download, cache_dir / f'{page_no:d}.html', no_cache)
+
+
+async def _download_all_ratings_pages(
+    profile_url: str, cache_dir: Path, no_cache: bool, limiter: Limiter
+) -> AsyncGenerator[BeautifulSoup, None]:
+    html = await limiter.call(
+        _download_ratings_page, profile_url, cache_dir, no_cache, 1, limiter.timeout
+    )
     soup = BeautifulSoup(html, 'html.parser')
     page_links = soup.select('.profile-content .paginator a')
     page_num_links = [node for node in page_links if not node.get('class')]
@@ -56,10 +62,20 @@ def _download_all_ratings_pages(
     last_page_num = int(last_page_num_link.string)
     logger.info('Found %d pages', last_page_num)
     yield soup
-    for page_no in range(2, last_page_num + 1):
-        html = _download_ratings_page(profile_url, cache_dir, no_cache, page_no)
-        soup = BeautifulSoup(html, 'html.parser')
-        yield soup
+    # The following pages are downloaded concurrently, at most `limiter.concurrency` ahead of the
+    # page being parsed.
+    htmls = limiter.map(
+        _download_ratings_page,
+        (
+            (profile_url, cache_dir, no_cache, page_no, limiter.timeout)
+            for page_no in range(2, last_page_num + 1)
+        ),
+    )
+    try:
+        async for html in htmls:
+            yield BeautifulSoup(html, 'html.parser')
+    finally:
+        await htmls.aclose()
 
 
 def _parse_ratings_page(soup: BeautifulSoup) -> Iterator[Film]:
@@ -70,9 +86,14 @@ def _parse_ratings_page(soup: BeautifulSoup) -> Iterator[Film]:
         yield Film(title=title, datetime_=datetime_)
 
 
-def _parse_ratings_pages(soups: Iterable[BeautifulSoup], subprovider: str) -> Iterator[Item]:
-    for soup in soups:
-        for film in _parse_ratings_page(soup):
+async def _parse_ratings_pages(
+    soups: AsyncIterable[BeautifulSoup], subprovider: str, date_range: DateRange = DateRange()
+) -> AsyncIterator[Item]:
+    async for soup in soups:
+        films = list(_parse_ratings_page(soup))
+        for film in films:
+            if film.datetime_ not in date_range:
+                continue
             yield Item.normalized(
                 datetime_=film.datetime_,
                 text=film.title,
@@ -80,6 +101,10 @@ def _parse_ratings_pages(soups: Iterable[BeautifulSoup], subprovider: str) -> It
                 subprovider=subprovider,
                 all_day=True,
             )
+        # Ratings are listed from the newest, so stop downloading pages once they get too old.
+        if films and date_range.is_before(films[-1].datetime_):
+            logger.info('Reached ratings older than %s', date_range.since)
+            break
 
 
 def parse_username(url: str) -> str:
@@ -89,9 +114,16 @@ def parse_username(url: str) -> str:
     return m.group(1)
 
 
-def main(config: dict, no_cache: bool, *args, **kwargs) -> Iterator[Item]:
+async def main(
+    config: dict, no_cache: bool, *args, date_range: DateRange = DateRange(), **kwargs
+) -> AsyncIterator[Item]:
     profile_url = config['profile_url']
     cache_dir = Path(config['cache_dir'])
     username = parse_username(profile_url)
-    pages = _download_all_ratings_pages(profile_url, cache_dir, no_cache)
-    return _parse_ratings_pages(pages, subprovider=username)
+    limiter = Limiter.from_config(config)
+    pages = _download_all_ratings_pages(profile_url, cache_dir, no_cache, limiter)
+    try:
+        async for item in _parse_ratings_pages(pages, subprovider=username, date_range=date_range):
+            yield item
+    finally:
+        await pages.aclose()
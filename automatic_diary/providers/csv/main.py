@@ -6,16 +6,22 @@ from typing import Iterator
 
 import pystache
 
+from automatic_diary.metrics import count_bytes_read
 from automatic_diary.model import Item
 
 logger = logging.getLogger(__name__)
 provider = Path(__file__).parent.name
 
 
+def input_paths(config: dict) -> list[Path]:
+    return [Path(config["path"])]
+
+
 def main(config: dict, *args, **kwargs) -> Iterator[Item]:
     path = Path(config["path"])
     subprovider = path.name
     logger.info("Reading CSV file %s", path)
+    count_bytes_read(path.stat().st_size)
     renderer = pystache.Renderer(escape=lambda u: u)
     date_source_tmpl = pystache.parse(config["date_source"])
     text_source_tmpl = pystache.parse(config["text_source"])
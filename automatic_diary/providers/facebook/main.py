@@ -8,6 +8,7 @@ from typing import Iterator, Optional
 import dateparser
 from bs4 import BeautifulSoup
 
+from automatic_diary.metrics import count_bytes_read
 from automatic_diary.model import Item
 
 logger = logging.getLogger(__name__)
@@ -61,10 +62,15 @@ def _parse_timeline_page(soup: BeautifulSoup) -> Iterator[Status]:
 def _read_html(path: str) -> BeautifulSoup:
     with open(path) as f:
         html = f.read()
+        count_bytes_read(len(html))
         soup = BeautifulSoup(html, 'html.parser')
     return soup
 
 
+def input_paths(config: dict) -> list[Path]:
+    return [Path(config['path'])]
+
+
 def main(config: dict, *args, **kwargs) -> Iterator[Item]:
     path = config['path']
     username = config['username']
@@ -1,12 +1,17 @@
+import contextvars
 import datetime
 import logging
 import os
 import subprocess
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Iterable, Iterator
+from typing import Iterable, Iterator, Optional
 
-from automatic_diary.cache import with_cache
-from automatic_diary.model import Item
+from automatic_diary.batches import BATCH_SIZE, unbatched
+from automatic_diary.cache import has_cache_file, with_cache
+from automatic_diary.config import DEFAULT_CONCURRENCY
+from automatic_diary.model import DateRange, Item
+from automatic_diary.shared import shared_iterable
 from automatic_diary.shell import run_shell_cmd
 
 logger = logging.getLogger(__name__)
@@ -36,56 +41,142 @@ def _find_git_repos(
             yield from _find_git_repos(entry.path, max_depth, curr_depth + 1)
 
 
-def _call_git_rev_parse(repo_path: str) -> str:
-    return run_shell_cmd(["git", "rev-parse", "HEAD"], cwd=repo_path)
+@shared_iterable
+def _find_git_repos_shared(base_path: str, max_depth: int | None) -> Iterator[str]:
+    return _find_git_repos(base_path, max_depth)
 
 
-def _call_git_log(repo_path: str, author: str) -> str:
+def _call_git_rev_parse(repo_path: str, timeout: Optional[float] = None) -> str:
+    return run_shell_cmd(["git", "rev-parse", "HEAD"], cwd=repo_path, timeout=timeout)
+
+
+def _call_git_log(
+    repo_path: str,
+    author: str,
+    date_range: DateRange = DateRange(),
+    timeout: Optional[float] = None,
+) -> str:
     logger.info("Calling git log in %s", repo_path)
-    return run_shell_cmd(
-        [
-            "git",
-            "--no-pager",
-            "log",
-            f"--author={author}",
-            "--format=%ad,%s",
-            "--date=iso8601-strict",
-        ],
-        cwd=repo_path,
-    )
+    cmd = [
+        "git",
+        "--no-pager",
+        "log",
+        f"--author={author}",
+        "--format=%ad,%s",
+        "--date=iso8601-strict",
+    ]
+    # Only --since is passed, because it lets git stop walking the history early. Git compares the
+    # committer date, which is normally not older than the author date that we output. The exact
+    # range is applied to the items by the caller.
+    if date_range.since:
+        cmd.append(f"--since={date_range.since.isoformat()}")
+    return run_shell_cmd(cmd, cwd=repo_path, timeout=timeout)
 
 
-def _read_git_logs(
-    repo_paths: Iterable[str], author: str, cache_dir: Path | None, no_cache: bool
-) -> Iterator[Item]:
-    for repo_path in repo_paths:
-        repo_name = os.path.basename(repo_path)
-        try:
-            rev = _call_git_rev_parse(repo_path).strip()
-        except subprocess.CalledProcessError:
-            continue
-        cache_file = cache_dir / repo_name / f"{rev}.txt" if cache_dir else None
-        try:
-            log = with_cache(
-                lambda: _call_git_log(repo_path, author), cache_file, no_cache
-            )
-        except subprocess.CalledProcessError:
-            continue
-        for log_line in log.splitlines():
+def _parse_git_log(log: str, repo_name: str) -> Iterator[list[Item]]:
+    log_lines = log.splitlines()
+    for i in range(0, len(log_lines), BATCH_SIZE):
+        batch = []
+        for log_line in log_lines[i:i + BATCH_SIZE]:
             formatted_datetime_, text = log_line.split(",", maxsplit=1)
-            datetime_ = datetime.datetime.fromisoformat(formatted_datetime_)
-            yield Item.normalized(
-                datetime_=datetime_,
-                text=text,
-                provider=provider,
-                subprovider=repo_name,
+            batch.append(
+                Item.normalized(
+                    datetime_=datetime.datetime.fromisoformat(formatted_datetime_),
+                    text=text,
+                    provider=provider,
+                    subprovider=repo_name,
+                )
             )
+        yield batch
 
 
-def main(config: dict, no_cache: bool, *args, **kwargs) -> Iterator[Item]:
+def _read_git_log(
+    repo_path: str,
+    author: str,
+    cache_dir: Path | None,
+    no_cache: bool,
+    date_range: DateRange = DateRange(),
+    timeout: Optional[float] = None,
+) -> Optional[str]:
+    """Return the log of a repository, or None when it isn't a valid repository or git times out."""
+    try:
+        rev = _call_git_rev_parse(repo_path, timeout).strip()
+        cache_file = cache_dir / os.path.basename(repo_path) / f"{rev}.txt" if cache_dir else None
+        # Use a cached full log if there is one, but don't cache logs limited by a date range.
+        log_date_range = date_range
+        if cache_file and (not no_cache and has_cache_file(cache_file) or not date_range.bounded):
+            log_date_range = DateRange()
+        else:
+            cache_file = None
+        return with_cache(
+            lambda: _call_git_log(repo_path, author, log_date_range, timeout), cache_file, no_cache
+        )
+    except subprocess.CalledProcessError:
+        return None
+    except subprocess.TimeoutExpired as e:
+        logger.warning("Skipping %s: %s", repo_path, e)
+        return None
+
+
+def _read_git_log_batches(
+    repo_paths: Iterable[str],
+    author: str,
+    cache_dir: Path | None,
+    no_cache: bool,
+    date_range: DateRange = DateRange(),
+    concurrency: int = DEFAULT_CONCURRENCY,
+    timeout: Optional[float] = None,
+) -> Iterator[list[Item]]:
+    """Read the logs of repositories in a pool of `concurrency` threads.
+
+    The repositories are submitted to the pool while they're being found and their items are
+    yielded in the order in which their logs are read, so a slow repository doesn't hold back the
+    others. At most twice `concurrency` logs are read ahead of the consumer.
+    """
+    executor = ThreadPoolExecutor(concurrency, thread_name_prefix="git")
+    pending: set[Future] = set()
+
+    def finished(block: bool) -> Iterator[list[Item]]:
+        nonlocal pending
+        done, pending = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            repo_path, log = future.result()
+            if log is not None:
+                yield from _parse_git_log(log, os.path.basename(repo_path))
+
+    def read(repo_path: str) -> tuple[str, Optional[str]]:
+        return repo_path, _read_git_log(repo_path, author, cache_dir, no_cache, date_range, timeout)
+
+    try:
+        for repo_path in repo_paths:
+            # Each thread runs in a copy of the context, so that the metrics of the provider
+            # count its subprocesses and cache hits.
+            pending.add(executor.submit(contextvars.copy_context().run, read, repo_path))
+            yield from finished(block=len(pending) >= 2 * concurrency)
+        while pending:
+            yield from finished(block=True)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def main_batches(
+    config: dict, no_cache: bool, *args, date_range: DateRange = DateRange(), **kwargs
+) -> Iterator[list[Item]]:
     base_path = config["base_path"]
     author = config["author"]
-    repo_paths = _find_git_repos(base_path, config.get("max_depth"))
+    repo_paths = _find_git_repos_shared(base_path, config.get("max_depth"))
     cache_dir_str = config.get("cache_dir")
     cache_dir = Path(cache_dir_str) if cache_dir_str else None
-    return _read_git_logs(repo_paths, author, cache_dir, no_cache)
+    return _read_git_log_batches(
+        repo_paths,
+        author,
+        cache_dir,
+        no_cache,
+        date_range,
+        concurrency=config.get("concurrency", DEFAULT_CONCURRENCY),
+        timeout=config.get("timeout"),
+    )
+
+
+def main(config: dict, no_cache: bool, *args, **kwargs) -> Iterator[Item]:
+    return unbatched(main_batches(config, no_cache, *args, **kwargs))
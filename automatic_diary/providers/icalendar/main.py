@@ -7,7 +7,9 @@ from typing import Iterable, Iterator, Optional
 
 import ics
 
-from automatic_diary.model import Item
+from automatic_diary.metrics import count_bytes_read
+from automatic_diary.model import DateRange, Item
+from automatic_diary.shared import shared_iterable
 
 logger = logging.getLogger(__name__)
 provider = Path(__file__).parent.name
@@ -79,19 +81,27 @@ def parse_calendar(lines: Iterable[str]) -> Iterator[Event]:
             logger.error(e)
 
 
+@shared_iterable
 def _read_calendar(path: Path) -> Iterator[Event]:
     logger.info("Reading calendar %s", path)
+    count_bytes_read(path.stat().st_size)
     with path.open() as f:
         yield from parse_calendar(f)
 
 
-def main(config: dict, *args, **kwargs) -> Iterator[Item]:
+def input_paths(config: dict) -> list[Path]:
+    return [Path(path_str) for path_str in config["paths"]]
+
+
+def main(config: dict, *args, date_range: DateRange = DateRange(), **kwargs) -> Iterator[Item]:
     paths = config["paths"]
     unique_events: list[Event] = []
     for path_str in paths:
         path = Path(path_str)
         subprovider = path.name
         for event in _read_calendar(path):
+            if event.begin not in date_range:
+                continue
             if event not in unique_events:
                 yield Item.normalized(
                     datetime_=event.begin,
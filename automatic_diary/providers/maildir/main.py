@@ -4,16 +4,28 @@ import email.header
 import email.utils
 import glob
 import logging
+import os.path
+import re
 from pathlib import Path
-from typing import Iterator, Union
+from typing import Iterator, Optional, Union
 
-from automatic_diary.model import Item
+from automatic_diary.metrics import count_bytes_read
+from automatic_diary.model import DateRange, Item
 
 logger = logging.getLogger(__name__)
 provider = Path(__file__).parent.name
 
 THeader = Union[str, email.header.Header, None]
 
+# Maildir file names start with the delivery time as a Unix timestamp.
+regex_filename = re.compile(r'^(?P<timestamp>\d+)\.')
+
+# Maximum expected difference between the delivery time and the Date header of a message. A message
+# is delivered after it's sent, so a file delivered before the date range is skipped unread. Files
+# delivered after the range may hold older messages (e.g. imported or re-synced ones), so they are
+# read and filtered by their Date header.
+DELIVERY_DELAY = datetime.timedelta(days=1)
+
 
 def _decode_header(header: THeader) -> str:
     if not header:
@@ -46,15 +58,36 @@ def _format_text(from_: str, to_: str, subject: str, sent: bool) -> str:
     return f'From {from_}: {subject}'.strip()
 
 
-def _read_messages(pathname: str, sent: bool) -> Iterator[Item]:
+def _parse_delivery_time(path: str) -> Optional[datetime.datetime]:
+    m = regex_filename.match(os.path.basename(path))
+    if not m:
+        return None
+    return datetime.datetime.fromtimestamp(int(m.group('timestamp')), tz=datetime.timezone.utc)
+
+
+def _is_delivered_before_range(path: str, date_range: DateRange) -> bool:
+    delivery_time = _parse_delivery_time(path)
+    if not delivery_time:
+        return False
+    return date_range.is_before(delivery_time + DELIVERY_DELAY)
+
+
+def _read_messages(
+    pathname: str, sent: bool, date_range: DateRange = DateRange()
+) -> Iterator[Item]:
     for path in glob.glob(pathname):
+        if date_range.since and _is_delivered_before_range(path, date_range):
+            continue
         logger.info('Reading message %s', path)
         with open(path, 'rb') as f:
             email_message = email.message_from_binary_file(f)
+            count_bytes_read(f.tell())
         if not email_message['Date']:
             logger.warning('Skipping message without date: %s', path)
             continue
         datetime_ = _parse_date(email_message['Date'])
+        if datetime_ not in date_range:
+            continue
         text = _format_text(
             _parse_address(email_message['From']),
             _parse_address(email_message['To']),
@@ -69,6 +102,6 @@ def _read_messages(pathname: str, sent: bool) -> Iterator[Item]:
         )
 
 
-def main(config: dict, *args, **kwargs) -> Iterator[Item]:
-    yield from _read_messages(config['received_pathname'], sent=False)
-    yield from _read_messages(config['sent_pathname'], sent=True)
+def main(config: dict, *args, date_range: DateRange = DateRange(), **kwargs) -> Iterator[Item]:
+    yield from _read_messages(config['received_pathname'], sent=False, date_range=date_range)
+    yield from _read_messages(config['sent_pathname'], sent=True, date_range=date_range)
@@ -6,6 +6,7 @@ from typing import IO, Iterator, Optional
 
 from more_itertools import peekable
 
+from automatic_diary.metrics import count_bytes_read
 from automatic_diary.model import Item
 
 logger = logging.getLogger(__name__)
@@ -43,9 +44,14 @@ def parse_orgmode(f: IO, subprovider: str) -> Iterator[Item]:
                 current_paragraph.clear()
 
 
+def input_paths(config: dict) -> list[Path]:
+    return [Path(config["path"])]
+
+
 def main(config: dict, *args, **kwargs) -> Iterator[Item]:
     path = Path(config["path"])
     subprovider = path.name
     logger.info("Reading Org-mode file %s", path)
+    count_bytes_read(path.stat().st_size)
     with path.open() as f:
         yield from parse_orgmode(f, subprovider)
@@ -6,6 +6,7 @@ from typing import Iterator
 import dateparser
 import orgparse
 
+from automatic_diary.metrics import count_bytes_read
 from automatic_diary.model import Item
 
 logger = logging.getLogger(__name__)
@@ -41,9 +42,14 @@ def parse_orgmode_list(org: orgparse.OrgNode, subprovider: str) -> Iterator[Item
         )
 
 
+def input_paths(config: dict) -> list[Path]:
+    return [Path(config['path'])]
+
+
 def main(config: dict, *args, **kwargs) -> Iterator[Item]:
     path = Path(config['path'])
     subprovider = path.name
     logger.info('Reading Org-mode file %s', path)
+    count_bytes_read(path.stat().st_size)
     org = orgparse.load(path)
     yield from parse_orgmode_list(org, subprovider)
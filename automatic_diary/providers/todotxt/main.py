@@ -2,8 +2,10 @@ import datetime
 import logging
 import re
 from pathlib import Path
-from typing import Iterator
+from typing import Iterator, Optional
 
+from automatic_diary.batches import batched, unbatched
+from automatic_diary.metrics import count_bytes_read
 from automatic_diary.model import Item
 
 logger = logging.getLogger(__name__)
@@ -22,21 +24,35 @@ def _clean_text(s: str) -> str:
     return s
 
 
-def main(config: dict, *args, **kwargs) -> Iterator[Item]:
+def _parse_line(line: str, subprovider: str) -> Optional[Item]:
+    m = regex_line.match(line)
+    if not m:
+        return None
+    datetime_ = datetime.datetime(int(m.group('y')), int(m.group('m')), int(m.group('d')))
+    text = _clean_text(m.group('text'))
+    return Item.normalized(
+        datetime_=datetime_,
+        text=text,
+        provider=provider,
+        subprovider=subprovider,
+        all_day=True,
+    )
+
+
+def input_paths(config: dict) -> list[Path]:
+    return [Path(config['path'])]
+
+
+def main_batches(config: dict, *args, **kwargs) -> Iterator[list[Item]]:
     path = Path(config['path'])
     subprovider = path.name
     logger.info('Reading todo.txt file %s', path)
+    count_bytes_read(path.stat().st_size)
     with path.open() as f:
-        for line in f:
-            m = regex_line.match(line)
-            if not m:
-                continue
-            datetime_ = datetime.datetime(int(m.group('y')), int(m.group('m')), int(m.group('d')))
-            text = _clean_text(m.group('text'))
-            yield Item.normalized(
-                datetime_=datetime_,
-                text=text,
-                provider=provider,
-                subprovider=subprovider,
-                all_day=True,
-            )
+        for lines in batched(f):
+            batch = [_parse_line(line, subprovider) for line in lines]
+            yield [item for item in batch if item]
+
+
+def main(config: dict, *args, **kwargs) -> Iterator[Item]:
+    return unbatched(main_batches(config, *args, **kwargs))
@@ -6,7 +6,7 @@ from typing import Iterator
 
 from trakt import Trakt
 
-from automatic_diary.model import Item
+from automatic_diary.model import DateRange, Item
 
 logger = logging.getLogger(__name__)
 provider = Path(__file__).parent.name
@@ -65,22 +65,26 @@ class Application(object):
         with open(self.token_name, "w") as f:
             json.dump(self.authorization, f)
 
-    def movies(self) -> Iterator:
+    def movies(self, date_range: DateRange = DateRange()) -> Iterator:
         logger.info("Reading movies")
         with Trakt.configuration.oauth.from_response(self.authorization):
-            return Trakt["sync/history"].movies(pagination=True)
+            return Trakt["sync/history"].movies(
+                start_at=date_range.since, end_at=date_range.until, pagination=True
+            )
 
-    def shows(self):
+    def shows(self, date_range: DateRange = DateRange()):
         logger.info("Reading shows")
         with Trakt.configuration.oauth.from_response(self.authorization):
-            return Trakt["sync/history"].shows(pagination=True)
+            return Trakt["sync/history"].shows(
+                start_at=date_range.since, end_at=date_range.until, pagination=True
+            )
 
 
-def main(config: dict, *args, **kwargs) -> Iterator[Item]:
+def main(config: dict, *args, date_range: DateRange = DateRange(), **kwargs) -> Iterator[Item]:
     app = Application(config)
     app.auth()
 
-    for m in app.movies():
+    for m in app.movies(date_range):
         yield Item.normalized(
             datetime_=m.watched_at,
             text=m.title,
@@ -88,7 +92,7 @@ def main(config: dict, *args, **kwargs) -> Iterator[Item]:
             subprovider="movies",
         )
 
-    for s in app.shows():
+    for s in app.shows(date_range):
         yield Item.normalized(
             datetime_=s.watched_at,
             text='"' + s.show.title + '" : ' + s.title,
@@ -4,6 +4,7 @@ import logging
 from pathlib import Path
 from typing import Iterator
 
+from automatic_diary.metrics import count_bytes_read
 from automatic_diary.model import Item
 
 logger = logging.getLogger(__name__)
@@ -11,6 +12,7 @@ provider = Path(__file__).parent.name
 
 
 def _parse_tweets_file(path: Path) -> Iterator[Item]:
+    count_bytes_read(path.stat().st_size)
     with path.open() as f:
         f.readline()  # Skip first line, which is not JSOn
         tweets_data = json.load(f)
@@ -26,6 +28,10 @@ def _parse_tweets_file(path: Path) -> Iterator[Item]:
         )
 
 
+def input_paths(config: dict) -> list[Path]:
+    return sorted((Path(config['path']) / 'data' / 'js' / 'tweets').glob('*.js'))
+
+
 def main(config: dict, *args, **kwargs) -> Iterator[Item]:
     path = Path(config['path'])
     logger.info('Reading Twitter archive %s', path)
@@ -0,0 +1,94 @@
+"""Lookups shared between the runs of several configs in one process.
+
+When automatic-diary runs the configs of many users in one process (`automatic-diary batch`),
+expensive lookups that don't depend on the user, like discovering the git repos under a base path
+or parsing an .ics file, are done only once. Outside of `sharing()`, shared functions are simply
+called.
+
+Only the most recently used results are kept, so that the memory use of a long batch run stays
+bounded; an evicted result is computed again when it's needed again.
+"""
+
+import contextlib
+import functools
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Number of results kept by a SharedCache.
+MAX_ENTRIES = 128
+
+
+class SharedCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._values: OrderedDict[tuple, tuple] = OrderedDict()
+        self._locks: dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: tuple) -> Optional[tuple]:
+        with self._lock:
+            value = self._values.get(key)
+            if value is not None:
+                self._values.move_to_end(key)
+            return value
+
+    def get(self, func: Callable[..., Iterable[T]], args: tuple) -> tuple[T, ...]:
+        """Return the elements returned by `func(*args)`, calling it only once for each `args`.
+
+        Concurrent callers with the same arguments wait for the first one. Exceptions are not
+        cached. When more than `max_entries` results are cached, the least recently used one is
+        evicted.
+        """
+        key = (func, args)
+        value = self._lookup(key)
+        if value is not None:
+            return value
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            value = tuple(func(*args))
+            with self._lock:
+                self._values[key] = value
+                while len(self._values) > self.max_entries:
+                    evicted_key, _ = self._values.popitem(last=False)
+                    self._locks.pop(evicted_key, None)
+            return value
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+_cache: Optional[SharedCache] = None
+
+
+@contextlib.contextmanager
+def sharing(max_entries: int = MAX_ENTRIES):
+    """Share the results of functions decorated with `shared_iterable` in the with block."""
+    global _cache
+    _cache = SharedCache(max_entries)
+    try:
+        yield _cache
+    finally:
+        _cache = None
+
+
+def shared_iterable(func: Callable[..., Iterable[T]]) -> Callable[..., Iterable[T]]:
+    """Share the elements of the iterable returned by `func` while `sharing()` is active.
+
+    The arguments of `func` must be hashable and its elements must not be modified by the callers.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args) -> Iterable[T]:
+        cache = _cache
+        if cache is None:
+            return func(*args)
+        return cache.get(func, args)
+
+    return wrapper
@@ -1,8 +1,11 @@
 import subprocess
 from typing import Optional
 
+from automatic_diary.metrics import count_bytes_read, count_subprocess
+
 
 def run_shell_cmd(cmd: list[str], **kwargs) -> str:
+    count_subprocess()
     completed_process = subprocess.run(
         cmd,
         stdout=subprocess.PIPE,
@@ -10,6 +13,7 @@ def run_shell_cmd(cmd: list[str], **kwargs) -> str:
         universal_newlines=True,  # Don't use arg 'text' for Python 3.6 compat.
         **kwargs,
     )
+    count_bytes_read(len(completed_process.stdout))
     return completed_process.stdout
 
 
@@ -0,0 +1,154 @@
+"""Output files of the items: CSV or JSON Lines, optionally gzip-compressed, or stdout.
+
+The format is chosen by the file name: ".jsonl" is JSON Lines, anything else is CSV, and a ".gz"
+suffix compresses the file. The path "-" writes CSV to stdout. Columnar files and SQLite databases
+are written by `ColumnarWriter` and `SQLiteWriter`, which implement the same `Sink` protocol.
+"""
+
+import abc
+import csv
+import io
+import json
+import logging
+import os
+import sys
+from typing import IO, Iterator, Protocol
+
+logger = logging.getLogger(__name__)
+
+STDOUT = "-"
+GZIP_MAGIC = b"\x1f\x8b"
+BATCH_SIZE = 1000
+BUFFER_SIZE = 1024 * 1024
+JSON_FIELDS = ("datetime", "provider", "subprovider", "text")
+
+Row = tuple[str, str, str, str]
+
+
+class Sink(Protocol):
+    def write(self, key: int, row: Row): ...
+
+    def write_batch(self, records: list[tuple]):
+        """Write records (key, seq, *row)."""
+
+    def close(self): ...
+
+    def __enter__(self) -> "Sink": ...
+
+    def __exit__(self, exc_type, exc_value, traceback): ...
+
+
+def _is_gzip(path: str) -> bool:
+    return path.endswith(".gz")
+
+
+def _is_json_lines(path: str) -> bool:
+    return path.removesuffix(".gz").endswith(".jsonl")
+
+
+def _open_text(path: str, mode: str, compress: bool) -> IO[str]:
+    if compress:
+        import gzip
+
+        return io.TextIOWrapper(
+            gzip.GzipFile(path, f"{mode}b", compresslevel=6),
+            encoding="utf-8",
+            newline="",
+            write_through=False,
+        )
+    return open(path, mode, encoding="utf-8", newline="", buffering=BUFFER_SIZE)
+
+
+class TextSink(abc.ABC):
+    """Write rows to a text file in batches.
+
+    The file is written under a temporary name and renamed to `path` when the sink is closed, so
+    that a failed run doesn't leave a partial file behind. Subclasses implement `_write_batch`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._batch: list[Row] = []
+        self._f: IO[str]
+        if path == STDOUT:
+            self._tmp_path = None
+            self._f = sys.stdout
+        else:
+            self._tmp_path = f"{path}.tmp"
+            self._f = _open_text(self._tmp_path, "w", _is_gzip(path))
+
+    def write(self, key: int, row: Row):
+        self._batch.append(row)
+        if len(self._batch) >= BATCH_SIZE:
+            self._flush()
+
+    def write_batch(self, records: list[tuple]):
+        self._batch.extend(record[2:] for record in records)
+        if len(self._batch) >= BATCH_SIZE:
+            self._flush()
+
+    @abc.abstractmethod
+    def _write_batch(self, rows: list[Row]): ...
+
+    def _flush(self):
+        self._write_batch(self._batch)
+        self._batch.clear()
+
+    def close(self):
+        self._flush()
+        if self._tmp_path:
+            self._f.close()
+            os.replace(self._tmp_path, self.path)
+        else:
+            self._f.flush()
+
+    def __enter__(self) -> "TextSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._tmp_path:
+            self._f.close()
+            os.remove(self._tmp_path)
+
+
+class CSVSink(TextSink):
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._writer = csv.writer(self._f, lineterminator="\n")
+
+    def _write_batch(self, rows: list[Row]):
+        self._writer.writerows(rows)
+
+
+class JSONLinesSink(TextSink):
+    def _write_batch(self, rows: list[Row]):
+        self._f.write(
+            "".join(
+                json.dumps(dict(zip(JSON_FIELDS, row)), ensure_ascii=False) + "\n"
+                for row in rows
+            )
+        )
+
+
+def open_sink(path: str) -> TextSink:
+    if path != STDOUT and _is_json_lines(path):
+        return JSONLinesSink(path)
+    return CSVSink(path)
+
+
+def read_rows(path: str) -> Iterator[Row]:
+    """Read rows of a file written by a sink, detecting gzip compression by its content."""
+    if path == STDOUT:
+        yield from csv.reader(sys.stdin)  # type: ignore
+        return
+    with open(path, "rb") as f:
+        compress = f.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    with _open_text(path, "r", compress) as f:
+        if _is_json_lines(path):
+            for line in f:
+                obj = json.loads(line)
+                yield obj["datetime"], obj["provider"], obj["subprovider"], obj["text"]
+        else:
+            yield from csv.reader(f)  # type: ignore
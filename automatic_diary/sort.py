@@ -0,0 +1,83 @@
+import heapq
+import itertools
+import logging
+from typing import IO, Any, Iterable, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# Number of records kept in memory before a sorted run is spilled to a temporary file.
+DEFAULT_BUFFER_SIZE = 200000
+
+# Number of records pickled together when writing a run.
+CHUNK_SIZE = 1000
+
+T = TypeVar("T", bound=tuple)
+
+
+def _write_run(records: list[T], tmp_dir: Optional[str]) -> IO[bytes]:
+    import pickle
+    import tempfile
+
+    f = tempfile.TemporaryFile(dir=tmp_dir)
+    for i in range(0, len(records), CHUNK_SIZE):
+        pickle.dump(records[i:i + CHUNK_SIZE], f, protocol=pickle.HIGHEST_PROTOCOL)
+    f.seek(0)
+    return f
+
+
+def _read_run(f: IO[bytes]) -> Iterator[Any]:
+    import pickle
+
+    while True:
+        try:
+            chunk = pickle.load(f)
+        except EOFError:
+            return
+        yield from chunk
+
+
+def external_sort(
+    records: Iterable[T],
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    tmp_dir: Optional[str] = None,
+) -> Iterator[T]:
+    """Sort records that may not fit in memory, see `external_sort_batches`."""
+    it = iter(records)
+    batches = iter(lambda: list(itertools.islice(it, CHUNK_SIZE)), [])
+    return external_sort_batches(batches, buffer_size, tmp_dir)
+
+
+def external_sort_batches(
+    batches: Iterable[list[T]],
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    tmp_dir: Optional[str] = None,
+) -> Iterator[T]:
+    """Sort records passed in batches that may not fit in memory.
+
+    The records are tuples whose first elements are a precomputed sort key and a unique sequence
+    number, so that they are compared in C and never beyond these two elements.
+
+    At most `buffer_size` records are kept in memory. When the buffer is full, it is sorted and
+    spilled to a temporary file. The sorted runs are then merged lazily. Since Timsort detects
+    ascending and descending runs, the output of providers that is already (nearly) sorted, like git
+    log or csfd rating pages, is sorted in close to linear time.
+    """
+    runs: list[IO[bytes]] = []
+    buffer: list[T] = []
+    try:
+        for batch in batches:
+            buffer.extend(batch)
+            if len(buffer) >= buffer_size:
+                buffer.sort()
+                logger.info("Spilling sorted run of %d records", len(buffer))
+                runs.append(_write_run(buffer, tmp_dir))
+                buffer = []
+        buffer.sort()
+        if not runs:
+            yield from buffer
+            return
+        logger.info("Merging %d sorted runs", len(runs) + 1)
+        yield from heapq.merge(buffer, *(_read_run(f) for f in runs))
+    finally:
+        for f in runs:
+            f.close()
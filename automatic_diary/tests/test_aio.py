@@ -0,0 +1,157 @@
+import asyncio
+import datetime
+import http.server
+import re
+import tempfile
+import threading
+import time
+import types
+from unittest import TestCase
+
+import pytest
+
+from automatic_diary.aio import Limiter
+from automatic_diary.batches import provider_batches
+from automatic_diary.cli import call_provider_batches
+from automatic_diary.metrics import RunMetrics
+from automatic_diary.model import DateRange, localize
+
+N_PAGES = 6
+
+
+class _CsfdHandler(http.server.BaseHTTPRequestHandler):
+    """Serve rating pages like csfd.cz, two films per page, one day apart, from the newest."""
+
+    delay = 0.0
+    lock = threading.Lock()
+    requested: list[int] = []
+    in_progress = 0
+    max_in_progress = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_progress += 1
+            cls.max_in_progress = max(cls.max_in_progress, cls.in_progress)
+        try:
+            time.sleep(cls.delay)
+            m = re.search(r"/strana-(\d+)/$", self.path)
+            if not m:
+                self.send_error(404)
+                return
+            page_no = int(m.group(1))
+            with cls.lock:
+                cls.requested.append(page_no)
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(self._render(page_no).encode())
+        finally:
+            with cls.lock:
+                cls.in_progress -= 1
+
+    def _render(self, page_no: int) -> str:
+        paginator = "".join(f'<a href="#">{i}</a>' for i in range(1, N_PAGES + 1))
+        rows = "".join(
+            f'<tr><td><a class="film" href="#">Film {i}</a></td>'
+            f'<td>{(datetime.date(2024, 1, 31) - datetime.timedelta(i)):%d.%m.%Y}</td></tr>'
+            for i in range((page_no - 1) * 2, page_no * 2)
+        )
+        return (
+            '<html><body><div class="profile-content">'
+            f'<div class="paginator">{paginator}<a class="next" href="#">next</a></div>'
+            f'<table class="ui-table-list"><tbody>{rows}</tbody></table></div></body></html>'
+        )
+
+    def log_message(self, *args):
+        pass
+
+
+async def _slow_main(config, no_cache, *args, **kwargs):
+    limiter = Limiter.from_config(config)
+    yield "fast"
+    yield await limiter.call(time.sleep, 1)
+
+
+class TestAio(TestCase):
+    def setUp(self):
+        _CsfdHandler.delay = 0.1
+        _CsfdHandler.requested = []
+        _CsfdHandler.max_in_progress = 0
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _CsfdHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = {
+            "profile_url": f"http://127.0.0.1:{self.server.server_port}/uzivatel/1-foo/",
+            "cache_dir": self.tmp_dir.name,
+            "concurrency": 3,
+        }
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def test_csfd(self):
+        run_metrics = RunMetrics()
+        items = [
+            item
+            for batch in call_provider_batches(
+                [("csfd", self.config)], no_cache=True, run_metrics=run_metrics
+            )
+            for item in batch
+        ]
+        self.assertEqual([item.text for item in items], [f"Film {i}" for i in range(N_PAGES * 2)])
+        self.assertEqual(sorted(_CsfdHandler.requested), list(range(1, N_PAGES + 1)))
+        self.assertGreater(_CsfdHandler.max_in_progress, 1)
+        self.assertLessEqual(_CsfdHandler.max_in_progress, 3)
+        (metrics,) = run_metrics.providers
+        self.assertEqual(metrics.items, N_PAGES * 2)
+        self.assertEqual(metrics.cache_misses, N_PAGES)
+        self.assertGreater(metrics.bytes_read, 0)
+        self.assertEqual(metrics.errors, 0)
+
+    def test_csfd_stops_at_date_range(self):
+        _CsfdHandler.delay = 0.0
+        self.config["concurrency"] = 1
+        date_range = DateRange(since=localize(datetime.datetime(2024, 1, 28)))
+        from automatic_diary.providers.csfd import main as csfd
+
+        items = [
+            item
+            for batch in provider_batches(csfd, self.config, True, date_range)
+            for item in batch
+        ]
+        self.assertEqual(len(items), 4)
+        self.assertEqual(_CsfdHandler.requested, [1, 2, 3])
+
+    def test_timeout(self):
+        module = types.ModuleType("slow")
+        module.main = _slow_main  # type: ignore
+        batches = provider_batches(module, {"timeout": 0.05}, True, DateRange())
+        self.assertEqual(next(batches), ["fast"])
+        with pytest.raises(TimeoutError, match="timed out after 0.05s"):
+            next(batches)
+
+    def test_timeout_keeps_slot(self):
+        started = []
+        release = threading.Event()
+
+        def func(name: str) -> str:
+            started.append(name)
+            if name == "slow":
+                release.wait()
+            return name
+
+        async def calls():
+            limiter = Limiter(concurrency=1, timeout=0.2)
+            with pytest.raises(TimeoutError, match="func timed out"):
+                await limiter.call(func, "slow")
+            fast = asyncio.ensure_future(limiter.call(func, "fast"))
+            await asyncio.sleep(0.05)
+            # The thread of the slow call is still running, so it keeps the only slot.
+            self.assertEqual(started, ["slow"])
+            release.set()
+            self.assertEqual(await fast, "fast")
+
+        asyncio.run(calls())
+        self.assertEqual(started, ["slow", "fast"])
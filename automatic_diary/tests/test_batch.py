@@ -0,0 +1,68 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from automatic_diary.batch import run_batch
+from automatic_diary.shared import shared_iterable, sharing
+
+calls: list[str] = []
+
+
+@shared_iterable
+def _lookup(path: str):
+    calls.append(path)
+    yield from path
+
+
+class TestBatch(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_shared_iterable(self):
+        self.assertEqual(list(_lookup("ab")), ["a", "b"])
+        self.assertEqual(list(_lookup("ab")), ["a", "b"])
+        self.assertEqual(calls, ["ab", "ab"])
+        calls.clear()
+        with sharing():
+            self.assertEqual(list(_lookup("ab")), ["a", "b"])
+            self.assertEqual(list(_lookup("ab")), ["a", "b"])
+            self.assertEqual(list(_lookup("cd")), ["c", "d"])
+        self.assertEqual(calls, ["ab", "cd"])
+
+    def test_shared_iterable_eviction(self):
+        with sharing(max_entries=2) as cache:
+            for path in ["ab", "cd", "ab", "ef", "ab", "cd"]:
+                self.assertEqual(list(_lookup(path)), list(path))
+            self.assertEqual(len(cache), 2)
+        # "cd" is evicted by "ef" as the least recently used one, "ab" stays cached.
+        self.assertEqual(calls, ["ab", "cd", "ef", "cd"])
+
+    def test_run_batch(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            base_dir = Path(tmp_dir)
+            (base_dir / "done.txt").write_text("x 2019-01-25 2019-01-20 Opravit kolo\n")
+            (base_dir / "config.json").write_text(
+                json.dumps(
+                    [
+                        {"provider": "todotxt", "config": {"path": str(base_dir / "done.txt")}},
+                        {"provider": "todotxt", "config": {"path": str(base_dir / "missing.txt")}},
+                    ]
+                )
+            )
+            entries = [
+                {"name": "alice", "config": "config.json", "output": "alice.csv"},
+                {"name": "bob", "config": "missing.json", "output": "bob.csv"},
+                {"config": "config.json", "output": "carol.csv", "providers": ["txt"]},
+            ]
+            results = run_batch(entries, tmp_dir, jobs=2)
+            self.assertEqual(
+                (base_dir / "alice.csv").read_text(), "2019-01-25,todotxt,done.txt,Opravit kolo\n"
+            )
+            self.assertEqual((base_dir / "carol.csv").read_text(), "")
+        self.assertEqual([result.name for result in results], ["alice", "bob", "carol.csv"])
+        self.assertEqual([result.items for result in results], [1, 0, 0])
+        self.assertEqual([result.provider_errors for result in results], [1, 0, 0])
+        self.assertEqual([result.ok for result in results], [False, False, True])
+        self.assertIsNone(results[0].error)
+        self.assertIn("FileNotFoundError", results[1].error or "")
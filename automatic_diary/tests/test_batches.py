@@ -0,0 +1,80 @@
+import datetime
+import tempfile
+import types
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+import pytest
+
+from automatic_diary.batches import batched, unbatched
+from automatic_diary.cli import call_provider_batches, write_csv_batches
+from automatic_diary.metrics import RunMetrics
+from automatic_diary.model import Item
+
+
+def _item(day: int, text: str) -> Item:
+    return Item.normalized(
+        datetime_=datetime.datetime(2024, 1, day),
+        text=text,
+        provider="fake",
+        subprovider="fake.txt",
+        all_day=True,
+    )
+
+
+def _fake_main_batches(config, no_cache, *args, **kwargs):
+    yield [_item(2, "b"), _item(1, "a")]
+    yield []
+    yield [_item(3, "c")]
+
+
+def _fake_import_module(name: str) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.main_batches = _fake_main_batches  # type: ignore
+    return module
+
+
+class TestBatches(TestCase):
+    def test_batched(self):
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(unbatched(batched(range(5), 2))), [0, 1, 2, 3, 4])
+
+    def test_batched_error(self):
+        def failing():
+            yield from range(3)
+            raise ValueError("Failed")
+
+        batches = batched(failing(), 2)
+        self.assertEqual(next(batches), [0, 1])
+        self.assertEqual(next(batches), [2])
+        with pytest.raises(ValueError, match="Failed"):
+            next(batches)
+
+    @patch("automatic_diary.cli.importlib.import_module", _fake_import_module)
+    def test_call_provider_batches(self):
+        run_metrics = RunMetrics()
+        batches = list(
+            call_provider_batches([("fake", {})], no_cache=False, run_metrics=run_metrics)
+        )
+        self.assertEqual([[item.text for item in batch] for batch in batches], [["b", "a"], ["c"]])
+        self.assertEqual(run_metrics.providers[0].items, 3)
+
+    def test_write_csv_batches(self):
+        future = Item.normalized(
+            datetime_=datetime.datetime.now() + datetime.timedelta(days=1),
+            text="future",
+            provider="fake",
+            subprovider="fake.txt",
+        )
+        batches = [[_item(3, "c"), _item(1, "a"), future], [_item(2, "b"), _item(1, "a")]]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "out.csv"
+            duplicates = write_csv_batches(batches, str(path))
+            self.assertEqual(
+                path.read_text(),
+                "2024-01-01,fake,fake.txt,a\n"
+                "2024-01-02,fake,fake.txt,b\n"
+                "2024-01-03,fake,fake.txt,c\n",
+            )
+        self.assertEqual(duplicates, {"fake": 1})
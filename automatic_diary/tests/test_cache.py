@@ -0,0 +1,251 @@
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+import pytest
+
+from automatic_diary.cache import (
+    STATS_FILE, cache_lock, find_cache_file, has_cache_file, lock_path, read_cache_dir,
+    read_cache_file, read_stats, record_stats, remove_lock, set_cache_pack, with_cache,
+    write_atomic, write_cache_dir, write_cache_file, write_cache_files,
+)
+from automatic_diary.cache_gc import find_cache_dirs, main, parse_size, plan_gc, remove_entries
+from automatic_diary.cache_pack import CachePack
+
+
+def _write(path: Path, size: int, days_ago: float) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - days_ago * 24 * 3600
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+class TestCache(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir_path = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_cache_file(self):
+        path = self.dir_path / "repo" / "abc.txt"
+        self.assertIsNone(read_cache_file(path))
+        write_cache_file(path, "foo\nbar\n")
+        entry_path = find_cache_file(path)
+        assert entry_path
+        self.assertEqual(entry_path.name, "abc.txt.gz")
+        self.assertEqual(gzip.decompress(entry_path.read_bytes()), b"foo\nbar\n")
+        self.assertEqual(read_cache_file(path), "foo\nbar\n")
+
+        legacy_path = self.dir_path / "legacy.txt"
+        legacy_path.write_text("baz")
+        self.assertEqual(read_cache_file(legacy_path), "baz")
+
+    def test_with_cache(self):
+        path = self.dir_path / "abc.txt"
+        self.assertEqual(with_cache(lambda: "foo", path, False), "foo")
+        self.assertEqual(with_cache(lambda: "bar", path, False), "foo")
+        self.assertEqual(with_cache(lambda: "bar", path, True), "bar")
+        self.assertEqual(with_cache(lambda: "baz", None, False), "baz")
+
+    def test_corrupt_entry(self):
+        path = self.dir_path / "abc.txt"
+        write_cache_file(path, "foo" * 1000)
+        entry_path = find_cache_file(path)
+        assert entry_path
+        entry_path.write_bytes(entry_path.read_bytes()[:-10])
+        self.assertIsNone(read_cache_file(path))
+        self.assertFalse(entry_path.exists())
+        entry_path.write_bytes(b"\x1f\x8b garbage")
+        self.assertEqual(with_cache(lambda: "bar", path, False), "bar")
+        self.assertEqual(with_cache(lambda: "baz", path, False), "bar")
+
+    def test_zstd_entry_without_zstandard(self):
+        path = self.dir_path / "abc.txt"
+        zst_path = self.dir_path / "abc.txt.zst"
+        zst_path.write_bytes(b"\x28\xb5\x2f\xfd")
+        with (
+            patch.dict(sys.modules, {"zstandard": None}),
+            patch("automatic_diary.cache._compression", return_value=(".gz", gzip.compress)),
+        ):
+            with self.assertLogs("automatic_diary.cache", "WARNING") as logs:
+                self.assertEqual(with_cache(lambda: "foo", path, False), "foo")
+            self.assertIn("zstandard", logs.output[0])
+            self.assertFalse(zst_path.exists())
+            self.assertEqual(with_cache(lambda: "bar", path, False), "foo")
+
+    def test_write_atomic(self):
+        path = self.dir_path / "abc.txt"
+        write_atomic(path, b"foo")
+        with patch("os.replace", side_effect=KeyboardInterrupt), pytest.raises(KeyboardInterrupt):
+            write_atomic(path, b"bar")
+        self.assertEqual(path.read_bytes(), b"foo")
+        self.assertEqual(list(self.dir_path.iterdir()), [path])
+
+    def test_with_cache_concurrent(self):
+        path = self.dir_path / "abc.txt"
+        calls = []
+
+        def func() -> str:
+            calls.append(1)
+            time.sleep(0.05)
+            return "foo"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(with_cache(func, path, False)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["foo"] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_remove_lock(self):
+        path = self.dir_path / "abc.txt"
+        with cache_lock(path):
+            self.assertTrue(remove_lock(path))
+            self.assertTrue(lock_path(path).exists())
+        self.assertFalse(remove_lock(path))
+        self.assertFalse(lock_path(path).exists())
+        self.assertFalse(remove_lock(path))
+        # A lock removed while a run was waiting for it is created again by that run.
+        results = []
+        with cache_lock(path):
+            thread = threading.Thread(
+                target=lambda: results.append(with_cache(lambda: "foo", path, False))
+            )
+            thread.start()
+            lock_path(path).unlink()
+        thread.join()
+        self.assertEqual(results, ["foo"])
+        self.assertTrue(lock_path(path).exists())
+
+    def test_cache_dir(self):
+        cache_dir = self.dir_path / "caldav"
+        write_cache_files([(cache_dir / "a.ics", "A")])
+        self.assertEqual(read_cache_dir(cache_dir), [])
+        write_cache_dir(cache_dir, [(cache_dir / "a.ics", "A"), (cache_dir / "b.ics", "B")])
+        self.assertEqual(sorted(read_cache_dir(cache_dir)), ["A", "B"])
+        (cache_dir / "b.ics.gz").write_bytes(b"\x1f\x8b")
+        self.assertEqual(read_cache_dir(cache_dir), [])
+
+    def test_stats(self):
+        record_stats(self.dir_path, 3, 1)
+        record_stats(self.dir_path, 1, 0)
+        record_stats(self.dir_path / "missing", 1, 0)
+        stats = read_stats(self.dir_path)
+        self.assertEqual((stats["hits"], stats["misses"]), (4, 1))
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size("100"), 100)
+        self.assertEqual(parse_size("1.5K"), 1536)
+        self.assertEqual(parse_size("2GiB"), 2 << 30)
+        with pytest.raises(ValueError, match="Invalid size 'lots'"):
+            parse_size("lots")
+
+    def test_gc(self):
+        git_dir = self.dir_path / "git"
+        _write(git_dir / "repo1" / "old.txt.gz", 100, 10)
+        _write(git_dir / "repo1" / "new.txt.gz", 100, 1)
+        _write(git_dir / "repo1" / "old.txt.lock", 0, 10)
+        _write(git_dir / "repo2" / "only.txt", 100, 60)
+        csfd_dir = self.dir_path / "csfd"
+        for page_no, days_ago in enumerate((5, 4, 3, 2), 1):
+            _write(csfd_dir / f"{page_no}.html.gz", 1000, days_ago)
+        caldav_dir = self.dir_path / "caldav"
+        _write(caldav_dir / "a.ics.gz", 500, 40)
+        _write(caldav_dir / "b.ics.gz", 500, 1)
+        _write(caldav_dir / "cache_complete", 0, 1)
+        _write(caldav_dir / ".c.ics.gz.x1y2.tmp", 300, 1)
+        _write(caldav_dir / ".d.ics.gz.x3y4.tmp", 300, 0)
+        record_stats(csfd_dir, 3, 1)
+        configs = [
+            ("git", {"cache_dir": str(git_dir)}),
+            ("csfd", {"cache_dir": str(csfd_dir)}),
+            ("caldav", {"cache_dir": str(caldav_dir)}),
+            ("txt", {"path": "diary.txt"}),
+        ]
+        cache_dirs = find_cache_dirs(configs)
+        self.assertEqual([len(cache_dir.entries) for cache_dir in cache_dirs], [3, 4, 1])
+        self.assertEqual(cache_dirs[1].hit_rate, 0.75)
+
+        evicted = plan_gc(cache_dirs, max_age=30 * 24 * 3600, provider_max_sizes={"csfd": 2500})
+        self.assertEqual(
+            sorted(path.name for entry in evicted for path in entry.paths),
+            ["1.html.gz", "2.html.gz", "old.txt.gz", "only.txt"],
+        )
+        evicted = plan_gc(cache_dirs, max_size=2000)
+        self.assertEqual(
+            sorted(path.name for entry in evicted for path in entry.paths),
+            ["1.html.gz", "2.html.gz", "3.html.gz", "4.html.gz", "old.txt.gz", "only.txt"],
+        )
+
+        config_path = self.dir_path / "config.json"
+        config_path.write_text(
+            json.dumps([{"provider": provider, "config": config} for provider, config in configs])
+        )
+        stdout = io.StringIO()
+        # The lock of an evicted entry held by another run is kept.
+        with patch("sys.stdout", stdout), cache_lock(csfd_dir / "1.html"):
+            main(["gc", str(config_path), "--max-age", "30", "--provider-max-size", "csfd=2.5K"])
+        self.assertIn("Reclaimed 2.0 KiB (2 entries) of csfd", stdout.getvalue())
+        self.assertIn("Reclaimed 2.1 KiB in total", stdout.getvalue())
+        self.assertEqual(sorted(p.name for p in git_dir.rglob("*")), ["new.txt.gz", "repo1"])
+        self.assertEqual(
+            sorted(p.name for p in csfd_dir.iterdir()),
+            ["1.html.lock", "3.html.gz", "4.html.gz", STATS_FILE, f"{STATS_FILE}.lock"],
+        )
+        self.assertEqual(
+            sorted(p.name for p in caldav_dir.iterdir()),
+            [".d.ics.gz.x3y4.tmp", "a.ics.gz", "b.ics.gz", "cache_complete"],
+        )
+
+        stdout = io.StringIO()
+        with patch("sys.stdout", stdout):
+            main(["stats", str(config_path)])
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(lines[2].split()[:5], ["csfd", "2", "2.0", "KiB", "75%"])
+
+    def test_cache_pack(self):
+        pack_path = self.dir_path / "cache.sqlite"
+        cache_dir = self.dir_path / "caldav"
+        pack = CachePack(str(pack_path))
+        set_cache_pack(pack)
+        try:
+            self.assertEqual(read_cache_dir(cache_dir), [])
+            write_cache_files(
+                [(cache_dir / "a.ics", "A"), (cache_dir / "b.ics", "B"), (cache_dir / "c", "C")]
+            )
+            write_cache_file(self.dir_path / "caldav2" / "d.ics", "D")
+            self.assertEqual(read_cache_dir(cache_dir), ["A", "B", "C"])
+            self.assertTrue(has_cache_file(cache_dir / "a.ics"))
+            self.assertFalse(has_cache_file(cache_dir / "x.ics"))
+            self.assertEqual(read_cache_file(cache_dir / "b.ics"), "B")
+            self.assertEqual(with_cache(lambda: "E", cache_dir / "e.ics", False), "E")
+            self.assertEqual(with_cache(lambda: "F", cache_dir / "e.ics", False), "E")
+            record_stats(cache_dir, 2, 1)
+            self.assertEqual(read_stats(cache_dir)["hits"], 2)
+        finally:
+            set_cache_pack(None)
+        self.assertFalse(cache_dir.exists())
+
+        cache_dirs = find_cache_dirs([("csfd", {"cache_dir": str(cache_dir)})], pack=pack)
+        self.assertEqual(len(cache_dirs[0].entries), 4)
+        self.assertEqual(cache_dirs[0].hits, 2)
+        remove_entries(plan_gc(cache_dirs, max_size=2), cache_dirs, pack)
+        self.assertEqual(len(pack.list_dir(cache_dir)), 0)
+        self.assertEqual(len(pack.list_dir(self.dir_path / "caldav2")), 1)
+        pack.close()
@@ -0,0 +1,109 @@
+import tempfile
+import threading
+import types
+from unittest import TestCase
+from unittest.mock import patch
+
+from automatic_diary.batches import provider_batches
+from automatic_diary.metrics import ProviderMetrics, measured
+from automatic_diary.model import DateRange
+from automatic_diary.providers.caldav import main as caldav_main
+
+EVENT = """BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//automatic-diary//test//EN
+BEGIN:VEVENT
+UID:{uid}
+DTSTAMP:20240101T000000Z
+DTSTART:2024010{day}T100000Z
+SUMMARY:{summary}
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+class _Event:
+    def __init__(self, uid: str, day: int, summary: str):
+        self.url = f"https://dav.example.com/calendars/{uid}.ics"
+        self.data = EVENT.format(uid=uid, day=day, summary=summary)
+
+
+class _Calendar:
+    # Both calendars must be listed at the same time to pass the barrier.
+    barrier = threading.Barrier(2, timeout=10)
+
+    def __init__(self, events: list[_Event]):
+        self._events = events
+
+    def events(self) -> list[_Event]:
+        self.barrier.wait()
+        return self._events
+
+
+class _Principal:
+    def calendars(self) -> list[_Calendar]:
+        return [
+            _Calendar([_Event("a", 1, "Meeting"), _Event("b", 2, "Lunch")]),
+            _Calendar([_Event("c", 3, "Dentist")]),
+        ]
+
+
+class _Client:
+    connections = 0
+
+    def __init__(self, url: str, username: str, password: str, timeout: float):
+        type(self).connections += 1
+
+    def principal(self) -> _Principal:
+        return _Principal()
+
+
+class TestCalDAV(TestCase):
+    def setUp(self):
+        _Client.connections = 0
+        _Calendar.barrier.reset()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = {
+            "url": "https://dav.example.com/",
+            "username": "jane",
+            "password_key": "key",
+            "password_val": "val",
+            "password_label": "label",
+            "cache_dir": self.tmp_dir.name,
+            "concurrency": 2,
+        }
+        fake_caldav = types.SimpleNamespace(DAVClient=_Client, Calendar=_Calendar)
+        for patcher in (
+            patch.object(caldav_main, "caldav", fake_caldav),
+            patch.object(caldav_main, "search_secret", return_value="secret"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_items(self, metrics: ProviderMetrics) -> list[tuple[str, str]]:
+        batches = measured(
+            metrics,
+            lambda: provider_batches(caldav_main, self.config, False, DateRange()),
+            batches=True,
+        )
+        items = [item for batch in batches for item in batch]
+        return sorted((item.datetime_.isoformat(), item.text) for item in items)
+
+    def test_main(self):
+        expected = [
+            ("2024-01-01T10:00:00+00:00", "Meeting"),
+            ("2024-01-02T10:00:00+00:00", "Lunch"),
+            ("2024-01-03T10:00:00+00:00", "Dentist"),
+        ]
+        metrics = ProviderMetrics("caldav", "abc")
+        self.assertEqual(self.read_items(metrics), expected)
+        self.assertEqual(_Client.connections, 1)
+        self.assertEqual(metrics.cache_misses, 1)
+
+        metrics = ProviderMetrics("caldav", "abc")
+        self.assertEqual(self.read_items(metrics), expected)
+        self.assertEqual(_Client.connections, 1)
+        self.assertEqual(metrics.cache_hits, 1)
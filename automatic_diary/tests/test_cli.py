@@ -1,7 +1,57 @@
+import datetime
+import json
+import os.path
+import sqlite3
+import sys
+import tempfile
+import types
 import unicodedata
 from unittest import TestCase
+from unittest.mock import patch
 
-from automatic_diary.cli import obfuscate
+from automatic_diary import model
+from automatic_diary.cli import call_providers, main
+from automatic_diary.metrics import RunMetrics
+from automatic_diary.model import Item, set_default_tz, set_target_tz
+from automatic_diary.obfuscate import obfuscate
+
+
+def _fake_main(n: int, fail: bool = False):
+    def main(config, no_cache, *args, **kwargs):
+        for i in range(n):
+            yield Item.normalized(
+                datetime_=datetime.datetime(2024, 1, 1, 0, 0, i),
+                text=f"{config['name']} {i}",
+                provider="fake",
+                subprovider=config["name"],
+            )
+        if fail:
+            raise Exception("Provider failed")
+
+    return main
+
+
+def _fake_import_module(name: str) -> types.ModuleType:
+    provider = name.split(".")[-2]
+    if provider == "missing":
+        raise ModuleNotFoundError(name)
+    module = types.ModuleType(name)
+    module.main = _fake_main(3, fail=provider == "failing")  # type: ignore
+    return module
+
+
+def _late_evening_module(name: str) -> types.ModuleType:
+    def main(config, no_cache, *args, **kwargs):
+        yield Item.normalized(
+            datetime_=datetime.datetime(2024, 1, 1, 23, 30, tzinfo=datetime.timezone.utc),
+            text="Late evening",
+            provider="fake",
+            subprovider="fake",
+        )
+
+    module = types.ModuleType(name)
+    module.main = main  # type: ignore
+    return module
 
 
 class TestCLI(TestCase):
@@ -15,3 +65,64 @@ class TestCLI(TestCase):
                 unicodedata.category(source_char),
                 unicodedata.category(result_char),
             )
+
+    @patch("automatic_diary.cli.importlib.import_module", _fake_import_module)
+    def test_call_providers(self):
+        configs = [
+            ("first", {"name": "a"}),
+            ("failing", {"name": "b"}),
+            ("missing", {"name": "c"}),
+            ("second", {"name": "d"}),
+        ]
+        sequential = [item.text for item in call_providers(configs, no_cache=False)]
+        self.assertEqual(
+            sequential, ["a 0", "a 1", "a 2", "b 0", "b 1", "b 2", "d 0", "d 1", "d 2"]
+        )
+        concurrent = [item.text for item in call_providers(configs, no_cache=False, jobs=3)]
+        self.assertCountEqual(concurrent, sequential)
+
+    @patch("automatic_diary.cli.importlib.import_module", _fake_import_module)
+    def test_call_providers_metrics(self):
+        configs = [("first", {"name": "a"}), ("failing", {"name": "b"}), ("missing", {})]
+        run_metrics = RunMetrics()
+        list(call_providers(configs, no_cache=False, jobs=2, run_metrics=run_metrics))
+        metrics_by_provider = {metrics.provider: metrics for metrics in run_metrics.providers}
+        self.assertEqual(metrics_by_provider["first"].items, 3)
+        self.assertEqual(metrics_by_provider["first"].errors, 0)
+        self.assertEqual(metrics_by_provider["failing"].items, 3)
+        self.assertEqual(metrics_by_provider["failing"].errors, 1)
+        self.assertEqual(metrics_by_provider["missing"].errors, 1)
+
+    @patch("automatic_diary.cli.importlib.import_module", _fake_import_module)
+    def test_call_providers_close_early(self):
+        configs = [("first", {"name": str(i)}) for i in range(10)]
+        items = call_providers(configs, no_cache=False, jobs=2)
+        self.assertIsNotNone(next(items))
+        items.close()
+
+    @patch("automatic_diary.cli.importlib.import_module", _late_evening_module)
+    def test_main_timezone(self):
+        self.addCleanup(set_default_tz, model.default_tz)
+        self.addCleanup(set_target_tz, model.target_tz)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_path = os.path.join(tmp_dir, "config.json")
+            with open(config_path, "w") as f:
+                json.dump([{"provider": "fake", "config": {}}], f)
+            sqlite_path = os.path.join(tmp_dir, "diary.sqlite")
+            argv = [
+                "automatic-diary",
+                "--timezone",
+                "Asia/Tokyo",
+                "--sqlite",
+                sqlite_path,
+                config_path,
+                os.path.join(tmp_dir, "diary.csv"),
+            ]
+            with patch.object(sys, "argv", argv):
+                main()
+            conn = sqlite3.connect(sqlite_path)
+            try:
+                days = conn.execute("SELECT day, text FROM items").fetchall()
+            finally:
+                conn.close()
+        self.assertEqual(days, [("2024-01-02", "Late evening")])
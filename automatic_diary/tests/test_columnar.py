@@ -0,0 +1,80 @@
+import datetime
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from automatic_diary.columnar import ColumnarReader, ColumnarWriter, is_columnar, parse_utc_offset
+from automatic_diary.model import Item, timestamp_key
+from automatic_diary.visualize import read_columnar_items, read_items
+
+ROWS = [
+    ("2019-01-02", "todotxt", "done.txt", "Opravit kolo"),
+    ("2024-09-24T23:11:53.589437+02:00", "git", "my-project", "Initial commit"),
+    ("2024-09-24T23:12:03-07:00", "git", "other-project", "Add more files"),
+]
+
+
+class TestColumnar(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp_dir.name) / "items.adc")
+        with ColumnarWriter(self.path) as writer:
+            for formatted_datetime, *row in ROWS:
+                datetime_ = datetime.datetime.fromisoformat(formatted_datetime)
+                item = Item.normalized(datetime_, row[2], row[0], row[1])
+                key = timestamp_key(item.datetime_)
+                writer.write(key, (formatted_datetime, *row))  # type: ignore
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        self.assertTrue(is_columnar(self.path))
+        with ColumnarReader(self.path) as reader:
+            self.assertEqual(reader.n_rows, 3)
+            self.assertEqual(reader.provider_names, ["todotxt", "git"])
+            rows = list(reader.iter_rows())
+        self.assertEqual(
+            [
+                (
+                    datetime_.date().isoformat() if all_day else datetime_.isoformat(),
+                    provider,
+                    subprovider,
+                    text,
+                )
+                for datetime_, provider, subprovider, text, all_day in rows
+            ],
+            ROWS,
+        )
+        self.assertEqual([row[4] for row in rows], [True, False, False])
+
+    def test_read_columnar_items(self):
+        with ColumnarReader(self.path) as reader:
+            result = read_columnar_items(reader)
+        expected = read_items([list(row) for row in ROWS])
+        self.assertEqual(
+            {
+                (year, month, day, item.text)
+                for year, months in result.items()
+                for month, days in months.items()
+                for day, items in days.items()
+                for item in items
+            },
+            {
+                (year, month, day, item.text)
+                for year, months in expected.items()
+                for month, days in months.items()
+                for day, items in days.items()
+                for item in items
+            },
+        )
+
+    def test_parse_utc_offset(self):
+        for formatted_datetime, expected in [
+            ("2024-09-24T23:11:53.589437+02:00", 7200),
+            ("2024-09-24T23:12:03-07:00", -7 * 3600),
+            ("2024-09-24T23:12:03+05:30", 5 * 3600 + 1800),
+            ("2024-09-24T23:12:03+00:00:30", 30),
+            ("2024-09-24T23:12:03", 0),
+        ]:
+            self.assertEqual(parse_utc_offset(0, formatted_datetime), (False, expected))
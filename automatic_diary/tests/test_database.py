@@ -0,0 +1,97 @@
+import datetime
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from automatic_diary.database import SQLiteReader, SQLiteWriter, is_sqlite
+from automatic_diary.model import Item, default_tz, set_target_tz, target_tz, timestamp_key
+from automatic_diary.visualize import read_columnar_items
+
+ROWS = [
+    ("2019-01-02", "todotxt", "done.txt", "Opravit kolo"),
+    ("2024-09-24T23:11:53.589437+02:00", "git", "my-project", "Initial commit"),
+    ("2024-09-24T23:12:03-07:00", "git", "other-project", "Add more files"),
+]
+
+
+def write_rows(path: str, rows: list[tuple[str, str, str, str]]) -> int:
+    with SQLiteWriter(path) as writer:
+        for formatted_datetime, *row in rows:
+            datetime_ = datetime.datetime.fromisoformat(formatted_datetime)
+            item = Item.normalized(datetime_, row[2], row[0], row[1])
+            writer.write(timestamp_key(item.datetime_), (formatted_datetime, *row))  # type: ignore
+    return writer.n_inserted
+
+
+class TestDatabase(TestCase):
+    def setUp(self):
+        set_target_tz(datetime.timezone(datetime.timedelta(hours=2)))
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp_dir.name) / "items.sqlite")
+        write_rows(self.path, ROWS)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        set_target_tz(target_tz)
+
+    def test_round_trip(self):
+        self.assertTrue(is_sqlite(self.path))
+        with SQLiteReader(self.path) as reader:
+            self.assertEqual(reader.n_rows, 3)
+            rows = list(reader.iter_rows())
+        self.assertEqual(
+            [
+                (
+                    datetime_.date().isoformat() if all_day else datetime_.isoformat(),
+                    provider,
+                    subprovider,
+                    text,
+                )
+                for datetime_, provider, subprovider, text, all_day in rows
+            ],
+            ROWS,
+        )
+
+    def test_rewrite(self):
+        new_row = ("2024-09-25T08:00:00+02:00", "git", "my-project", "Fix typo")
+        self.assertEqual(write_rows(self.path, ROWS + [new_row]), 1)
+        with SQLiteReader(self.path) as reader:
+            self.assertEqual(reader.n_rows, 4)
+
+    def test_queries(self):
+        with SQLiteReader(self.path) as reader:
+            self.assertEqual(
+                [row[3] for row in reader.iter_rows(day=datetime.date(2024, 9, 24))],
+                ["Initial commit"],
+            )
+            # 23:12 at UTC-07:00 is the next day in the target timezone.
+            self.assertEqual(
+                [row[3] for row in reader.iter_rows(day=datetime.date(2024, 9, 25))],
+                ["Add more files"],
+            )
+            self.assertEqual(
+                [row[3] for row in reader.iter_rows(day=datetime.date(2019, 1, 2))],
+                ["Opravit kolo"],
+            )
+            self.assertEqual(
+                [row[3] for row in reader.iter_rows(provider="git", subprovider="other-project")],
+                ["Add more files"],
+            )
+            self.assertEqual(
+                [
+                    row[3]
+                    for row in reader.iter_rows(
+                        since=datetime.datetime(2024, 1, 1, tzinfo=default_tz),
+                        until=datetime.datetime(2024, 9, 25, tzinfo=default_tz),
+                    )
+                ],
+                ["Initial commit"],
+            )
+
+    def test_read_columnar_items(self):
+        with SQLiteReader(self.path) as reader:
+            result = read_columnar_items(reader)
+        self.assertEqual(
+            [item.text for item in result[2019][1][2]],
+            ["Opravit kolo"],
+        )
@@ -0,0 +1,46 @@
+import datetime
+from unittest import TestCase
+
+import dateutil.tz
+
+from automatic_diary.days import DayBucketer
+
+prague = dateutil.tz.gettz("Europe/Prague")
+new_york = dateutil.tz.gettz("America/New_York")
+kolkata = dateutil.tz.gettz("Asia/Kolkata")
+
+
+class TestDayBucketer(TestCase):
+    def assert_dates(self, tz: datetime.tzinfo, timestamps: list[int]):
+        bucketer = DayBucketer(tz)
+        for ts in timestamps:
+            expected = datetime.datetime.fromtimestamp(ts, tz).date()
+            self.assertEqual(bucketer.date(ts), expected, ts)
+
+    def test_dst_transitions(self):
+        # 2024-03-31 01:00 UTC and 2024-10-27 01:00 UTC are the DST transitions in Europe.
+        spring = int(datetime.datetime(2024, 3, 31, 1, tzinfo=datetime.timezone.utc).timestamp())
+        autumn = int(datetime.datetime(2024, 10, 27, 1, tzinfo=datetime.timezone.utc).timestamp())
+        timestamps = [
+            transition + delta
+            for transition in (spring, autumn)
+            for delta in range(-2 * 86400, 2 * 86400, 599)
+        ]
+        timestamps += [spring - 1, spring, autumn - 1, autumn]
+        self.assert_dates(prague, timestamps)
+        self.assert_dates(new_york, timestamps)
+
+    def test_unordered(self):
+        start = int(datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+        timestamps = [start + (i * 7919 * 3607) % (10 * 365 * 86400) for i in range(2000)]
+        self.assert_dates(prague, timestamps)
+        self.assert_dates(kolkata, timestamps)
+        self.assert_dates(datetime.timezone.utc, timestamps)
+
+    def test_offset(self):
+        bucketer = DayBucketer(prague)
+        winter = int(datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc).timestamp())
+        summer = int(datetime.datetime(2024, 7, 15, tzinfo=datetime.timezone.utc).timestamp())
+        self.assertEqual(bucketer.offset(winter), 3600)
+        self.assertEqual(bucketer.offset(summer), 7200)
+        self.assertEqual(bucketer.offset(winter + 86400), 3600)
@@ -0,0 +1,18 @@
+from unittest import TestCase
+
+from automatic_diary.dedup import WindowedDeduplicator
+
+
+class TestDedup(TestCase):
+    def test_windowed_deduplicator(self):
+        deduplicator = WindowedDeduplicator()
+        row_a = ("2024-01-01", "txt", "diary.txt", "foo")
+        row_b = ("2024-01-01", "txt", "diary.txt", "bar")
+        row_c = ("2024-01-02", "git", "repo", "foo")
+        self.assertFalse(deduplicator.is_duplicate(1, row_a))
+        self.assertFalse(deduplicator.is_duplicate(1, row_b))
+        self.assertTrue(deduplicator.is_duplicate(1, row_a))
+        self.assertFalse(deduplicator.is_duplicate(2, row_c))
+        self.assertTrue(deduplicator.is_duplicate(2, row_c))
+        self.assertTrue(deduplicator.is_duplicate(2, row_c))
+        self.assertEqual(deduplicator.duplicates_by_provider, {"txt": 1, "git": 2})
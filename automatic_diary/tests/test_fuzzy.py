@@ -0,0 +1,96 @@
+import datetime
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from automatic_diary.cli import write_csv
+from automatic_diary.fuzzy import FuzzyDeduplicator, normalize, shingles
+from automatic_diary.model import Item, set_target_tz, target_tz, timestamp_key
+
+
+def _item(hour: int, text: str, provider: str, day: int = 1) -> Item:
+    return Item.normalized(
+        datetime_=datetime.datetime(2024, 1, day, hour),
+        text=text,
+        provider=provider,
+        subprovider="foo",
+    )
+
+
+def _key(row: tuple[str, str, str, str]) -> int:
+    return timestamp_key(datetime.datetime.fromisoformat(row[0]))
+
+
+class TestFuzzy(TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize("Pelíšky  (1999)!"), "pelisky 1999")
+        self.assertEqual(shingles("Ab"), frozenset())
+        self.assertEqual(shingles("Abc"), frozenset(["abc"]))
+        self.assertEqual(shingles("Abcd"), frozenset(["abc", "bcd"]))
+
+    def test_fuzzy_deduplicator(self):
+        deduplicator = FuzzyDeduplicator(["caldav", "icalendar"])
+        rows = [
+            ("2024-01-01T10:00:00+01:00", "caldav", "cal", "Dentist appointment"),
+            ("2024-01-01T10:00:00+01:00", "caldav", "cal", "Dentist appointment!"),
+            ("2024-01-01T10:30:00+01:00", "icalendar", "a.ics", "dentist appointment"),
+            ("2024-01-01T11:00:00+01:00", "icalendar", "a.ics", "Lunch with Anna"),
+            ("2024-01-01T11:00:00+01:00", "txt", "diary.txt", "Dentist appointment"),
+            ("2024-01-02T10:00:00+01:00", "icalendar", "a.ics", "Dentist appointment"),
+        ]
+        self.assertEqual(
+            [deduplicator.is_duplicate(_key(row), row) for row in rows],
+            [False, False, True, False, False, False],
+        )
+        self.assertEqual(deduplicator.duplicates_by_provider, {"icalendar": 1})
+
+    def test_short_texts(self):
+        deduplicator = FuzzyDeduplicator()
+        rows = [
+            ("2024-01-01", "txt", "diary.txt", "OK"),
+            ("2024-01-01", "todotxt", "done.txt", "ok!"),
+            ("2024-01-01", "orgmode", "notes.org", ""),
+        ]
+        self.assertEqual([deduplicator.is_duplicate(0, row) for row in rows], [False] * 3)
+
+    def test_target_tz_day(self):
+        set_target_tz(datetime.timezone(datetime.timedelta(hours=2)))
+        try:
+            deduplicator = FuzzyDeduplicator()
+            # Different dates in their own UTC offsets, but the same day in the target timezone.
+            rows = [
+                ("2024-01-01T23:30:00-01:00", "caldav", "cal", "Dentist appointment"),
+                ("2024-01-02T01:00:00+00:00", "icalendar", "a.ics", "Dentist appointment"),
+            ]
+            self.assertEqual(
+                [deduplicator.is_duplicate(_key(row), row) for row in rows], [False, True]
+            )
+        finally:
+            set_target_tz(target_tz)
+
+    def test_expire(self):
+        deduplicator = FuzzyDeduplicator()
+        day = 24 * 3600 * 1000000
+        for i in range(10):
+            row = (f"2024-01-{i + 1:02}", "txt", "diary.txt", "foo")
+            self.assertFalse(deduplicator.is_duplicate(i * day, row))
+        self.assertLessEqual(len(deduplicator._days), 3)
+
+    def test_write_csv(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "out.csv"
+            items = [
+                _item(12, "Pelíšky", "csfd"),
+                _item(21, "Pelisky", "trakt"),
+                _item(22, "Pelisky", "trakt"),
+                _item(21, "Pelisky", "trakt", day=2),
+            ]
+            duplicates = write_csv(
+                items, str(path), fuzzy=FuzzyDeduplicator(["csfd", "trakt"])
+            )
+            self.assertEqual(
+                path.read_text(),
+                "2024-01-01T12:00:00+01:00,csfd,foo,Pelíšky\n"
+                "2024-01-02T21:00:00+01:00,trakt,foo,Pelisky\n",
+            )
+        self.assertEqual(duplicates, {"trakt": 2})
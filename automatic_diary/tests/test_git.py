@@ -0,0 +1,86 @@
+import os
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from automatic_diary.metrics import ProviderMetrics, measured
+from automatic_diary.providers.git import main as git_main
+
+
+def _create_repo(path: Path, messages: list[str]):
+    path.mkdir(parents=True)
+    env = {
+        **os.environ,
+        "GIT_AUTHOR_NAME": "Jane",
+        "GIT_AUTHOR_EMAIL": "jane@example.com",
+        "GIT_COMMITTER_NAME": "Jane",
+        "GIT_COMMITTER_EMAIL": "jane@example.com",
+    }
+    subprocess.run(["git", "init", "-q"], cwd=path, check=True)
+    for i, message in enumerate(messages):
+        env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = f"2020-01-0{i + 1}T12:00:00+01:00"
+        subprocess.run(
+            ["git", "commit", "-q", "--allow-empty", "-m", message], cwd=path, env=env, check=True
+        )
+
+
+class TestGit(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir_path = Path(self.tmp_dir.name)
+        for i in range(6):
+            _create_repo(self.dir_path / "repos" / f"repo{i}", [f"First {i}", f"Second {i}"])
+        (self.dir_path / "repos" / "broken" / ".git").mkdir(parents=True)
+        self.config = {
+            "base_path": str(self.dir_path / "repos"),
+            "author": "Jane",
+            "cache_dir": str(self.dir_path / "cache"),
+            "concurrency": 2,
+        }
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_main(self):
+        metrics = ProviderMetrics("git", "abc")
+        items = list(measured(metrics, lambda: git_main.main(self.config, False)))
+        self.assertEqual(
+            sorted((item.subprovider, item.text) for item in items),
+            sorted((f"repo{i}", f"{nth} {i}") for i in range(6) for nth in ("First", "Second")),
+        )
+        self.assertEqual(str(items[0].datetime_), "2020-01-02 12:00:00+01:00")
+        # rev-parse of each repository, git log of the valid ones.
+        self.assertEqual(metrics.subprocesses, 13)
+        self.assertEqual(metrics.cache_misses, 6)
+
+        metrics = ProviderMetrics("git", "abc")
+        items = list(measured(metrics, lambda: git_main.main(self.config, False)))
+        self.assertEqual(len(items), 12)
+        self.assertEqual(metrics.cache_hits, 6)
+
+    def test_slow_repo(self):
+        call_git_log = git_main._call_git_log
+        others_read = threading.Event()
+
+        def slow_call_git_log(repo_path: str, *args) -> str:
+            if repo_path.endswith("repo0"):
+                raise subprocess.TimeoutExpired("git log", 1)
+            if repo_path.endswith("repo1"):
+                # Block until the items of all other repos have been yielded; the timeout only
+                # keeps the test from hanging when they aren't.
+                others_read.wait(timeout=10)
+            return call_git_log(repo_path, *args)
+
+        others = {f"repo{i}" for i in range(2, 6)}
+        subproviders = []
+        with patch.object(git_main, "_call_git_log", slow_call_git_log):
+            for item in git_main.main({**self.config, "cache_dir": None}, False):
+                subproviders.append(item.subprovider)
+                if others <= set(subproviders):
+                    others_read.set()
+        self.assertNotIn("repo0", subproviders)
+        self.assertEqual(len(subproviders), 10)
+        self.assertEqual(subproviders[-2:], ["repo1", "repo1"])
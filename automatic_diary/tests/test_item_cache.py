@@ -0,0 +1,85 @@
+import datetime
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from automatic_diary.cli import call_provider_batches
+from automatic_diary.item_cache import ItemCache
+from automatic_diary.metrics import RunMetrics
+from automatic_diary.model import DateRange, localize
+from automatic_diary.providers.todotxt import main as todotxt
+
+
+class TestItemCache(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "done.txt"
+        self.path.write_text(
+            "x 2019-01-25 2019-01-20 Opravit kolo\nx 2019-01-26 2019-01-20 Koupit mléko\n"
+        )
+        self.configs = [("todotxt", {"path": str(self.path)})]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _run(
+        self, item_cache: ItemCache, date_range: DateRange = DateRange()
+    ) -> tuple[list, RunMetrics]:
+        run_metrics = RunMetrics()
+        rows = [
+            item.astuple()
+            for batch in call_provider_batches(
+                self.configs,
+                False,
+                date_range=date_range,
+                run_metrics=run_metrics,
+                item_cache=item_cache,
+            )
+            for item in batch
+        ]
+        return rows, run_metrics
+
+    def test_item_cache(self):
+        item_cache = ItemCache(str(Path(self.tmp_dir.name) / "cache"))
+        rows, run_metrics = self._run(item_cache)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(run_metrics.providers[0].cache_misses, 1)
+
+        with patch.object(todotxt, "main_batches", side_effect=AssertionError):
+            cached_rows, run_metrics = self._run(item_cache)
+        self.assertEqual(cached_rows, rows)
+        self.assertEqual(run_metrics.providers[0].cache_hits, 1)
+        self.assertEqual(run_metrics.providers[0].errors, 0)
+
+        with self.path.open("a") as f:
+            f.write("x 2019-01-27 2019-01-20 Uklidit\n")
+        rows, run_metrics = self._run(item_cache)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(run_metrics.providers[0].cache_misses, 1)
+
+    def test_date_range(self):
+        item_cache = ItemCache(str(Path(self.tmp_dir.name) / "cache"))
+        since = localize(datetime.datetime(2019, 1, 26))
+        rows, run_metrics = self._run(item_cache, DateRange(since=since))
+        self.assertEqual([row[3] for row in rows], ["Koupit mléko"])
+        self.assertEqual(run_metrics.providers[0].cache_misses, 1)
+
+        # A run with another date range, like the next --update run, reads the cache too.
+        with patch.object(todotxt, "main_batches", side_effect=AssertionError):
+            rows, run_metrics = self._run(item_cache, DateRange(until=since))
+            self.assertEqual([row[3] for row in rows], ["Opravit kolo"])
+            rows, run_metrics = self._run(item_cache)
+            self.assertEqual(len(rows), 2)
+        self.assertEqual(run_metrics.providers[0].cache_hits, 1)
+
+    def test_hash_contents(self):
+        item_cache = ItemCache(str(Path(self.tmp_dir.name) / "cache"), hash_contents=True)
+        self._run(item_cache)
+        st = self.path.stat()
+        self.path.write_text(self.path.read_text().replace("kolo", "auto"))
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        rows, run_metrics = self._run(item_cache)
+        self.assertEqual(rows[0][3], "Opravit auto")
+        self.assertEqual(run_metrics.providers[0].cache_misses, 1)
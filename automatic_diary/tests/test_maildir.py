@@ -0,0 +1,48 @@
+import datetime
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from automatic_diary.model import DateRange
+from automatic_diary.providers.maildir.main import _is_delivered_before_range, main
+
+DATE_RANGE = DateRange(
+    since=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+    until=datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc),
+)
+
+
+def _write_message(path: Path, date: str, subject: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"From: Jane <jane@example.com>\nDate: {date}\nSubject: {subject}\n\nHi\n")
+
+
+class TestMaildir(TestCase):
+    def test_is_delivered_before_range(self):
+        # 2023-12-01
+        self.assertTrue(_is_delivered_before_range("cur/1701388800.M1P2.host:2,S", DATE_RANGE))
+        # 2023-12-31 12:00, possibly sent on 2024-01-01
+        self.assertFalse(_is_delivered_before_range("cur/1704024000.M1P2.host:2,S", DATE_RANGE))
+        # 2024-01-15
+        self.assertFalse(_is_delivered_before_range("cur/1705276800.M1P2.host:2,S", DATE_RANGE))
+        # 2024-03-01, possibly an older message imported later
+        self.assertFalse(_is_delivered_before_range("cur/1709251200.M1P2.host:2,S", DATE_RANGE))
+        self.assertFalse(_is_delivered_before_range("cur/unknown-name", DATE_RANGE))
+
+    def test_main_date_range(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cur = Path(tmp_dir) / "cur"
+            # Delivered before the range.
+            _write_message(cur / "1701388800.M1P1.host:2,S", "Fri, 1 Dec 2023 10:00 +0000", "Old")
+            # Re-synced on 2024-03-01, sent within the range.
+            _write_message(
+                cur / "1709251200.M1P2.host:2,S", "Mon, 15 Jan 2024 10:00 +0000", "Imported"
+            )
+            # Delivered and sent after the range.
+            _write_message(cur / "1709251200.M1P3.host:2,S", "Fri, 1 Mar 2024 10:00 +0000", "New")
+            config = {
+                "received_pathname": str(cur / "*"),
+                "sent_pathname": str(Path(tmp_dir) / "sent" / "*"),
+            }
+            items = list(main(config, False, date_range=DATE_RANGE))
+        self.assertEqual([item.text for item in items], ["From Jane: Imported"])
@@ -0,0 +1,38 @@
+import datetime
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from automatic_diary.cli import main, write_csv
+from automatic_diary.model import Item
+from automatic_diary.sinks import read_rows
+
+
+def _item(day: int, text: str, provider: str) -> Item:
+    return Item.normalized(
+        datetime_=datetime.datetime(2024, 1, day, 12),
+        text=text,
+        provider=provider,
+        subprovider="foo",
+    )
+
+
+class TestMerge(TestCase):
+    def test_merge(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            git_path = str(Path(tmp_dir) / "git.csv")
+            maildir_path = str(Path(tmp_dir) / "maildir.jsonl.gz")
+            output_path = str(Path(tmp_dir) / "out.csv")
+            write_csv([_item(1, "a", "git"), _item(3, "c", "git")], git_path)
+            write_csv(
+                [_item(2, "b", "maildir"), _item(3, "c", "git"), _item(4, "d", "maildir")],
+                maildir_path,
+            )
+            argv = ["automatic-diary", "merge", output_path, git_path, maildir_path]
+            with patch("sys.argv", argv):
+                main()
+            self.assertEqual(
+                [(row[1], row[3]) for row in read_rows(output_path)],
+                [("git", "a"), ("maildir", "b"), ("git", "c"), ("maildir", "d")],
+            )
@@ -0,0 +1,60 @@
+import contextvars
+import threading
+from unittest import TestCase
+
+from automatic_diary.metrics import (
+    ProviderMetrics, RunMetrics, count_bytes_read, count_cache_hit, count_subprocess,
+    current_metrics, measured,
+)
+
+
+class TestMetrics(TestCase):
+    def test_measured(self):
+        def items():
+            count_cache_hit()
+            for i in range(3):
+                count_bytes_read(10)
+                yield i
+
+        metrics = ProviderMetrics("txt", "abc")
+        self.assertEqual(list(measured(metrics, items)), [0, 1, 2])
+        self.assertEqual(metrics.items, 3)
+        self.assertEqual(metrics.bytes_read, 30)
+        self.assertEqual(metrics.cache_hits, 1)
+        self.assertGreater(metrics.wall_time, 0)
+
+    def test_count_outside_provider(self):
+        metrics = ProviderMetrics("txt", "abc")
+        list(measured(metrics, lambda: [1]))
+        count_bytes_read(10)
+        self.assertIsNone(current_metrics.get())
+        self.assertEqual(metrics.bytes_read, 0)
+
+    def test_count_in_threads(self):
+        def items():
+            threads = [
+                threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(lambda: [count_subprocess() for _ in range(1000)],),
+                )
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            yield 1
+
+        metrics = ProviderMetrics("git", "abc")
+        list(measured(metrics, items))
+        self.assertEqual(metrics.subprocesses, 8000)
+
+    def test_to_prometheus(self):
+        run_metrics = RunMetrics()
+        metrics = run_metrics.add("git", "abc")
+        metrics.items = 5
+        run_metrics.finish()
+        self.assertIn(
+            'automatic_diary_provider_items{provider="git",config="abc"} 5\n',
+            run_metrics.to_prometheus(),
+        )
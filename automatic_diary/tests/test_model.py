@@ -0,0 +1,111 @@
+import dataclasses
+import datetime
+from unittest import TestCase
+
+from automatic_diary.model import (
+    DateRange, Item, default_tz, from_timestamp_key, set_target_tz, target_tz, timestamp_key,
+)
+
+
+class TestModel(TestCase):
+    def test_timestamp_key(self):
+        datetime_ = datetime.datetime(2024, 9, 24, 23, 11, 53, 589437, tzinfo=default_tz)
+        key = timestamp_key(datetime_)
+        self.assertEqual(key, 1727212313589437)
+        self.assertEqual(from_timestamp_key(key), datetime_)
+
+    def test_date_range(self):
+        date_range = DateRange(
+            since=datetime.datetime(2024, 1, 1, tzinfo=default_tz),
+            until=datetime.datetime(2025, 1, 1, tzinfo=default_tz),
+        )
+        self.assertTrue(date_range.bounded)
+        self.assertIn(datetime.datetime(2024, 1, 1), date_range)
+        self.assertIn(datetime.datetime(2024, 12, 31, 23, 59), date_range)
+        self.assertNotIn(datetime.datetime(2025, 1, 1), date_range)
+        self.assertNotIn(
+            datetime.datetime(2023, 12, 31, 22, 30, tzinfo=datetime.timezone.utc), date_range
+        )
+        self.assertTrue(date_range.is_before(datetime.datetime(2023, 12, 31)))
+        self.assertTrue(date_range.is_after(datetime.datetime(2025, 1, 2)))
+
+    def test_date_range_unbounded(self):
+        date_range = DateRange()
+        self.assertFalse(date_range.bounded)
+        self.assertIn(datetime.datetime(1970, 1, 1), date_range)
+
+    def test_date_range_intersection(self):
+        a = DateRange(since=datetime.datetime(2024, 1, 1, tzinfo=default_tz))
+        b = DateRange(
+            since=datetime.datetime(2024, 6, 1, tzinfo=default_tz),
+            until=datetime.datetime(2025, 1, 1, tzinfo=default_tz),
+        )
+        self.assertEqual(a.intersection(b), b)
+        self.assertEqual(a.intersection(DateRange()), a)
+
+    def test_item(self):
+        item = Item.normalized(
+            datetime_=datetime.datetime(2024, 9, 24, 23, 11),
+            text="  Initial\n commit ",
+            provider="".join(["g", "it"]),
+            subprovider="my-project",
+        )
+        self.assertFalse(hasattr(item, "__dict__"))
+        self.assertIs(item.provider, "git")
+        self.assertEqual(item.key, timestamp_key(item.datetime_))
+        self.assertEqual(
+            item.astuple(),
+            ("2024-09-24T23:11:00+02:00", "git", "my-project", "Initial commit"),
+        )
+        self.assertIs(item.clean_text, item.clean_text)
+
+    def test_item_replace(self):
+        item = Item.normalized(
+            datetime_=datetime.datetime(2024, 9, 24),
+            text="foo",
+            provider="txt",
+            subprovider="diary.txt",
+            all_day=True,
+        )
+        self.assertEqual(item.clean_text, "foo")
+        replaced = dataclasses.replace(item, text="bar")
+        self.assertEqual(replaced.clean_text, "bar")
+        self.assertNotEqual(item, replaced)
+        self.assertEqual(replaced.formatted_datetime, "2024-09-24")
+
+    def test_item_order(self):
+        first = Item.normalized(datetime.datetime(2024, 1, 1), "b", "txt", "diary.txt")
+        second = Item.normalized(datetime.datetime(2024, 1, 2), "a", "txt", "diary.txt")
+        self.assertLess(first, second)
+        self.assertEqual(sorted([second, first], key=lambda item: item.key), [first, second])
+
+    def test_item_date(self):
+        set_target_tz(datetime.timezone(datetime.timedelta(hours=-5)))
+        try:
+            item = Item(
+                datetime_=datetime.datetime(2024, 3, 2, 3, 0, tzinfo=datetime.timezone.utc),
+                text="foo",
+                provider="foo",
+                subprovider="bar",
+            )
+            self.assertEqual(item.date, datetime.date(2024, 3, 1))
+            all_day_item = Item(
+                datetime_=datetime.datetime(2024, 3, 2, tzinfo=default_tz),
+                text="foo",
+                provider="foo",
+                subprovider="bar",
+                all_day=True,
+            )
+            self.assertEqual(all_day_item.date, datetime.date(2024, 3, 2))
+            # All-day items keep their own date, unlike `datetime_.astimezone().date()`, which
+            # would be the previous day west of their timezone.
+            utc_all_day_item = Item(
+                datetime_=datetime.datetime(2024, 3, 2, tzinfo=datetime.timezone.utc),
+                text="foo",
+                provider="icalendar",
+                subprovider="bar",
+                all_day=True,
+            )
+            self.assertEqual(utc_all_day_item.date, datetime.date(2024, 3, 2))
+        finally:
+            set_target_tz(target_tz)
@@ -0,0 +1,45 @@
+import datetime
+from unittest import TestCase
+
+from automatic_diary.batches import batched
+from automatic_diary.model import Item
+from automatic_diary.obfuscate import obfuscate, obfuscate_batches, obfuscate_many
+
+
+class TestObfuscate(TestCase):
+    def test_obfuscate_is_deterministic(self):
+        self.assertEqual(obfuscate("Ve škole, 10"), obfuscate("Ve škole, 10"))
+        self.assertEqual(obfuscate("Ve škole", seed="a"), obfuscate("Ve škole", seed="a"))
+        self.assertNotEqual(obfuscate("Ve škole", seed="a"), obfuscate("Ve škole", seed="b"))
+
+    def test_obfuscate_random_seed(self):
+        self.assertNotEqual(obfuscate("Ve škole"), obfuscate("Ve škole", seed=""))
+
+    def test_obfuscate_maps_words(self):
+        result = obfuscate("foo bar foo").split(" ")
+        self.assertEqual(result[0], result[2])
+        self.assertNotEqual(result[0], result[1])
+
+    def test_obfuscate_keeps_other_characters(self):
+        result = obfuscate("a_b (ü) 日本 !?")
+        self.assertEqual(result[1], "_")
+        self.assertEqual(result[-7:], ") 日本 !?")
+
+    def test_obfuscate_many(self):
+        texts = ["Foo bar", "", "Baz 1", "with\0separator"]
+        self.assertEqual(obfuscate_many(texts), [obfuscate(text) for text in texts])
+
+    def test_obfuscate_batches(self):
+        items = [
+            Item.normalized(
+                datetime_=datetime.datetime(2024, 1, 1),
+                text=f"Item {i}",
+                provider="txt",
+                subprovider="diary.txt",
+            )
+            for i in range(2500)
+        ]
+        result = [item for batch in obfuscate_batches(batched(items)) for item in batch]
+        self.assertEqual(len(result), 2500)
+        self.assertEqual(result[1234].text, obfuscate("Item 1234"))
+        self.assertEqual(result[1234].datetime_, items[1234].datetime_)
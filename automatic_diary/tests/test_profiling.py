@@ -0,0 +1,50 @@
+import pstats
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from automatic_diary.cli import call_providers
+from automatic_diary.config import config_id
+from automatic_diary.profiling import Profiler
+from automatic_diary.tests.test_cli import _fake_import_module
+
+
+def _allocate() -> list[bytes]:
+    return [bytes(1024) for _ in range(1024)]
+
+
+class TestProfiling(TestCase):
+    def test_section(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiler = Profiler(tmp_dir)
+            with profiler.section("read items"):
+                data = _allocate()
+            profiler.close()
+            del data
+            section = profiler.sections["read items"]
+            self.assertGreater(section.peak_memory, 1024 * 1024)
+            stats = pstats.Stats(str(Path(tmp_dir) / "read_items.prof"))
+            self.assertIn("_allocate", {func[2] for func in stats.stats})  # type: ignore
+            summary = (Path(tmp_dir) / "summary.txt").read_text()
+            self.assertIn("read_items", summary)
+            self.assertIn("_allocate", summary)
+
+    @patch("automatic_diary.cli.importlib.import_module", _fake_import_module)
+    def test_call_providers(self):
+        configs = [("first", {"name": "a"}), ("second", {"name": "b"})]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiler = Profiler(tmp_dir)
+            items = list(call_providers(configs, no_cache=False, jobs=2, profiler=profiler))
+            profiler.close()
+            self.assertEqual(len(items), 6)
+            self.assertEqual(
+                sorted(path.name for path in Path(tmp_dir).iterdir()),
+                sorted(
+                    [
+                        f"{provider}-{config_id(provider, config)}.prof"
+                        for provider, config in configs
+                    ]
+                    + ["summary.txt"]
+                ),
+            )
@@ -0,0 +1,100 @@
+import contextlib
+import datetime
+import gzip
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import pytest
+
+from automatic_diary.cli import write_csv
+from automatic_diary.model import Item
+from automatic_diary.sinks import CSVSink, TextSink, open_sink, read_rows
+
+ROWS = [
+    ("2019-01-02", "todotxt", "done.txt", "Opravit kolo"),
+    ("2024-09-24T23:11:53.589437+02:00", "git", "my-project", 'Fix "quotes", commas\nand lines'),
+]
+
+
+def _item(day: int, text: str) -> Item:
+    return Item.normalized(
+        datetime_=datetime.datetime(2024, 1, day),
+        text=text,
+        provider="txt",
+        subprovider="diary.txt",
+        all_day=True,
+    )
+
+
+class TestSinks(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        for name in ("out.csv", "out.csv.gz", "out.jsonl", "out.jsonl.gz"):
+            with self.subTest(name=name):
+                path = str(self.dir / name)
+                with open_sink(path) as sink:
+                    for row in ROWS:
+                        sink.write(0, row)
+                self.assertEqual(list(map(tuple, read_rows(path))), ROWS)
+                self.assertEqual(list(self.dir.glob("*.tmp")), [])
+
+    def test_formats(self):
+        path = self.dir / "out.jsonl.gz"
+        with open_sink(str(path)) as sink:
+            sink.write(0, ROWS[0])
+        self.assertEqual(
+            json.loads(gzip.decompress(path.read_bytes())),
+            {
+                "datetime": "2019-01-02",
+                "provider": "todotxt",
+                "subprovider": "done.txt",
+                "text": "Opravit kolo",
+            },
+        )
+
+    def test_failure_keeps_previous_file(self):
+        path = self.dir / "out.csv"
+        path.write_text("previous\n")
+
+        def write_and_fail():
+            with open_sink(str(path)) as sink:
+                sink.write(0, ROWS[0])
+                raise ValueError("Failed")
+
+        with pytest.raises(ValueError, match="Failed"):
+            write_and_fail()
+        self.assertEqual(path.read_text(), "previous\n")
+        self.assertEqual(list(self.dir.glob("*.tmp")), [])
+
+    def test_incomplete_sink(self):
+        class IncompleteSink(TextSink):
+            pass
+
+        path = self.dir / "out.csv"
+        with pytest.raises(TypeError, match="_write_batch"):
+            IncompleteSink(str(path))
+        self.assertEqual(list(self.dir.iterdir()), [])
+
+    def test_stdout(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            with CSVSink("-") as sink:
+                sink.write(0, ROWS[0])
+        self.assertEqual(stdout.getvalue(), "2019-01-02,todotxt,done.txt,Opravit kolo\n")
+
+    def test_write_csv_extra_paths(self):
+        path = str(self.dir / "out.csv.gz")
+        extra_path = str(self.dir / "out.jsonl")
+        write_csv([_item(2, "b"), _item(1, "a")], path, extra_paths=[extra_path])
+        write_csv([_item(3, "c")], path, merge_existing=True)
+        self.assertEqual([row[3] for row in read_rows(path)], ["a", "b", "c"])
+        self.assertEqual([row[3] for row in read_rows(extra_path)], ["a", "b"])
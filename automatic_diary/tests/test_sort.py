@@ -0,0 +1,24 @@
+import random
+from unittest import TestCase
+
+from automatic_diary.sort import external_sort
+
+
+class TestSort(TestCase):
+    def test_external_sort_in_memory(self):
+        records = [(3, 0, "c"), (1, 1, "a"), (2, 2, "b")]
+        self.assertEqual(list(external_sort(records)), sorted(records))
+
+    def test_external_sort_spills_runs(self):
+        rng = random.Random(0)
+        records = [(rng.randrange(100), seq, str(seq)) for seq in range(1000)]
+        result = list(external_sort(iter(records), buffer_size=64))
+        self.assertEqual(result, sorted(records))
+
+    def test_external_sort_is_stable(self):
+        records = [(1, seq, text) for seq, text in enumerate(["b", "a", "c"])]
+        result = list(external_sort(records, buffer_size=2))
+        self.assertEqual([text for _, _, text in result], ["b", "a", "c"])
+
+    def test_external_sort_empty(self):
+        self.assertEqual(list(external_sort([], buffer_size=2)), [])
@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+# Dependencies which must be imported only by the providers or features which use them.
+HEAVY_MODULES = {
+    "asyncio",
+    "bs4",
+    "caldav",
+    "concurrent.futures",
+    "dateparser",
+    "dateutil.rrule",
+    "gzip",
+    "ics",
+    "jinja2",
+    "more_itertools",
+    "orgparse",
+    "pystache",
+    "requests",
+    "sqlite3",
+    "trakt",
+}
+
+# Limit of the cumulative import time of a module, in microseconds. The modules tested take about
+# 20-50 ms, the limit leaves room for slower or busy machines.
+IMPORT_TIME_BUDGET = 100000
+
+# Number of imports measured; the fastest one is compared with the budget, as the others may be
+# slowed down by writing bytecode or by other processes.
+IMPORT_RUNS = 3
+
+
+def import_times(module: str) -> dict[str, int]:
+    """Return the cumulative import times of all modules imported by importing `module`."""
+    env = {name: value for name, value in os.environ.items() if name != "PYTHONDONTWRITEBYTECODE"}
+    times: dict[str, int] = {}
+    for _ in range(IMPORT_RUNS):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            check=True,
+            env=env,
+            text=True,
+        )
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line.split("|")
+            name = name.strip()
+            times[name] = min(times.get(name, int(cumulative)), int(cumulative))
+    return times
+
+
+class TestStartup(TestCase):
+    def assert_startup(self, module: str):
+        times = import_times(module)
+        heavy_modules = {name for name in times if name.split(".")[0] in HEAVY_MODULES}
+        heavy_modules |= HEAVY_MODULES & times.keys()
+        self.assertEqual(heavy_modules, set())
+        self.assertLess(times[module], IMPORT_TIME_BUDGET)
+
+    def test_cli(self):
+        self.assert_startup("automatic_diary.cli")
+
+    def test_visualize(self):
+        self.assert_startup("automatic_diary.visualize")
+
+    def test_todotxt(self):
+        self.assert_startup("automatic_diary.providers.todotxt.main")
+
+    def test_git(self):
+        times = import_times("automatic_diary.providers.git.main")
+        self.assertNotIn("asyncio", times)
+        self.assertLess(times["automatic_diary.providers.git.main"], IMPORT_TIME_BUDGET)
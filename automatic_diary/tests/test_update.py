@@ -0,0 +1,82 @@
+import datetime
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import pytest
+
+from automatic_diary.cli import write_csv
+from automatic_diary.model import Item, timestamp_key
+from automatic_diary.update import Watermarks, read_csv_records
+
+
+def _item(day: int, text: str) -> Item:
+    return Item.normalized(
+        datetime_=datetime.datetime(2024, 1, day),
+        text=text,
+        provider="txt",
+        subprovider="diary.txt",
+        all_day=True,
+    )
+
+
+class TestUpdate(TestCase):
+    def test_track(self):
+        now_key = timestamp_key(datetime.datetime(2024, 1, 3).astimezone())
+        watermark = timestamp_key(_item(2, "").datetime_)
+        watermarks = Watermarks(now_key, {"abc": {"provider": "txt", "timestamp": watermark}})
+        items = [_item(1, "old"), _item(2, "same day"), _item(3, "new"), _item(5, "future")]
+        result = list(watermarks.track("txt", "abc", items))
+        self.assertEqual([item.text for item in result], ["same day", "new", "future"])
+        self.assertEqual(watermarks.get("abc"), timestamp_key(_item(3, "").datetime_))
+
+    def test_track_failed_provider(self):
+        watermarks = Watermarks(now_key=2**62)
+
+        def failing_items():
+            yield _item(1, "foo")
+            raise OSError("Provider failed")
+
+        with pytest.raises(OSError, match="Provider failed"):
+            list(watermarks.track("txt", "abc", failing_items()))
+        self.assertIsNone(watermarks.get("abc"))
+
+    def test_write_csv_merge_existing(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = str(Path(tmp_dir) / "out.csv")
+            write_csv([_item(3, "c"), _item(1, "a")], path)
+            write_csv([_item(2, "b"), _item(3, "c")], path, merge_existing=True)
+            self.assertEqual(
+                Path(path).read_text(),
+                "2024-01-01,txt,diary.txt,a\n"
+                "2024-01-02,txt,diary.txt,b\n"
+                "2024-01-03,txt,diary.txt,c\n",
+            )
+            keys = [record[0] for record in read_csv_records(path)]
+            self.assertEqual(keys, sorted(keys))
+
+    def test_write_csv_merge_existing_all_day_utc(self):
+        # All-day events of icalendar and caldav are at midnight UTC, not in the default timezone.
+        item = Item(
+            datetime_=datetime.datetime(2020, 1, 5, tzinfo=datetime.timezone.utc),
+            text="Allday",
+            provider="icalendar",
+            subprovider="a.ics",
+            all_day=True,
+        )
+        other_item = Item(
+            datetime_=datetime.datetime(2020, 1, 4, 23, 30, tzinfo=datetime.timezone.utc),
+            text="Late",
+            provider="icalendar",
+            subprovider="a.ics",
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = str(Path(tmp_dir) / "out.csv")
+            write_csv([item, other_item], path)
+            write_csv([item, other_item], path, merge_existing=True)
+            self.assertEqual(
+                Path(path).read_text(),
+                # Rows of all-day items are sorted at midnight in the default timezone.
+                "2020-01-05,icalendar,a.ics,Allday\n"
+                "2020-01-04T23:30:00+00:00,icalendar,a.ics,Late\n",
+            )
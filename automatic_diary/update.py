@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+from typing import Iterable, Iterator, Optional
+
+from automatic_diary.model import DateRange, Item, from_timestamp_key, row_key
+from automatic_diary.sinks import read_rows
+
+logger = logging.getLogger(__name__)
+
+
+def watermarks_path(output_path: str) -> str:
+    return f"{output_path}.watermarks.json"
+
+
+class Watermarks:
+    """High-water marks of the items that have already been written, by provider config.
+
+    A watermark is the timestamp key of the newest written item of a config. Items older than the
+    watermark are skipped on the next run. Items newer than `now_key` are not written at all, so
+    they don't move the watermark either.
+    """
+
+    def __init__(self, now_key: int, watermarks: Optional[dict[str, dict]] = None):
+        self.now_key = now_key
+        self.watermarks: dict[str, dict] = watermarks or {}
+
+    @classmethod
+    def load(cls, path: str, now_key: int) -> "Watermarks":
+        logger.info("Reading watermarks %s", path)
+        with open(path) as f:
+            return cls(now_key, json.load(f))
+
+    def save(self, path: str):
+        logger.info("Writing watermarks %s", path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.watermarks, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def get(self, config_id: str) -> Optional[int]:
+        watermark = self.watermarks.get(config_id)
+        return watermark["timestamp"] if watermark else None
+
+    def date_range(self, config_id: str) -> DateRange:
+        watermark = self.get(config_id)
+        if watermark is None:
+            return DateRange()
+        return DateRange(since=from_timestamp_key(watermark))
+
+    def track(self, provider: str, config_id: str, items: Iterable[Item]) -> Iterator[Item]:
+        """Yield only the items not older than the watermark of the config and update it.
+
+        The watermark is updated only once all items have been read, so that a provider that fails
+        halfway doesn't skip its unread items on the next run.
+        """
+        for batch in self.track_batches(provider, config_id, ([item] for item in items)):
+            yield from batch
+
+    def track_batches(
+        self, provider: str, config_id: str, batches: Iterable[list[Item]]
+    ) -> Iterator[list[Item]]:
+        """Like `track`, but for batches of items."""
+        watermark = self.get(config_id)
+        newest = watermark
+        now_key = self.now_key
+        for batch in batches:
+            if watermark is not None:
+                batch = [item for item in batch if item.key >= watermark]
+            for item in batch:
+                key = item.key
+                if key <= now_key and (newest is None or key > newest):
+                    newest = key
+            if batch:
+                yield batch
+        if newest is not None:
+            self.watermarks[config_id] = {"provider": provider, "timestamp": newest}
+
+
+def read_csv_records(path: str) -> Iterator[tuple[int, int, str, str, str, str]]:
+    """Read rows of a file written by `write_csv` as sortable records."""
+    for seq, (formatted_datetime, provider, subprovider, text) in enumerate(read_rows(path)):
+        yield (row_key(formatted_datetime), seq, formatted_datetime, provider, subprovider, text)
@@ -1,5 +1,5 @@
 import argparse
-import csv
+import contextlib
 import datetime
 import json
 import logging
@@ -9,13 +9,17 @@ from calendar import Calendar
 from collections import defaultdict
 from pathlib import Path
 from statistics import quantiles
-from typing import Iterable, Sequence, TypeAlias
+from typing import TYPE_CHECKING, Iterable, Sequence, TypeAlias
 
-from dateutil.rrule import DAILY, rrule
-from jinja2 import Environment, PackageLoader, Template, select_autoescape
-from more_itertools import chunked
+from automatic_diary.model import Item, get_tz, set_default_tz, set_target_tz
+from automatic_diary.sinks import read_rows
 
-from automatic_diary.model import Item
+# Heavy dependencies are imported only when they are used to keep the startup fast.
+if TYPE_CHECKING:
+    from jinja2 import Template
+
+    from automatic_diary.columnar import ColumnarReader
+    from automatic_diary.database import SQLiteReader
 
 logger = logging.getLogger(__name__)
 
@@ -67,8 +71,33 @@ DatesByYearWeek: TypeAlias = dict[int, list[list[datetime.date]]]
 ProviderStats: TypeAlias = dict[int, list[dict[str, int]]]
 
 
+def _find_tags(text: str, tags_dict: dict[str, str] | None) -> tuple[str, ...]:
+    if not tags_dict:
+        return ()
+    return tuple(tag for pattern, tag in tags_dict.items() if re.search(pattern, text))
+
+
+def group_items(items: Iterable[Item]) -> ItemsByYearMonthDay:
+    """Group items by year, month and day."""
+    items_by_year_month_day: ItemsByYearMonthDay = {}
+    last_date = None
+    day_items: list[Item] = []
+    for item in items:
+        date = item.date
+        # Items are usually sorted, so the list of the previous item is mostly the right one.
+        if date != last_date:
+            day_items = (
+                items_by_year_month_day.setdefault(date.year, {})
+                .setdefault(date.month, {})
+                .setdefault(date.day, [])
+            )
+            last_date = date
+        day_items.append(item)
+    return items_by_year_month_day
+
+
 def read_items(
-    rows: Iterable[list[str]], tags_dict: dict[str, str] | None = None
+    rows: Iterable[Sequence[str]], tags_dict: dict[str, str] | None = None
 ) -> ItemsByYearMonthDay:
     """Read passed CSV rows into a dict.
 
@@ -83,30 +112,39 @@ def read_items(
         }
     }
     """
-    items_by_year_month_day: ItemsByYearMonthDay = {}
-    for formatted_datetime, provider, subprovider, text in rows:
-        datetime_ = datetime.datetime.fromisoformat(formatted_datetime)
-        tags = []
-        if tags_dict:
-            for pattern, tag in tags_dict.items():
-                if re.search(pattern, text):
-                    tags.append(tag)
-        item = Item.normalized(
-            datetime_=datetime_,
+    return group_items(
+        Item.normalized(
+            datetime_=datetime.datetime.fromisoformat(formatted_datetime),
             text=text,
             provider=provider,
             subprovider=subprovider,
-            tags=tags,
+            all_day=len(formatted_datetime) == 10,
+            tags=_find_tags(text, tags_dict),
         )
-        date = item.date
-        if date.year not in items_by_year_month_day:
-            items_by_year_month_day[date.year] = {}
-        if date.month not in items_by_year_month_day[date.year]:
-            items_by_year_month_day[date.year][date.month] = {}
-        if date.day not in items_by_year_month_day[date.year][date.month]:
-            items_by_year_month_day[date.year][date.month][date.day] = []
-        items_by_year_month_day[date.year][date.month][date.day].append(item)
-    return items_by_year_month_day
+        for formatted_datetime, provider, subprovider, text in rows
+    )
+
+
+def read_columnar_items(
+    reader: "ColumnarReader | SQLiteReader", tags_dict: dict[str, str] | None = None
+) -> ItemsByYearMonthDay:
+    """Read a columnar file or a SQLite database into a dict like `read_items`.
+
+    No dates are parsed: the items are created from the stored timestamp keys and UTC offsets, and
+    grouped by day with the keys.
+    """
+    return group_items(
+        Item.from_key(
+            key,
+            utc_offset,
+            text,
+            provider,
+            subprovider,
+            all_day,
+            _find_tags(text, tags_dict),
+        )
+        for key, utc_offset, provider, subprovider, text, all_day in reader.iter_records()
+    )
 
 
 def gen_dates(items_by_year_month_day: ItemsByYearMonthDay) -> DatesByYearWeek:
@@ -139,20 +177,13 @@ def gen_dates(items_by_year_month_day: ItemsByYearMonthDay) -> DatesByYearWeek:
     }
     """
     calendar = Calendar()
-    return {
-        year: [
-            [datetime_.date() for datetime_ in week]
-            for week in chunked(
-                rrule(
-                    DAILY,
-                    dtstart=calendar.monthdatescalendar(year, 1)[0][0],
-                    until=calendar.monthdatescalendar(year, 12)[-1][-1],
-                ),
-                7,
-            )
-        ]
-        for year in items_by_year_month_day
-    }
+    dates_by_year_week = {}
+    for year in items_by_year_month_day:
+        start = calendar.monthdatescalendar(year, 1)[0][0]
+        end = calendar.monthdatescalendar(year, 12)[-1][-1]
+        dates = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+        dates_by_year_week[year] = [dates[i:i + 7] for i in range(0, len(dates), 7)]
+    return dates_by_year_week
 
 
 def deciles(data: Sequence[float]) -> list[float]:
@@ -288,8 +319,33 @@ def _has_deep(d: dict, *attrs: str) -> bool:
     return True
 
 
+def create_template() -> "Template":
+    from jinja2 import Environment, PackageLoader, select_autoescape
+
+    environment = Environment(
+        autoescape=select_autoescape(["html"]),
+        loader=PackageLoader("automatic_diary", "templates"),
+    )
+    environment.tests["hasdeep"] = _has_deep
+    environment.tests["regex"] = _is_regex
+    return environment.get_template("template.html")
+
+
+def _read_input(path: str, tags_dict: dict[str, str] | None) -> ItemsByYearMonthDay:
+    from automatic_diary.columnar import ColumnarReader, is_columnar
+    from automatic_diary.database import SQLiteReader, is_sqlite
+
+    if is_columnar(path):
+        with ColumnarReader(path) as columnar_reader:
+            return read_columnar_items(columnar_reader, tags_dict)
+    if is_sqlite(path):
+        with SQLiteReader(path) as sqlite_reader:
+            return read_columnar_items(sqlite_reader, tags_dict)
+    return read_items(read_rows(path), tags_dict)
+
+
 def _render_template(
-    template: Template,
+    template: "Template",
     path: Path,
     *,
     css_url: str | None,
@@ -316,7 +372,11 @@ def _render_template(
 def main() -> None:
     parser = argparse.ArgumentParser(description="Visualize Automatic Diary CSV")
     parser.add_argument(
-        "csv_file", type=argparse.FileType("r"), help="Input CSV file path"
+        "csv_file",
+        help=(
+            "Input CSV file path; gzip-compressed files, JSON Lines files (*.jsonl), and columnar "
+            "files and SQLite databases written with --columnar-output and --sqlite are detected"
+        ),
     )
     parser.add_argument("output_path", help="Output HTML file or directory path")
     parser.add_argument(
@@ -340,12 +400,29 @@ def main() -> None:
         help='Tags JSON file path. The file format is {"<regex>": "<tag>"}. '
         'A class "tag-<tag>" will be added to each item whose text matches <regex>.',
     )
+    parser.add_argument(
+        "-z",
+        "--timezone",
+        type=get_tz,
+        help="Timezone in which items are grouped into days (default: the system timezone)",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help=(
+            "Profile each phase with cProfile and tracemalloc and write the profiles and a summary "
+            "of the top functions and peak memory to this directory"
+        ),
+    )
     parser.add_argument(
         "-v", "--verbose", action="store_true", help="Enable debugging output"
     )
     args = parser.parse_args()
     if args.verbose:
         logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(message)s")
+    if args.timezone:
+        set_default_tz(args.timezone)
+        set_target_tz(args.timezone)
     if args.highlight:
         print(
             "Option -i / --highlight is deprecated. Use a tags file with content "
@@ -356,30 +433,48 @@ def main() -> None:
         )
         sys.exit(1)
 
-    items_by_year_month_day: ItemsByYearMonthDay = {}
-    reader = csv.reader(args.csv_file)
     tags_dict = json.load(args.tags_file) if args.tags_file else None
-    items_by_year_month_day = read_items(reader, tags_dict)
-    dates_by_year_week = gen_dates(items_by_year_month_day)
-    provider_stats = calc_provider_stats(dates_by_year_week, items_by_year_month_day)
+    profiler = None
+    if args.profile:
+        from automatic_diary.profiling import Profiler
+
+        profiler = Profiler(args.profile)
+
+    def phase(name: str):
+        return profiler.section(name) if profiler else contextlib.nullcontext()
+
+    with phase("read_items"):
+        items_by_year_month_day = _read_input(args.csv_file, tags_dict)
+    with phase("gen_dates"):
+        dates_by_year_week = gen_dates(items_by_year_month_day)
+    with phase("calc_provider_stats"):
+        provider_stats = calc_provider_stats(dates_by_year_week, items_by_year_month_day)
     css_url = args.css_url
     today = datetime.date.today()
 
-    environment = Environment(
-        autoescape=select_autoescape(["html"]),
-        loader=PackageLoader("automatic_diary", "templates"),
-    )
-    environment.tests["hasdeep"] = _has_deep
-    environment.tests["regex"] = _is_regex
-    template = environment.get_template("template.html")
-
-    if args.all_years:
-        output_dir_path = Path(args.output_path)
-        output_dir_path.mkdir(parents=True, exist_ok=True)
-        for year in items_by_year_month_day:
+    with phase("render"):
+        template = create_template()
+
+        if args.all_years:
+            output_dir_path = Path(args.output_path)
+            output_dir_path.mkdir(parents=True, exist_ok=True)
+            for year in items_by_year_month_day:
+                _render_template(
+                    template,
+                    (output_dir_path / f"{year}.html"),
+                    css_url=css_url,
+                    dates_by_year_week=dates_by_year_week,
+                    items_by_year_month_day=items_by_year_month_day,
+                    provider_stats=provider_stats,
+                    today=today,
+                    year=year,
+                )
+        else:
+            output_file_path = Path(args.output_path)
+            year = max(items_by_year_month_day.keys())
             _render_template(
                 template,
-                (output_dir_path / f"{year}.html"),
+                output_file_path,
                 css_url=css_url,
                 dates_by_year_week=dates_by_year_week,
                 items_by_year_month_day=items_by_year_month_day,
@@ -387,19 +482,9 @@ def main() -> None:
                 today=today,
                 year=year,
             )
-    else:
-        output_file_path = Path(args.output_path)
-        year = max(items_by_year_month_day.keys())
-        _render_template(
-            template,
-            output_file_path,
-            css_url=css_url,
-            dates_by_year_week=dates_by_year_week,
-            items_by_year_month_day=items_by_year_month_day,
-            provider_stats=provider_stats,
-            today=today,
-            year=year,
-        )
+
+    if profiler:
+        profiler.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,270 @@
+"""Generators of large synthetic inputs for the providers.
+
+All sizes are multiplied by a scale factor, so that the same corpus can be generated small for a
+quick check or large enough to show the realistic behavior of the providers.
+"""
+
+import datetime
+import json
+import logging
+import os
+import random
+import subprocess
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Number of generated things at scale 1.
+SIZES = {
+    "git_repos": 50,
+    "git_commits_per_repo": 2000,
+    "maildir_messages": 500000,
+    "ics_events": 20000,
+    "txt_days": 20000,
+    "orgmode_days": 20000,
+    "orgmodelist_lines": 5000,
+    "csv_rows": 100000,
+    "todotxt_lines": 100000,
+    "twitter_tweets": 50000,
+    "facebook_statuses": 2000,
+    "csfd_pages": 200,
+    "items": 1000000,
+}
+
+CSFD_FILMS_PER_PAGE = 50
+START = datetime.datetime(2010, 1, 1, tzinfo=datetime.timezone.utc)
+END = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut "
+    "labore et dolore magna aliqua škola výlet divadlo kolo opravit nákup fix add remove update "
+    "refactor test release merge branch parser cache provider timeline calendar"
+).split()
+
+
+def size(name: str, scale: float) -> int:
+    return max(1, int(SIZES[name] * scale))
+
+
+def _sentence(rng: random.Random, min_words: int = 2, max_words: int = 10) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def _datetimes(rng: random.Random, n: int) -> list[datetime.datetime]:
+    """Return n sorted random datetimes between START and END."""
+    span = int((END - START).total_seconds())
+    seconds = sorted(rng.randrange(span) for _ in range(n))
+    return [START + datetime.timedelta(seconds=s) for s in seconds]
+
+
+def gen_git(path: Path, scale: float, rng: random.Random):
+    for repo_no in range(size("git_repos", scale)):
+        repo_path = path / f"repo-{repo_no:04d}"
+        repo_path.mkdir(parents=True)
+        subprocess.run(
+            ["git", "init", "-q", "--initial-branch=bench"], cwd=repo_path, check=True
+        )
+        commands = []
+        for datetime_ in _datetimes(rng, size("git_commits_per_repo", scale)):
+            message = _sentence(rng).encode()
+            timestamp = int(datetime_.timestamp())
+            commands.append(
+                b"commit refs/heads/bench\n"
+                b"author Jane Doe <jane@example.com> %d +0100\n"
+                b"committer Jane Doe <jane@example.com> %d +0100\n"
+                b"data %d\n%s\n" % (timestamp, timestamp, len(message), message)
+            )
+        subprocess.run(
+            ["git", "fast-import", "--quiet"],
+            cwd=repo_path,
+            input=b"".join(commands),
+            check=True,
+        )
+
+
+def gen_maildir(path: Path, scale: float, rng: random.Random):
+    n = size("maildir_messages", scale)
+    for folder, sent in (("Inbox", False), ("Sent", True)):
+        cur_path = path / folder / "cur"
+        cur_path.mkdir(parents=True)
+        for i, datetime_ in enumerate(_datetimes(rng, n // 2 or 1)):
+            from_, to = ("jane@example.com", "john@example.com")
+            if not sent:
+                from_, to = to, from_
+            message = (
+                f"From: {from_}\n"
+                f"To: {to}\n"
+                f"Subject: {_sentence(rng)}\n"
+                f"Date: {datetime_.strftime('%a, %d %b %Y %H:%M:%S +0000')}\n"
+                f"Message-ID: <{i}.{folder}@example.com>\n"
+                "\n"
+                f"{_sentence(rng, 20, 100)}\n"
+            )
+            name = f"{int(datetime_.timestamp())}.M{i}P1.bench:2,S"
+            (cur_path / name).write_text(message)
+
+
+def gen_icalendar(path: Path, scale: float, rng: random.Random):
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Automatic Diary//Benchmark//EN"]
+    for i, datetime_ in enumerate(_datetimes(rng, size("ics_events", scale))):
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{i}@example.com",
+            f"DTSTAMP:{datetime_.strftime('%Y%m%dT%H%M%SZ')}",
+            f"DTSTART:{datetime_.strftime('%Y%m%dT%H%M%SZ')}",
+            f"DTEND:{(datetime_ + datetime.timedelta(hours=1)).strftime('%Y%m%dT%H%M%SZ')}",
+            f"SUMMARY:{_sentence(rng)}",
+            f"LOCATION:{_sentence(rng, 1, 3)}",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\r\n".join(lines) + "\r\n")
+
+
+def _dates(n: int) -> list[datetime.date]:
+    """Return n consecutive dates ending at END."""
+    return [END.date() - datetime.timedelta(days=n - i) for i in range(n)]
+
+
+def gen_txt(path: Path, scale: float, rng: random.Random):
+    with path.open("w") as f:
+        for date in _dates(size("txt_days", scale)):
+            f.write(f"{date.isoformat()}\n")
+            for _ in range(rng.randint(1, 4)):
+                f.write(f"    {_sentence(rng)}\n")
+                for _ in range(rng.randint(0, 2)):
+                    f.write(f"        {_sentence(rng)}\n")
+
+
+def gen_orgmode(path: Path, scale: float, rng: random.Random):
+    with path.open("w") as f:
+        for date in _dates(size("orgmode_days", scale)):
+            f.write(f"* <{date.strftime('%Y-%m-%d %a')}>\n\n")
+            for _ in range(rng.randint(1, 3)):
+                f.write(f"{_sentence(rng)}\n{_sentence(rng)}\n\n")
+
+
+def gen_orgmodelist(path: Path, scale: float, rng: random.Random):
+    with path.open("w") as f:
+        f.write("#+STARTUP: showall\n\n")
+        for datetime_ in _datetimes(rng, size("orgmodelist_lines", scale)):
+            f.write(f"- {_sentence(rng)} <{datetime_.strftime('%Y-%m-%d %a %H:%M')}>\n")
+
+
+def gen_csv(path: Path, scale: float, rng: random.Random):
+    with path.open("w") as f:
+        f.write("date,track,time,note\n")
+        for datetime_ in _datetimes(rng, size("csv_rows", scale)):
+            f.write(
+                f"<{datetime_.strftime('%Y-%m-%d %a')}>,{rng.choice(WORDS)},"
+                f"{rng.randint(20, 90)}:{rng.randint(0, 59):02d},{rng.choice(['', 'rain'])}\n"
+            )
+
+
+def gen_todotxt(path: Path, scale: float, rng: random.Random):
+    with path.open("w") as f:
+        for datetime_ in _datetimes(rng, size("todotxt_lines", scale)):
+            created = datetime_ - datetime.timedelta(days=rng.randint(0, 30))
+            f.write(
+                f"x {datetime_.strftime('%Y-%m-%d')} {created.strftime('%Y-%m-%d')} "
+                f"{_sentence(rng)} +project t:{created.strftime('%Y-%m-%d')}\n"
+            )
+
+
+def gen_twitter(path: Path, scale: float, rng: random.Random):
+    tweets_path = path / "data" / "js" / "tweets"
+    tweets_path.mkdir(parents=True)
+    tweets_by_month: dict[str, list[dict]] = {}
+    for i, datetime_ in enumerate(_datetimes(rng, size("twitter_tweets", scale))):
+        tweets_by_month.setdefault(datetime_.strftime("%Y_%m"), []).append(
+            {
+                "id": i,
+                "created_at": datetime_.strftime("%Y-%m-%d %H:%M:%S +0000"),
+                "text": _sentence(rng, 5, 20),
+                "user": {"screen_name": "janedoe"},
+            }
+        )
+    for month, tweets in tweets_by_month.items():
+        with (tweets_path / f"{month}.js").open("w") as f:
+            f.write(f"Grailbird.data.tweets_{month} = \n")
+            json.dump(tweets, f)
+
+
+def gen_facebook(path: Path, scale: float, rng: random.Random):
+    with path.open("w") as f:
+        f.write("<html><body><div class=\"contents\">\n")
+        for datetime_ in _datetimes(rng, size("facebook_statuses", scale)):
+            formatted_datetime = datetime_.strftime("%A, %B %d, %Y at %I:%M%p UTC+00")
+            f.write(
+                '<p><span class="user">Jane Doe</span> updated her status '
+                f'<span class="meta">{formatted_datetime}</span>'
+                f'<span class="comment">{_sentence(rng, 3, 15)}</span></p>\n'
+            )
+        f.write("</div></body></html>\n")
+
+
+def gen_csfd(path: Path, scale: float, rng: random.Random):
+    """Generate rating pages served by a local HTTP server instead of csfd.cz."""
+    n_pages = size("csfd_pages", scale)
+    datetimes = _datetimes(rng, n_pages * CSFD_FILMS_PER_PAGE)[::-1]
+    paginator = "".join(
+        f'<a href="../strana-{page_no}/">{page_no}</a>' for page_no in range(1, n_pages + 1)
+    )
+    for page_no in range(1, n_pages + 1):
+        start = (page_no - 1) * CSFD_FILMS_PER_PAGE
+        page_datetimes = datetimes[start:start + CSFD_FILMS_PER_PAGE]
+        rows = "".join(
+            f'<tr><td><a class="film" href="#">{_sentence(rng, 1, 4)}</a></td>'
+            f'<td>{datetime_.strftime("%d.%m.%Y")}</td></tr>'
+            for datetime_ in page_datetimes
+        )
+        page_path = path / "uzivatel" / "1-bench" / "hodnoceni" / f"strana-{page_no}"
+        page_path.mkdir(parents=True)
+        (page_path / "index.html").write_text(
+            '<html><body><div class="profile-content">'
+            f'<div class="paginator">{paginator}<a class="next" href="#">next</a></div>'
+            f'<table class="ui-table-list"><tbody>{rows}</tbody></table>'
+            "</div></body></html>"
+        )
+
+
+GENERATORS = {
+    "git": ("git", gen_git),
+    "maildir": ("maildir", gen_maildir),
+    "icalendar": ("calendar.ics", gen_icalendar),
+    "txt": ("diary.txt", gen_txt),
+    "orgmode": ("diary.org", gen_orgmode),
+    "orgmodelist": ("list.org", gen_orgmodelist),
+    "csv": ("sport.csv", gen_csv),
+    "todotxt": ("done.txt", gen_todotxt),
+    "twitter": ("twitter", gen_twitter),
+    "facebook": ("timeline.htm", gen_facebook),
+    "csfd": ("csfd", gen_csfd),
+}
+
+
+def generate(corpus_dir: Path, scale: float, seed: int = 0):
+    """Generate the inputs of all providers in `corpus_dir`.
+
+    A corpus generated with the same scale and seed before is reused.
+    """
+    marker = corpus_dir / "corpus.json"
+    if marker.is_file() and json.loads(marker.read_text()) == {"scale": scale, "seed": seed}:
+        logger.info("Reusing corpus %s", corpus_dir)
+        return
+    if corpus_dir.exists() and any(corpus_dir.iterdir()):
+        raise Exception(f"Directory {corpus_dir} is not empty")
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    for name, (path_name, gen) in GENERATORS.items():
+        logger.info("Generating %s corpus", name)
+        rng = random.Random(f"{seed}-{name}")
+        gen(corpus_dir / path_name, scale, rng)
+    marker.write_text(json.dumps({"scale": scale, "seed": seed}))
+
+
+def corpus_size(corpus_dir: Path) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(corpus_dir)
+        for name in names
+    )
@@ -0,0 +1,409 @@
+"""Benchmark the providers, write_csv and the visualization on a synthetic corpus.
+
+Each benchmark runs in a fresh process, so that its peak RSS can be measured. The results are
+written as JSON and can be compared with the results of another version using --compare.
+
+Providers that need a real remote service and credentials (caldav, trakt) are not benchmarked.
+"""
+
+import argparse
+import datetime
+import functools
+import http.server
+import importlib
+import json
+import logging
+import multiprocessing
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from benchmarks import corpus
+
+logger = logging.getLogger(__name__)
+
+# Returns a function that runs the benchmark and returns the number of processed items.
+Setup = Callable[[Path, float, Path], Callable[[], int]]
+
+# Relative change of items/sec or peak RSS reported as a regression.
+DEFAULT_THRESHOLD = 0.1
+
+
+def _provider_configs(corpus_dir: Path, tmp_dir: Path) -> dict[str, dict]:
+    return {
+        "git": {
+            "base_path": str(corpus_dir / "git"),
+            "author": "Jane Doe",
+            "cache_dir": str(tmp_dir / "git-cache"),
+            "max_depth": 2,
+        },
+        "maildir": {
+            "received_pathname": str(corpus_dir / "maildir" / "Inbox" / "cur" / "*"),
+            "sent_pathname": str(corpus_dir / "maildir" / "Sent" / "cur" / "*"),
+        },
+        "icalendar": {"paths": [str(corpus_dir / "calendar.ics")]},
+        "txt": {"path": str(corpus_dir / "diary.txt")},
+        "orgmode": {"path": str(corpus_dir / "diary.org")},
+        "orgmodelist": {"path": str(corpus_dir / "list.org")},
+        "csv": {
+            "path": str(corpus_dir / "sport.csv"),
+            "date_source": "{{date}}",
+            "date_format": "<%Y-%m-%d %a>",
+            "text_source": "Running {{track}} {{time}}{{#note}} ({{.}}){{/note}}",
+        },
+        "todotxt": {"path": str(corpus_dir / "done.txt")},
+        "twitter": {"path": str(corpus_dir / "twitter")},
+        "facebook": {"path": str(corpus_dir / "timeline.htm"), "username": "janedoe"},
+        "csfd": {"cache_dir": str(tmp_dir / "csfd-cache")},
+    }
+
+
+def _serve(directory: Path) -> str:
+    """Serve a directory over HTTP in a background thread and return its URL."""
+    handler = functools.partial(_QuietHandler, directory=str(directory))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/"
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def setup_provider(provider: str, corpus_dir: Path, scale: float, tmp_dir: Path):
+    config = _provider_configs(corpus_dir, tmp_dir)[provider]
+    if provider == "csfd":
+        config["profile_url"] = _serve(corpus_dir / "csfd") + "uzivatel/1-bench/"
+    from automatic_diary.batches import provider_batches
+    from automatic_diary.model import DateRange
+
+    module = importlib.import_module(f"automatic_diary.providers.{provider}.main")
+
+    def run() -> int:
+        return sum(len(batch) for batch in provider_batches(module, config, True, DateRange()))
+
+    return run
+
+
+def _gen_items(scale: float) -> list:
+    from automatic_diary.model import Item
+
+    rng = random.Random(0)
+    n = corpus.size("items", scale)
+    start = datetime.datetime(2010, 1, 1, tzinfo=datetime.timezone.utc)
+    return [
+        Item.normalized(
+            datetime_=start + datetime.timedelta(seconds=rng.randrange(14 * 365 * 86400)),
+            text=" ".join(rng.choice(corpus.WORDS) for _ in range(rng.randint(2, 10))),
+            provider=rng.choice(("git", "maildir", "txt", "caldav")),
+            subprovider=rng.choice(("a", "b", "c")),
+            all_day=rng.random() < 0.2,
+        )
+        for _ in range(n)
+    ]
+
+
+def _setup_write_csv(filename: str):
+    def setup(corpus_dir: Path, scale: float, tmp_dir: Path):
+        from automatic_diary.cli import write_csv
+
+        items = _gen_items(scale)
+
+        def run() -> int:
+            write_csv(items, str(tmp_dir / filename))
+            return len(items)
+
+        return run
+
+    return setup
+
+
+def _csv_rows(scale: float, tmp_dir: Path) -> list[list[str]]:
+    import csv
+
+    from automatic_diary.cli import write_csv
+
+    path = tmp_dir / "input.csv"
+    write_csv(_gen_items(scale), str(path))
+    with path.open() as f:
+        return list(csv.reader(f))
+
+
+def setup_read_items(corpus_dir: Path, scale: float, tmp_dir: Path):
+    from automatic_diary.visualize import read_items
+
+    rows = _csv_rows(scale, tmp_dir)
+
+    def run() -> int:
+        read_items(rows)
+        return len(rows)
+
+    return run
+
+
+def setup_read_columnar_items(corpus_dir: Path, scale: float, tmp_dir: Path):
+    from automatic_diary.cli import write_csv
+    from automatic_diary.columnar import ColumnarReader
+    from automatic_diary.visualize import read_columnar_items
+
+    path = tmp_dir / "input.adc"
+    items = _gen_items(scale)
+    write_csv(items, str(tmp_dir / "input.csv"), columnar_path=str(path))
+    del items
+
+    def run() -> int:
+        with ColumnarReader(str(path)) as reader:
+            read_columnar_items(reader)
+            return reader.n_rows
+
+    return run
+
+
+def setup_calc_provider_stats(corpus_dir: Path, scale: float, tmp_dir: Path):
+    from automatic_diary.visualize import calc_provider_stats, gen_dates, read_items
+
+    rows = _csv_rows(scale, tmp_dir)
+    items_by_year_month_day = read_items(rows)
+
+    def run() -> int:
+        calc_provider_stats(gen_dates(items_by_year_month_day), items_by_year_month_day)
+        return len(rows)
+
+    return run
+
+
+def setup_render(corpus_dir: Path, scale: float, tmp_dir: Path):
+    from automatic_diary.visualize import (
+        _render_template, calc_provider_stats, create_template, gen_dates, read_items,
+    )
+
+    rows = _csv_rows(scale, tmp_dir)
+    items_by_year_month_day = read_items(rows)
+    dates_by_year_week = gen_dates(items_by_year_month_day)
+    provider_stats = calc_provider_stats(dates_by_year_week, items_by_year_month_day)
+    template = create_template()
+
+    def run() -> int:
+        for year in items_by_year_month_day:
+            _render_template(
+                template,
+                tmp_dir / f"{year}.html",
+                css_url=None,
+                dates_by_year_week=dates_by_year_week,
+                items_by_year_month_day=items_by_year_month_day,
+                provider_stats=provider_stats,
+                today=datetime.date.today(),
+                year=year,
+            )
+        return len(rows)
+
+    return run
+
+
+def _legacy_obfuscate(s: str) -> str:
+    """Obfuscate a string character by character like the original version, for comparison."""
+    import string
+    import unicodedata
+
+    def obfuscate_char(char: str) -> str:
+        category = unicodedata.category(char)
+        if category == "Lu":
+            return random.choice(string.ascii_uppercase)
+        if category == "Ll":
+            return random.choice(string.ascii_lowercase)
+        if category == "Nd":
+            return random.choice(string.digits)
+        return char
+
+    return "".join(obfuscate_char(char) for char in s)
+
+
+def setup_obfuscate_legacy(corpus_dir: Path, scale: float, tmp_dir: Path):
+    texts = [item.text for item in _gen_items(scale)]
+
+    def run() -> int:
+        for text in texts:
+            _legacy_obfuscate(text)
+        return len(texts)
+
+    return run
+
+
+def setup_obfuscate(corpus_dir: Path, scale: float, tmp_dir: Path):
+    from automatic_diary.batches import batched
+    from automatic_diary.obfuscate import obfuscate_batches
+
+    items = _gen_items(scale)
+
+    def run() -> int:
+        return sum(len(batch) for batch in obfuscate_batches(batched(items)))
+
+    return run
+
+
+BENCHMARKS: dict[str, Setup] = {
+    **{
+        f"provider.{provider}": functools.partial(setup_provider, provider)
+        for provider in corpus.GENERATORS
+    },
+    "cli.write_csv": _setup_write_csv("output.csv"),
+    "cli.write_csv_gzip": _setup_write_csv("output.csv.gz"),
+    "cli.write_jsonl": _setup_write_csv("output.jsonl"),
+    "obfuscate.legacy": setup_obfuscate_legacy,
+    "obfuscate.obfuscate_batches": setup_obfuscate,
+    "visualize.read_items": setup_read_items,
+    "visualize.read_columnar_items": setup_read_columnar_items,
+    "visualize.calc_provider_stats": setup_calc_provider_stats,
+    "visualize.render": setup_render,
+}
+
+
+def _run_benchmark(name: str, corpus_dir: Path, scale: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run = BENCHMARKS[name](corpus_dir, scale, Path(tmp_dir))
+        start = time.perf_counter()
+        items = run()
+        seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        "items": items,
+        "items_per_second": items / seconds if seconds else None,
+        # Kilobytes on Linux.
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run_benchmarks(names: list[str], corpus_dir: Path, scale: float) -> dict[str, dict]:
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        logger.info("Running benchmark %s", name)
+        with context.Pool(1) as pool:
+            try:
+                results[name] = pool.apply(_run_benchmark, (name, corpus_dir, scale))
+            except Exception as e:
+                logger.error("Error while running benchmark %s", name)
+                logger.error(e)
+                results[name] = {"error": str(e)}
+                continue
+        logger.info(
+            "%s: %.3f s, %d items, %d KB peak RSS",
+            name,
+            results[name]["seconds"],
+            results[name]["items"],
+            results[name]["peak_rss_kb"],
+        )
+    return results
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            universal_newlines=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Compare results with a baseline and return a line of text for each benchmark.
+
+    Lines of benchmarks whose items/sec dropped or peak RSS grew by more than `threshold` are
+    marked as regressions.
+    """
+    lines = []
+    for name, result in results["results"].items():
+        baseline_result = baseline["results"].get(name)
+        if not baseline_result or "error" in baseline_result:
+            lines.append(f"{name}: no baseline")
+            continue
+        if "error" in result:
+            lines.append(f"{name}: error")
+            continue
+        speed = result["items_per_second"] / baseline_result["items_per_second"]
+        rss = result["peak_rss_kb"] / baseline_result["peak_rss_kb"]
+        regression = speed < 1 - threshold or rss > 1 + threshold
+        lines.append(
+            f"{name}: {speed:.2f}x items/sec, {rss:.2f}x peak RSS"
+            + (" REGRESSION" if regression else "")
+        )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Automatic Diary benchmarks")
+    parser.add_argument(
+        "-s",
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiply the size of the generated corpus by this factor (default: 1.0)",
+    )
+    parser.add_argument(
+        "-d",
+        "--corpus-dir",
+        help="Directory to generate the corpus in or to reuse it from (default: temporary)",
+    )
+    parser.add_argument(
+        "-b",
+        "--benchmark",
+        action="append",
+        choices=BENCHMARKS.keys(),
+        help="Benchmark to run. Pass the option several times to run several benchmarks. "
+        "If not passed at all, all benchmarks will be run.",
+    )
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file")
+    parser.add_argument(
+        "-c",
+        "--compare",
+        type=argparse.FileType("r"),
+        help="Compare the results with the results in this JSON file",
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"Relative change reported as a regression (default: {DEFAULT_THRESHOLD})",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(message)s")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_dir = Path(args.corpus_dir or tmp_dir)
+        corpus.generate(corpus_dir, args.scale)
+        logger.info("Corpus size: %d bytes", corpus.corpus_size(corpus_dir))
+        results = {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "created_at": datetime.datetime.now().astimezone().isoformat(),
+            "results": run_benchmarks(args.benchmark or list(BENCHMARKS), corpus_dir, args.scale),
+        }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    if args.compare:
+        for line in compare(results, json.load(args.compare), args.threshold):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()